@@ -0,0 +1,452 @@
+"""
+Reproducible benchmark suite for the extraction service.
+
+Generates synthetic PDFs (digital text, scanned image-only, mixed, form-heavy with PII and a large
+500+ page file), drives /extract (per pipeline tier), /signals, /render-* and /redact either
+in-process (calling the service functions directly) or over HTTP, at several concurrency levels,
+and prints machine-readable JSON with throughput, p50/p95/p99 latency and peak RSS.
+
+Examples:
+  python benchmark.py --mode inproc --concurrency 1,4 --requests 8
+  python benchmark.py --mode http --url http://localhost:7000 --scenarios extract:fast,signals
+  python benchmark.py --mode inproc --docs digital,large --out bench.json
+  python benchmark.py --startup 5 --startup-serve --scenarios "" --docs ""
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+DOC_KINDS = ("digital", "scanned", "mixed", "form_pii", "large")
+DEFAULT_SCENARIOS = (
+    "extract:fast",
+    "extract:auto",
+    "extract:docling_cli",
+    "signals",
+    "render_pages",
+    "render_regions",
+    "redact",
+)
+
+LOREM = (
+    "The quarterly program review covers schedule, budget and supplier performance. "
+    "Engineering change requests were evaluated against the baseline configuration and "
+    "approved items were scheduled for the next integration window. Risks were re-scored "
+    "after the design review and mitigation owners confirmed their action plans."
+).split()
+
+
+# --- Synthetic document generation ---
+
+def _paragraph(rng: random.Random, words: int = 60) -> str:
+    return " ".join(rng.choice(LOREM) for _ in range(words))
+
+def _text_page(doc, rng: random.Random, page_no: int) -> None:
+    page = doc.new_page()
+    page.insert_text((72, 60), f"Section {page_no}: Program status", fontsize=14)
+    box_y = 90
+    for _ in range(6):
+        rect = (72, box_y, 540, box_y + 90)
+        page.insert_textbox(rect, _paragraph(rng), fontsize=10)
+        box_y += 100
+
+def _scanned_page(doc, rng: random.Random, page_no: int, dpi: int = 110) -> None:
+    import fitz  # PyMuPDF
+
+    src = fitz.open()
+    _text_page(src, rng, page_no)
+    pix = src.load_page(0).get_pixmap(dpi=dpi)
+    src.close()
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pix)
+
+def _figure_page(doc, rng: random.Random, page_no: int) -> None:
+    import fitz  # PyMuPDF
+
+    page = doc.new_page()
+    page.insert_text((72, 60), f"Figure sheet {page_no}", fontsize=14)
+    for i in range(4):
+        pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+        pix.clear_with(rng.randint(0, 255))
+        x = 72 + (i % 2) * 240
+        y = 100 + (i // 2) * 240
+        page.insert_image(fitz.Rect(x, y, x + 200, y + 200), pixmap=pix)
+    page.insert_textbox((72, 600, 540, 700), _paragraph(rng, 30), fontsize=9)
+
+def _form_page(doc, rng: random.Random, page_no: int) -> None:
+    import fitz  # PyMuPDF
+
+    page = doc.new_page()
+    page.insert_text((72, 60), "Employment Application", fontsize=16)
+    first = rng.choice(["John", "Maria", "Wei", "Aisha", "Lukas"])
+    last = rng.choice(["Simmons", "Garcia", "Chen", "Okafor", "Weber"])
+    fields = [
+        ("Name", f"{last}, {first} A."),
+        ("SSN", f"{rng.randint(100, 899)}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}"),
+        ("Phone", f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}"),
+        ("Email", f"{first.lower()}.{last.lower()}@example.com"),
+        ("Address", f"{rng.randint(10, 9999)} Oak Street Springfield"),
+        ("DOB", f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/19{rng.randint(50, 99)}"),
+        ("Card", " ".join(str(rng.randint(1000, 9999)) for _ in range(4))),
+    ]
+    y = 100
+    for label, value in fields:
+        page.insert_text((72, y), f"{label}:", fontsize=10)
+        page.draw_rect(fitz.Rect(170, y - 12, 540, y + 4), color=(0, 0, 0), width=0.5)
+        page.insert_text((175, y), value, fontsize=10)
+        y += 28
+    for i in range(6):
+        widget = fitz.Widget()
+        widget.field_name = f"field_{page_no}_{i}"
+        widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+        widget.rect = fitz.Rect(170, y + i * 26, 540, y + i * 26 + 18)
+        widget.field_value = _paragraph(rng, 4)
+        page.add_widget(widget)
+
+def generate_document(kind: str, pages: int, seed: int = 7) -> bytes:
+    import fitz  # PyMuPDF
+
+    rng = random.Random(f"{kind}:{pages}:{seed}")
+    doc = fitz.open()
+    try:
+        for i in range(1, pages + 1):
+            if kind in ("digital", "large"):
+                _text_page(doc, rng, i)
+            elif kind == "scanned":
+                _scanned_page(doc, rng, i)
+            elif kind == "mixed":
+                [_text_page, _scanned_page, _figure_page][i % 3](doc, rng, i)
+            elif kind == "form_pii":
+                _form_page(doc, rng, i)
+            else:
+                raise ValueError(f"unknown document kind: {kind}")
+        return doc.tobytes(garbage=3, deflate=True)
+    finally:
+        doc.close()
+
+def load_corpus(kinds: List[str], scale: int, cache_dir: str) -> Dict[str, Tuple[bytes, int]]:
+    """Generate (or reuse cached) documents; returns {kind: (pdf_bytes, pages)}."""
+    sizes = {"digital": 5 * scale, "scanned": 3 * scale, "mixed": 6 * scale, "form_pii": 4 * scale, "large": 520}
+    os.makedirs(cache_dir, exist_ok=True)
+    corpus = {}
+    for kind in kinds:
+        pages = sizes[kind]
+        path = os.path.join(cache_dir, f"{kind}_{pages}p.pdf")
+        if not os.path.isfile(path):
+            with open(path, "wb") as f:
+                f.write(generate_document(kind, pages))
+        with open(path, "rb") as f:
+            corpus[kind] = (f.read(), pages)
+    return corpus
+
+
+# --- Drivers ---
+
+def _multipart(fields: Dict[str, str], filename: str, data: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts: List[bytes] = []
+    for k, v in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n".encode()
+    )
+    parts.append(data)
+    parts.append(f"\r\n--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+def _scenario_fields(scenario: str, pages: int) -> Tuple[str, Dict[str, str]]:
+    name, _, arg = scenario.partition(":")
+    render_pages = list(range(1, min(pages, 3) + 1))
+    if name == "extract":
+        return "/extract", ({"pipeline": arg} if arg else {})
+    if name == "signals":
+        return "/signals", {}
+    if name == "render_pages":
+        return "/render-pages", {"pages": json.dumps(render_pages), "dpi": "150"}
+    if name == "render_regions":
+        regions = [{"id": f"r{p}", "page": p, "bbox": [72, 90, 300, 300]} for p in render_pages]
+        return "/render-regions", {"regions": json.dumps(regions), "dpi": "150"}
+    if name == "redact":
+        return "/redact", {"detect_pii": "true"}
+    raise ValueError(f"unknown scenario: {scenario}")
+
+def http_call(base_url: str, scenario: str, data: bytes, pages: int, timeout: float) -> None:
+    path, fields = _scenario_fields(scenario, pages)
+    body, ctype = _multipart(fields, "bench.pdf", data)
+    req = urllib.request.Request(base_url.rstrip("/") + path, data=body, method="POST", headers={"Content-Type": ctype})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        resp.read()
+        if resp.status >= 400:
+            raise RuntimeError(f"HTTP {resp.status}")
+
+def inproc_call(service, scenario: str, data: bytes, pages: int) -> None:
+    name, _, arg = scenario.partition(":")
+    render_pages = list(range(1, min(pages, 3) + 1))
+    if name == "extract":
+        res = service._run_extract(data, "bench.pdf", arg or None)
+        if not (res and (res.get("text") or res.get("blocks"))):
+            raise RuntimeError("extraction_failed")
+    elif name == "signals":
+        service._compute_pdf_page_signals(data)
+    elif name == "render_pages":
+        service._render_pdf_pages(data, render_pages, 150)
+    elif name == "render_regions":
+        service._render_pdf_regions(data, [{"id": f"r{p}", "page": p, "bbox": [72, 90, 300, 300]} for p in render_pages], 150)
+    elif name == "redact":
+        service._apply_pdf_redactions(data, [], True, [])
+    else:
+        raise ValueError(f"unknown scenario: {scenario}")
+
+
+# --- Measurement ---
+
+def _current_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+def _remote_rss_bytes(base_url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/metrics", timeout=5) as resp:
+            for line in resp.read().decode("utf-8", "replace").splitlines():
+                if line.startswith('docling_process_resident_memory_bytes{kind="current"}'):
+                    return int(float(line.split()[-1]))
+    except Exception:
+        return None
+    return None
+
+class _PeakSampler:
+    """Samples RSS on a background thread and keeps the maximum seen."""
+
+    def __init__(self, sample: Callable[[], Optional[int]], interval: float = 0.1):
+        self.sample = sample
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            v = self.sample()
+            if v:
+                self.peak = max(self.peak, v)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def _percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def run_case(call: Callable[[], None], concurrency: int, requests: int, pages: int, rss_sampler: Callable[[], Optional[int]]) -> dict:
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def one(_):
+        t0 = time.perf_counter()
+        try:
+            call()
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            with lock:
+                errors.append(str(e)[:200])
+
+    with _PeakSampler(rss_sampler) as sampler:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - t0
+
+    lat_ms = sorted(v * 1000.0 for v in latencies)
+    r = lambda v: round(v, 2) if v is not None else None
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed > 0 else None,
+        "pages_per_s": round(len(latencies) * pages / elapsed, 3) if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": r(_percentile(lat_ms, 50)),
+            "p95": r(_percentile(lat_ms, 95)),
+            "p99": r(_percentile(lat_ms, 99)),
+            "max": r(lat_ms[-1] if lat_ms else None),
+        },
+        "peak_rss_bytes": sampler.peak or None,
+    }
+
+
+# --- Startup ---
+
+_IMPORT_PROBE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main  # noqa: F401
+elapsed = time.perf_counter() - t0
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+print(json.dumps({"import_s": elapsed, "rss_bytes": rss, "heavy_modules": sorted(m for m in ("torch", "docling") if m in sys.modules)}))
+"""
+
+def _free_port() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_startup(repeats: int, serve: bool, timeout: float = 300.0) -> dict:
+    """
+    Cold-start cost: `import main` in a fresh interpreter (time, RSS, whether heavy modules got
+    imported) and, with serve=True, time from spawning uvicorn until GET /ready returns 200.
+    """
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    imports = []
+    for _ in range(repeats):
+        proc = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, here], capture_output=True, text=True, timeout=timeout)
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip()[-500:]}
+        imports.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    import_ms = sorted(i["import_s"] * 1000.0 for i in imports)
+    out = {
+        "import_ms": {"p50": round(_percentile(import_ms, 50), 2), "max": round(import_ms[-1], 2)},
+        "import_rss_bytes": max(i["rss_bytes"] for i in imports),
+        "heavy_modules_at_import": imports[-1]["heavy_modules"],
+    }
+    if not serve:
+        return out
+
+    ready_ms = []
+    for _ in range(repeats):
+        port = _free_port()
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=here,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while time.perf_counter() - t0 < timeout:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as resp:
+                        if resp.status == 200:
+                            ready_ms.append((time.perf_counter() - t0) * 1000.0)
+                            break
+                except Exception:
+                    pass
+                time.sleep(0.05)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    ready_ms.sort()
+    out["time_to_ready_ms"] = {"p50": round(_percentile(ready_ms, 50), 2), "max": round(ready_ms[-1], 2)} if ready_ms else None
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("inproc", "http"), default="inproc")
+    ap.add_argument("--url", default=os.getenv("DOCLING_URL", "http://localhost:7000"))
+    ap.add_argument("--docs", default=",".join(DOC_KINDS), help=f"comma list of {', '.join(DOC_KINDS)}")
+    ap.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS))
+    ap.add_argument("--concurrency", default="1,4", help="comma list of concurrency levels")
+    ap.add_argument("--requests", type=int, default=8, help="requests per (doc, scenario, concurrency) case")
+    ap.add_argument("--scale", type=int, default=1, help="page-count multiplier for the small documents")
+    ap.add_argument("--timeout", type=float, default=900.0, help="HTTP timeout per request (s)")
+    ap.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "docling_bench"))
+    ap.add_argument("--startup", type=int, default=3, help="cold-start repetitions (0 disables)")
+    ap.add_argument("--startup-serve", action="store_true", help="also time uvicorn spawn -> /ready == 200")
+    ap.add_argument("--result-cache", action="store_true", help="inproc: keep the service result cache on (repeats then measure cache hits)")
+    ap.add_argument("--out", help="write JSON report here instead of stdout")
+    args = ap.parse_args(argv)
+
+    kinds = [k.strip() for k in args.docs.split(",") if k.strip()]
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    corpus = load_corpus(kinds, max(1, args.scale), args.cache_dir)
+
+    service = None
+    if args.mode == "inproc":
+        # Every case repeats the same document: with the result cache on, only the first call would convert
+        if not args.result_cache:
+            os.environ["CACHE_BACKEND"] = "off"
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import main as service  # noqa: F401
+
+        rss_sampler = _current_rss_bytes
+    else:
+        rss_sampler = lambda: _remote_rss_bytes(args.url)
+
+    startup = measure_startup(args.startup, args.startup_serve) if args.startup > 0 else None
+    if startup:
+        print(f"[bench] startup {json.dumps(startup)}", file=sys.stderr)
+
+    results = []
+    for kind in kinds:
+        data, pages = corpus[kind]
+        for scenario in scenarios:
+            if args.mode == "inproc":
+                call = lambda d=data, s=scenario, p=pages: inproc_call(service, s, d, p)
+            else:
+                call = lambda d=data, s=scenario, p=pages: http_call(args.url, s, d, p, args.timeout)
+            for level in levels:
+                case = run_case(call, level, max(level, args.requests), pages, rss_sampler)
+                case.update({"doc": kind, "pages": pages, "doc_bytes": len(data), "scenario": scenario})
+                results.append(case)
+                print(
+                    f"[bench] {kind:9s} {scenario:20s} c={level:<3d} ok={case['ok']}/{case['requests']} "
+                    f"rps={case['throughput_rps']} p50={case['latency_ms']['p50']}ms p95={case['latency_ms']['p95']}ms",
+                    file=sys.stderr,
+                )
+
+    report = {
+        "mode": args.mode,
+        "url": args.url if args.mode == "http" else None,
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "env": {k: os.getenv(k) for k in ("EXTRACT_PIPELINE", "DOCLING_OCR_MODE", "DOCLING_TABLES", "CACHE_BACKEND") if os.getenv(k)},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "startup": startup,
+        "results": results,
+    }
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    else:
+        print(out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,26 +7,244 @@ import subprocess
 import tempfile
 import logging
 import re
+import sys
+import importlib.util
 import time
-from typing import List, Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse, Response
+import uuid
+import sqlite3
+import threading
+import contextvars
+import contextlib
+import asyncio
+import atexit
+import zipfile
+import zlib
+import hashlib
+import tarfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Docling-compatible Extractor", version="0.1.0")
+_PROCESS_STARTED = time.time()
+
+# --- Environment configuration helpers ---
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return (os.getenv(name, default) or default).strip().lower() in ("1", "true", "yes", "on")
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
 
 try:
-    # Optional: real Docling if installed in the image
-    from docling.document_converter import DocumentConverter  # type: ignore
-    DOCILING_AVAILABLE = True
-except Exception:
-    DOCILING_AVAILABLE = False
+    import orjson  # optional: several times faster than json for large (base64-heavy) payloads
+except ImportError:
+    orjson = None
+
+def _json_dumps(obj) -> bytes:
+    """Serialize a payload to UTF-8 JSON; orjson when installed (JSON_SERIALIZER=json opts out)."""
+    if orjson is not None and os.getenv("JSON_SERIALIZER", "auto") != "json":
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib handles them
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class _JSONResponse(JSONResponse):
+    """JSONResponse rendered with `_json_dumps` (bytes straight from orjson, no intermediate str)."""
+
+    def render(self, content) -> bytes:
+        return _json_dumps(content)
+
+app = FastAPI(title="Docling-compatible Extractor", version="0.1.0", default_response_class=_JSONResponse)
+
+# Optional: real Docling if installed in the image. Only probe for the package here -- importing it
+# pulls in torch and the model stack, which the default CLI pipeline never needs in-process. Warmup
+# then checks that it really imports (see `_check_docling_import`) and clears the flag if it does not.
+DOCILING_AVAILABLE = importlib.util.find_spec("docling") is not None
 
 CLI_AVAILABLE = bool(shutil.which(os.getenv("DOCLING_CLI", "docling")))
 
+# --- Metrics (GET /metrics, Prometheus text exposition format) ---
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(k, "")) for k in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {value}")
+        return lines
+
+
+class _Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class _Gauge(_Metric):
+    """Gauge whose samples are either set directly or produced by a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), collect=None):
+        super().__init__(name, help_text, labels)
+        self._collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        if self._collect is not None:
+            try:
+                samples = self._collect() or {}
+            except Exception:
+                samples = {}
+            with self._lock:
+                self._values = dict(samples)
+        return super().render()
+
+
+class _Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}) for k, v in self._values.items()]
+        for key, state in items:
+            for upper, n in zip(self.buckets, state["buckets"]):
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, ('le', repr(float(upper))))} {n}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, ('le', '+Inf'))} {state['count']}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {state['sum']}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {state['count']}")
+        return lines
+
+
+_METRICS: List[_Metric] = []
+
+def _register(metric):
+    _METRICS.append(metric)
+    return metric
+
+def _render_metrics() -> str:
+    lines: List[str] = []
+    for m in _METRICS:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+def _process_rss_bytes() -> Dict[tuple, float]:
+    """Current and peak resident set size of this worker process."""
+    out: Dict[tuple, float] = {}
+    try:
+        with open("/proc/self/statm") as f:
+            out[("current",)] = float(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except Exception:
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        out[("peak",)] = float(peak if sys.platform == "darwin" else peak * 1024)
+    except Exception:
+        pass
+    return out
+
+def _job_queue_depth() -> Dict[tuple, float]:
+    if _JOB_STORE is None:
+        return {}
+    counts = _JOB_STORE.counts()
+    return {(status,): float(counts.get(status, 0)) for status in ("queued", "running")}
+
+def _result_cache_size() -> Dict[tuple, float]:
+    return _RESULT_CACHE.stats() if _RESULT_CACHE is not None else {}
+
+
+_M_HTTP_REQUESTS = _register(_Counter("docling_http_requests_total", "HTTP requests by endpoint and status.", ("endpoint", "method", "status")))
+_M_HTTP_SECONDS = _register(_Histogram("docling_http_request_duration_seconds", "HTTP request latency by endpoint.", ("endpoint",)))
+_M_TIER_SECONDS = _register(_Histogram("docling_extract_tier_duration_seconds", "Time spent in each extraction tier.", ("tier", "outcome")))
+_M_FALLBACKS = _register(_Counter("docling_extract_fallback_total", "Extraction tier fallback transitions.", ("from_tier", "to_tier")))
+_M_PAGES = _register(_Counter("docling_pages_processed_total", "Pages processed by stage.", ("stage",)))
+_M_OCR = _register(_Counter("docling_ocr_decisions_total", "OCR on/off decisions for Docling conversions.", ("decision", "mode")))
+_M_RENDER_BYTES = _register(_Counter("docling_render_bytes_total", "PNG bytes produced by render endpoints.", ("kind",)))
+_M_RESPONSE_BYTES = _register(_Counter("docling_response_bytes_total", "Response body bytes before (raw) and after (wire) compression.", ("endpoint", "encoding", "stage")))
+_M_SCRATCH_BYTES = _register(_Counter("docling_scratch_bytes_total", "Bytes handed to file-based tools by kind and backend (scratch, spill, memory).", ("kind", "backend")))
+_M_PDFMINER_PAGES = _register(_Counter("docling_pdfminer_pages_total", "Pages handled by the pdfminer fallback tier by outcome (ok, error, timeout).", ("outcome",)))
+_M_CACHE = _register(_Counter("docling_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result")))
+_M_CANCELLED = _register(_Counter("docling_cancelled_work_total", "Requests, jobs and child processes cancelled before completion.", ("kind",)))
+_M_JOBS = _register(_Counter("docling_jobs_finished_total", "Background jobs finished by kind and status.", ("kind", "status")))
+_M_BATCH_DOCS = _register(_Counter("docling_batch_documents_total", "Batch documents processed by kind and outcome.", ("kind", "outcome")))
+_M_ADMISSION = _register(_Counter("docling_admission_total", "Admission decisions by lane and outcome.", ("lane", "outcome")))
+_M_ADMISSION_WAIT = _register(_Histogram("docling_admission_wait_seconds", "Time requests waited for an admission slot.", ("lane",)))
+_register(_Gauge("docling_admission_backlog", "Estimated queued+running work per admission lane.", ("lane", "unit"), collect=lambda: _admission_backlog()))
+_register(_Gauge("docling_job_queue_depth", "Background jobs waiting or running.", ("status",), collect=_job_queue_depth))
+_register(_Gauge("docling_process_resident_memory_bytes", "Resident memory of this worker process.", ("kind",), collect=_process_rss_bytes))
+_register(_Gauge("docling_scratch_in_use_bytes", "Scratch bytes currently held on the scratch filesystem by this worker.", (), collect=lambda: {(): float(_SCRATCH_IN_USE[0])}))
+_register(_Gauge("docling_result_cache_size", "Result cache size (shared across workers for the sqlite backend).", ("backend", "unit"), collect=_result_cache_size))
+
+
 # --- Hybrid Vision Routing Helpers (signals/render/redaction) ---
 
 PII_PATTERNS = {
@@ -63,6 +281,12 @@ STREET_TYPES = {
 
 _TRIM_CHARS = " \t\r\n,.;:()[]{}<>\"'"
 
+def _optional_flag(value: Optional[str]) -> Optional[bool]:
+    """Tri-state form flag: None when absent, so the env default applies."""
+    if value is None or str(value).strip() == "":
+        return None
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+
 def _safe_json_loads(s: Optional[str], default):
     if not s:
         return default
@@ -81,13 +305,6 @@ def _clamp01(x: float) -> float:
     except Exception:
         return 0.0
 
-def _bbox_area(bbox) -> float:
-    try:
-        x0, y0, x1, y1 = bbox
-        return max(0.0, float(x1) - float(x0)) * max(0.0, float(y1) - float(y0))
-    except Exception:
-        return 0.0
-
 def _union_bbox(bboxes):
     xs0 = []
     ys0 = []
@@ -111,18 +328,480 @@ def _clean_word(w: str) -> str:
         return ""
     return str(w).strip(_TRIM_CHARS)
 
-def _detect_pii_boxes_fitz_page(page) -> List[dict]:
+# str.translate table folding A-Z only, matching the ASCII-only case folding of fitz search_for
+_ASCII_LOWER = {c: c + 32 for c in range(ord("A"), ord("Z") + 1)}
+
+class _PageWordIndex:
+    """
+    Columnar word index for one PDF page, built from a single text extraction and shared by PII
+    detection, text search, layout signals and the fast extraction tier.
+
+    Words are kept in reading order (block, line, word). `coords` is an (n, 4) float32 array,
+    `block_ids` / `line_ids` are int32 arrays and `word_ids` point into an interned vocabulary, so
+    repeated tokens are stored once. Image placements are an (m, 4) float32 array.
+    """
+
+    __slots__ = ("page_no", "width", "height", "coords", "block_ids", "line_ids", "word_ids", "vocab", "image_coords", "_clean_vocab")
+
+    def __init__(self, page):
+        import fitz  # PyMuPDF
+        import numpy as np
+
+        rect = page.rect
+        self.page_no = int(page.number) + 1
+        self.width = float(rect.width)
+        self.height = float(rect.height)
+
+        # One text page serves both the words and the image placements
+        textpage = page.get_textpage(flags=fitz.TEXTFLAGS_WORDS | fitz.TEXT_PRESERVE_IMAGES)
+        # (x0, y0, x1, y1, word, block_no, line_no, word_no)
+        raw = page.get_text("words", textpage=textpage) or []
+        vocab_ids: Dict[str, int] = {}
+        ids = [vocab_ids.setdefault(w[4] or "", len(vocab_ids)) for w in raw]
+        coords = np.array([w[0:4] for w in raw], dtype=np.float32).reshape(-1, 4)
+        block_ids = np.array([w[5] for w in raw], dtype=np.int32)
+        line_ids = np.array([w[6] for w in raw], dtype=np.int32)
+        order = np.lexsort((np.array([w[7] for w in raw], dtype=np.int32), line_ids, block_ids))
+        self.coords = coords[order]
+        self.block_ids = block_ids[order]
+        self.line_ids = line_ids[order]
+        self.word_ids = np.array(ids, dtype=np.int32)[order]
+        self.vocab = [sys.intern(v) for v in vocab_ids]
+        self._clean_vocab: Optional[List[str]] = None
+
+        # (x0, y0, x1, y1, text, block_no, block_type); type 1 = image
+        images = [b[0:4] for b in page.get_text("blocks", textpage=textpage) or [] if len(b) >= 7 and b[6] == 1]
+        self.image_coords = np.array(images, dtype=np.float32).reshape(-1, 4)
+
+    def __len__(self) -> int:
+        return int(self.word_ids.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.coords, self.block_ids, self.line_ids, self.word_ids, self.image_coords)
+        return sum(a.nbytes for a in arrays) + sum(len(v) + 49 for v in self.vocab)
+
+    @property
+    def page_area(self) -> float:
+        return max(1.0, self.width * self.height)
+
+    def tokens(self) -> List[str]:
+        return [self.vocab[i] for i in self.word_ids.tolist()]
+
+    def clean_tokens(self) -> List[str]:
+        """Words with surrounding punctuation trimmed (`_clean_word`), computed once per vocabulary entry."""
+        if self._clean_vocab is None:
+            self._clean_vocab = [_clean_word(v) for v in self.vocab]
+        clean = self._clean_vocab
+        return [clean[i] for i in self.word_ids.tolist()]
+
+    def mean_word_length(self) -> float:
+        if not len(self):
+            return 0.0
+        import numpy as np
+
+        lengths = np.fromiter((len(v) for v in self.vocab), dtype=np.int32, count=len(self.vocab))
+        return float(lengths[self.word_ids].mean())
+
+    def bbox(self, i: int) -> List[float]:
+        return self.coords[i].tolist()
+
+    def union(self, indices) -> Optional[List[float]]:
+        """Union bbox of the given word positions (slice or index list)."""
+        sel = self.coords[indices]
+        if not len(sel):
+            return None
+        return [float(sel[:, 0].min()), float(sel[:, 1].min()), float(sel[:, 2].max()), float(sel[:, 3].max())]
+
+    def _run_starts(self, by_line: bool):
+        import numpy as np
+
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        change = self.block_ids[1:] != self.block_ids[:-1]
+        if by_line:
+            change |= self.line_ids[1:] != self.line_ids[:-1]
+        return np.concatenate(([0], np.flatnonzero(change) + 1))
+
+    def line_slices(self) -> List[Tuple[int, int]]:
+        """(start, end) word positions of each text line, in reading order."""
+        starts = self._run_starts(by_line=True).tolist()
+        return list(zip(starts, starts[1:] + [len(self)]))
+
+    def block_bboxes(self):
+        """(k, 4) float32 array: one bbox per text block, the union of its words (vectorized)."""
+        import numpy as np
+
+        starts = self._run_starts(by_line=False)
+        if not len(starts):
+            return np.zeros((0, 4), dtype=np.float32)
+        c = self.coords
+        return np.stack(
+            [
+                np.minimum.reduceat(c[:, 0], starts),
+                np.minimum.reduceat(c[:, 1], starts),
+                np.maximum.reduceat(c[:, 2], starts),
+                np.maximum.reduceat(c[:, 3], starts),
+            ],
+            axis=1,
+        )
+
+    def block_texts(self) -> List[str]:
+        """Text of each block: words joined by spaces, lines by newlines (same order as `block_bboxes`)."""
+        tokens = self.tokens()
+        blocks = self.block_ids.tolist()
+        out: List[str] = []
+        current: List[str] = []
+        prev_block = None
+        for start, end in self.line_slices():
+            if prev_block is not None and blocks[start] != prev_block:
+                out.append("\n".join(current))
+                current = []
+            current.append(" ".join(tokens[start:end]))
+            prev_block = blocks[start]
+        if current:
+            out.append("\n".join(current))
+        return out
+
+    def search(self, query: str, page=None) -> List[List[float]]:
+        """
+        Phrase search over the word sequence with `page.search_for` semantics: exact substring
+        match, whitespace-normalized, case-insensitive for ASCII only. Hits covering whole words
+        return the union of those words per line; a hit inside a word is narrowed to the matched
+        characters with `page.search_for` clipped to the hit's lines (skipped without `page`).
+        Rects are deduplicated.
+        """
+        needle = " ".join((query or "").translate(_ASCII_LOWER).split())
+        if not needle or not len(self):
+            return []
+        import numpy as np
+
+        tokens = [t.translate(_ASCII_LOWER) for t in self.tokens()]
+        starts = np.cumsum([0] + [len(t) + 1 for t in tokens[:-1]])
+        haystack = " ".join(tokens)
+        line_of = np.zeros(len(self), dtype=np.int64)
+        line_of[self._run_starts(by_line=True)[1:]] = 1
+        line_of = np.cumsum(line_of)
+        rects: List[List[float]] = []
+        seen = set()
+
+        def add(rect: List[float]) -> None:
+            key = tuple(round(v, 2) for v in rect)
+            if key not in seen:
+                seen.add(key)
+                rects.append(rect)
+
+        pos = haystack.find(needle)
+        while pos != -1:
+            end = pos + len(needle)
+            first = int(np.searchsorted(starts, pos, side="right") - 1)
+            last = int(np.searchsorted(starts, end - 1, side="right") - 1)
+            span = np.arange(first, last + 1)
+            lines = line_of[first:last + 1]
+            if pos == int(starts[first]) and end == int(starts[last]) + len(tokens[last]):
+                for ln in np.unique(lines).tolist():
+                    add(self.union(span[lines == ln]))
+            elif page is not None:
+                import fitz  # PyMuPDF
+
+                clip = fitz.Rect(self.union(np.concatenate([np.flatnonzero(line_of == ln) for ln in np.unique(lines).tolist()])))
+                for r in page.search_for(query, clip=clip) or []:
+                    add([float(r.x0), float(r.y0), float(r.x1), float(r.y1)])
+            pos = haystack.find(needle, end)
+        return rects
+
+def _box_areas(boxes):
+    """Vectorized areas of an (n, 4) array of [x0, y0, x1, y1] boxes (negative extents count as 0)."""
+    import numpy as np
+
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.clip(b[:, 2] - b[:, 0], 0, None) * np.clip(b[:, 3] - b[:, 1], 0, None)
+
+
+# Coverage grids above this many cells are computed on snapped coordinates (raster fallback)
+_COVERAGE_MAX_CELLS = 2_000_000
+
+def _parse_grid(value) -> Optional[Tuple[int, int]]:
+    """
+    Parse a density grid spec: `16` (16x16) or `12x16` (rows x cols), each 1..64. Empty / `0` / `off`
+    disables the grid. Raises ValueError on malformed input.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (list, tuple)):
+        parts = [str(v) for v in value]
+    else:
+        text = str(value).strip().lower()
+        if text in ("", "0", "off", "none", "false"):
+            return None
+        parts = text.replace("*", "x").split("x")
+    if len(parts) == 1:
+        parts = parts * 2
+    try:
+        rows, cols = (int(p) for p in parts)
+    except Exception:
+        raise ValueError("grid_must_be_N_or_RxC")
+    if not (1 <= rows <= 64 and 1 <= cols <= 64):
+        raise ValueError("grid_must_be_between_1_and_64")
+    return rows, cols
+
+def _layout_coverage(width: float, height: float, text_boxes, image_boxes, grid: Optional[Tuple[int, int]] = None) -> dict:
+    """
+    True union coverage of text and image boxes on one page.
+
+    Box edges (plus the density grid lines) are compressed into a non-uniform grid; each layer is
+    painted with a 2D difference array, so overlapping blocks are counted once and every box costs
+    O(1) regardless of its size. Pages whose compressed grid would exceed _COVERAGE_MAX_CELLS are
+    snapped to a uniform raster first. Returns page fractions, the text/image overlap, the text
+    fraction inside each image box and, with `grid`, per-cell densities (rows x cols, top-left first).
+    """
+    import numpy as np
+
+    w = max(1e-6, float(width))
+    h = max(1e-6, float(height))
+    limits = np.array([w, h, w, h])
+    t = np.clip(np.asarray(text_boxes, dtype=np.float64).reshape(-1, 4), 0, limits)
+    im = np.clip(np.asarray(image_boxes, dtype=np.float64).reshape(-1, 4), 0, limits)
+    rows, cols = grid or (1, 1)
+    gx = np.linspace(0.0, w, cols + 1)
+    gy = np.linspace(0.0, h, rows + 1)
+
+    def axes(tb, ib):
+        xs = np.unique(np.concatenate((tb[:, 0::2].ravel(), ib[:, 0::2].ravel(), gx)))
+        ys = np.unique(np.concatenate((tb[:, 1::2].ravel(), ib[:, 1::2].ravel(), gy)))
+        return xs, ys
+
+    xs, ys = axes(t, im)
+    if len(xs) * len(ys) > _COVERAGE_MAX_CELLS:
+        q = max(w, h) / (_COVERAGE_MAX_CELLS ** 0.5 / 2)
+        t = np.minimum(np.round(t / q) * q, limits)
+        im = np.minimum(np.round(im / q) * q, limits)
+        xs, ys = axes(t, im)
+    cell_area = np.diff(ys)[:, None] * np.diff(xs)[None, :]
+
+    def cells(b):
+        return (
+            np.searchsorted(xs, b[:, 0]),
+            np.searchsorted(ys, b[:, 1]),
+            np.searchsorted(xs, b[:, 2]),
+            np.searchsorted(ys, b[:, 3]),
+        )
+
+    def paint(b):
+        diff = np.zeros((len(ys), len(xs)), dtype=np.int32)
+        if len(b):
+            x0, y0, x1, y1 = cells(b)
+            np.add.at(diff, (y0, x0), 1)
+            np.add.at(diff, (y0, x1), -1)
+            np.add.at(diff, (y1, x0), -1)
+            np.add.at(diff, (y1, x1), 1)
+        return diff.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > 0
+
+    text_mask = paint(t)
+    image_mask = paint(im)
+    text_cells = np.where(text_mask, cell_area, 0.0)
+    image_cells = np.where(image_mask, cell_area, 0.0)
+    page_area = w * h
+
+    # Text area inside each image box via a summed-area table over the text layer
+    box_text_overlap: List[float] = []
+    if len(im):
+        sat = np.zeros((len(ys), len(xs)))
+        sat[1:, 1:] = text_cells.cumsum(axis=0).cumsum(axis=1)
+        x0, y0, x1, y1 = cells(im)
+        inside = sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0]
+        areas = _box_areas(im).astype(np.float64)
+        box_text_overlap = np.where(areas > 0, inside / np.maximum(areas, 1e-9), 0.0).clip(0, 1).tolist()
+
+    out = {
+        "text": min(1.0, float(text_cells.sum()) / page_area),
+        "image": min(1.0, float(image_cells.sum()) / page_area),
+        "overlap": min(1.0, float(np.where(text_mask & image_mask, cell_area, 0.0).sum()) / page_area),
+        "box_text_overlap": box_text_overlap,
+    }
+    if grid:
+        # Grid lines are part of the compressed axes, so every compressed cell lies in one grid cell
+        ix = np.searchsorted(xs, gx[:-1])
+        iy = np.searchsorted(ys, gy[:-1])
+        grid_area = (w / cols) * (h / rows)
+
+        def density(layer):
+            summed = np.add.reduceat(np.add.reduceat(layer, iy, axis=0), ix, axis=1)
+            return np.round(np.clip(summed / grid_area, 0, 1), 3).tolist()
+
+        out["density"] = {"rows": rows, "cols": cols, "text": density(text_cells), "image": density(image_cells)}
+    return out
+
+REGION_RANKS = ("area", "text_gap")
+
+def _region_policy(value) -> Optional[dict]:
+    """
+    Region consolidation policy from a form value: `true` uses the REGION_* defaults, a JSON object
+    overrides them (`merge_gap` points, `min_area_pct`, `rank` area|text_gap, `top_k` per page,
+    0 = all). Empty / false disables. Raises ValueError on malformed input.
+    """
+    if value is None or value is False:
+        return None
+    if isinstance(value, dict):
+        overrides = value
+    else:
+        text = str(value).strip()
+        if text.lower() in ("", "0", "false", "no", "off", "none"):
+            return None
+        if text.lower() in ("1", "true", "yes", "on"):
+            overrides = {}
+        else:
+            overrides = _safe_json_loads(text, None)
+            if not isinstance(overrides, dict):
+                raise ValueError("consolidate_must_be_true_or_json_object")
+    policy = {
+        "merge_gap": _env_float("REGION_MERGE_GAP_PT", 6.0),
+        "min_area_pct": _env_float("REGION_MIN_AREA_PCT", 0.01),
+        "rank": os.getenv("REGION_RANK", "area"),
+        "top_k": int(_env_float("REGION_TOP_K", 0)),
+    }
+    try:
+        for key in ("merge_gap", "min_area_pct"):
+            if overrides.get(key) is not None:
+                policy[key] = max(0.0, float(overrides[key]))
+        if overrides.get("top_k") is not None:
+            policy["top_k"] = max(0, int(overrides["top_k"]))
+    except (TypeError, ValueError):
+        raise ValueError("consolidate_values_must_be_numeric")
+    policy["rank"] = str(overrides.get("rank") or policy["rank"]).strip().lower()
+    if policy["rank"] not in REGION_RANKS:
+        raise ValueError(f"rank_must_be_one_of: {', '.join(REGION_RANKS)}")
+    return policy
+
+def _merge_boxes(boxes, gap: float):
+    """
+    Merge boxes that overlap or lie within `gap` points of each other, until no two merged boxes
+    touch. Returns the merged (k, 4) array and, per merged box, the indices of its input boxes.
+    """
+    import numpy as np
+
+    merged = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    members: List[List[int]] = [[i] for i in range(len(merged))]
+    while len(merged) > 1:
+        g = merged + np.array([-gap, -gap, gap, gap]) / 2.0
+        # Sort-and-sweep on x0: a box can only touch the boxes after it that start before it
+        # ends, so only those are tested for y overlap (no dense n x n matrix).
+        order = np.argsort(g[:, 0], kind="stable")
+        s = g[order]
+        ends = np.searchsorted(s[:, 0], s[:, 2], side="right")
+        parent = list(range(len(merged)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        touched = False
+        for i in np.flatnonzero(ends > np.arange(1, len(s) + 1)).tolist():
+            cand = s[i + 1:ends[i]]
+            for j in (np.flatnonzero((cand[:, 1] <= s[i, 3]) & (s[i, 1] <= cand[:, 3])) + i + 1).tolist():
+                ra, rb = find(int(order[i])), find(int(order[j]))
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+                touched = True
+        if not touched:
+            break
+        roots = np.array([find(i) for i in range(len(merged))])
+        _, labels = np.unique(roots, return_inverse=True)
+        k = int(labels.max()) + 1
+        out = np.empty((k, 4))
+        out[:, :2] = np.inf
+        out[:, 2:] = -np.inf
+        np.minimum.at(out[:, 0], labels, merged[:, 0])
+        np.minimum.at(out[:, 1], labels, merged[:, 1])
+        np.maximum.at(out[:, 2], labels, merged[:, 2])
+        np.maximum.at(out[:, 3], labels, merged[:, 3])
+        grouped: List[List[int]] = [[] for _ in range(k)]
+        for idx, label in enumerate(labels.tolist()):
+            grouped[label].extend(members[idx])
+        merged, members = out, [sorted(m) for m in grouped]
+    return merged, members
+
+def _consolidate_regions(boxes, width: float, height: float, text_boxes, policy: dict) -> List[dict]:
+    """
+    Turn a page's raw figure boxes into render candidates: merge overlapping / adjacent boxes,
+    drop merged regions below `min_area_pct` of the page, score and keep the best `top_k`.
+
+    `rank=area` scores by page fraction; `rank=text_gap` by the page fraction *not* covered by the
+    text layer, so figures whose content is missing from the text come first.
+    """
+    merged, members = _merge_boxes(boxes, policy["merge_gap"])
+    if not len(merged):
+        return []
+    page_area = max(1.0, float(width) * float(height))
+    coverage = _layout_coverage(width, height, text_boxes, merged)
+    regions = []
+    for bbox, group, inside in zip(merged.tolist(), members, coverage["box_text_overlap"]):
+        area_pct = _clamp01(float(_box_areas([bbox])[0]) / page_area)
+        if area_pct < policy["min_area_pct"]:
+            continue
+        score = area_pct * (1.0 - inside) if policy["rank"] == "text_gap" else area_pct
+        regions.append(
+            {
+                "bbox": [round(v, 2) for v in bbox],
+                "area_pct": area_pct,
+                "text_overlap": round(inside, 4),
+                "score": round(score, 6),
+                "members": group,
+            }
+        )
+    regions.sort(key=lambda r: -r["score"])
+    if policy["top_k"]:
+        regions = regions[: policy["top_k"]]
+    return regions
+
+
+_WORD_INDEXES: "OrderedDict[Tuple[str, int], _PageWordIndex]" = OrderedDict()
+_WORD_INDEX_BYTES = 0
+_WORD_INDEX_LOCK = threading.Lock()
+
+def _page_word_index(page, digest: Optional[str] = None) -> _PageWordIndex:
+    """
+    Word index for `page`. With the document digest, indexes are kept in a per-process LRU
+    (WORD_INDEX_CACHE_MB, default 64) so /signals, /redact and extraction of the same document
+    extract each page's text once.
+    """
+    global _WORD_INDEX_BYTES
+    if digest is None:
+        return _PageWordIndex(page)
+    key = (digest, int(page.number))
+    with _WORD_INDEX_LOCK:
+        index = _WORD_INDEXES.get(key)
+        if index is not None:
+            _WORD_INDEXES.move_to_end(key)
+            _M_CACHE.inc(cache="word_index", result="hit")
+            return index
+    _M_CACHE.inc(cache="word_index", result="miss")
+    with _stage("word_index"):
+        index = _PageWordIndex(page)
+    budget = int(_env_float("WORD_INDEX_CACHE_MB", 64) * 1024 * 1024)
+    with _WORD_INDEX_LOCK:
+        if key not in _WORD_INDEXES:
+            _WORD_INDEXES[key] = index
+            _WORD_INDEX_BYTES += index.nbytes
+        while _WORD_INDEX_BYTES > budget and _WORD_INDEXES:
+            _, evicted = _WORD_INDEXES.popitem(last=False)
+            _WORD_INDEX_BYTES -= evicted.nbytes
+    return index
+
+def _detect_pii_boxes_fitz_page(page, index: Optional["_PageWordIndex"] = None) -> List[dict]:
     """
     Best-effort PII bbox detection from a PyMuPDF page, suitable for redaction overlays.
 
     This is intentionally conservative: it errs towards redacting obvious PII tokens
     (SSNs, emails, phone numbers, DOBs) and common credit-card layouts (4x 4-digit groups).
+    Pass the page's `_PageWordIndex` to reuse an already extracted word layer.
     """
+    if index is None:
+        index = _PageWordIndex(page)
     boxes: List[dict] = []
-
-    # (x0, y0, x1, y1, word, block_no, line_no, word_no)
-    words = page.get_text("words") or []
-    words_sorted = sorted(words, key=lambda w: (w[5], w[6], w[7]))
+    seen = set()
 
     def add_box(page_no: int, bbox, label: str, value: str):
         b = _union_bbox([bbox])
@@ -130,105 +809,93 @@ def _detect_pii_boxes_fitz_page(page) -> List[dict]:
             return
         key = (page_no, label, round(b[0], 1), round(b[1], 1), round(b[2], 1), round(b[3], 1), value[:32])
         # de-dupe by coarse rounding + prefix
-        if not hasattr(add_box, "_seen"):
-            add_box._seen = set()  # type: ignore
-        if key in add_box._seen:  # type: ignore
+        if key in seen:
             return
-        add_box._seen.add(key)  # type: ignore
+        seen.add(key)
         boxes.append({"page": page_no, "bbox": b, "label": label, "value": value[:120]})
 
-    page_no = int(page.number) + 1
+    page_no = index.page_no
+    # Words in (block, line, word) order
+    tokens = index.clean_tokens()
+    block_ids = index.block_ids.tolist()
+    line_ids = index.line_ids.tolist()
+    n = len(tokens)
 
     # 1) Single-token matches (email/ssn/dob/phone-ish)
-    for w in words_sorted:
-        bbox = w[0:4]
-        raw = w[4] or ""
-        token = _clean_word(raw)
+    for i, token in enumerate(tokens):
         if not token:
             continue
 
         if PII_PATTERNS["email"].fullmatch(token):
-            add_box(page_no, bbox, "email", token)
+            add_box(page_no, index.bbox(i), "email", token)
             continue
 
         if PII_PATTERNS["ssn"].search(token):
-            add_box(page_no, bbox, "ssn", token)
+            add_box(page_no, index.bbox(i), "ssn", token)
             continue
 
         if PII_PATTERNS["dob"].search(token):
-            add_box(page_no, bbox, "dob", token)
+            add_box(page_no, index.bbox(i), "dob", token)
             continue
 
         # Phone is tricky: allow partials like "(555)" but prefer full match
         if PII_PATTERNS["phone"].search(token):
-            add_box(page_no, bbox, "phone", token)
+            add_box(page_no, index.bbox(i), "phone", token)
             continue
 
     # 2) Credit-card-like: 4 consecutive 4-digit groups on the same line
     four_digits = re.compile(r"^\d{4}$")
     i = 0
-    while i < len(words_sorted):
-        w = words_sorted[i]
-        token = _clean_word(w[4] or "")
-        if not four_digits.fullmatch(token):
+    while i < n:
+        if not four_digits.fullmatch(tokens[i]):
             i += 1
             continue
         # require same (block,line) for grouping
-        block_no = w[5]
-        line_no = w[6]
-        group = [w]
+        group = [i]
         j = i + 1
-        while j < len(words_sorted) and len(group) < 4:
-            wj = words_sorted[j]
-            if wj[5] != block_no or wj[6] != line_no:
+        while j < n and len(group) < 4:
+            if block_ids[j] != block_ids[i] or line_ids[j] != line_ids[i]:
                 break
-            tj = _clean_word(wj[4] or "")
-            if four_digits.fullmatch(tj):
-                group.append(wj)
+            if four_digits.fullmatch(tokens[j]):
+                group.append(j)
                 j += 1
                 continue
             break
         if len(group) == 4:
-            b = _union_bbox([g[0:4] for g in group])
+            b = index.union(group)
             if b:
-                value = " ".join(_clean_word(g[4] or "") for g in group)
-                add_box(page_no, b, "credit_card_like", value)
+                add_box(page_no, b, "credit_card_like", " ".join(tokens[g] for g in group))
             i = j
             continue
         i += 1
 
     # 3) Address-like: leading number + street words + street type on same line
     i = 0
-    while i < len(words_sorted):
-        w = words_sorted[i]
-        block_no = w[5]
-        line_no = w[6]
-        token = _clean_word(w[4] or "")
+    while i < n:
+        token = tokens[i]
         if not token.isdigit() or len(token) > 6:
             i += 1
             continue
         # scan up to 8 tokens ahead on the same line for street type
-        group = [w]
+        group = [i]
         found_type = False
         j = i + 1
-        while j < len(words_sorted) and len(group) < 9:
-            wj = words_sorted[j]
-            if wj[5] != block_no or wj[6] != line_no:
+        while j < n and len(group) < 9:
+            if block_ids[j] != block_ids[i] or line_ids[j] != line_ids[i]:
                 break
-            tj = _clean_word(wj[4] or "")
+            tj = tokens[j]
             if not tj:
                 j += 1
                 continue
-            group.append(wj)
+            group.append(j)
             if tj.lower().rstrip(".") in STREET_TYPES:
                 found_type = True
                 break
             j += 1
         if found_type and len(group) >= 3:
-            b = _union_bbox([g[0:4] for g in group])
+            b = index.union(group)
             if b:
-                value = " ".join(_clean_word(g[4] or "") for g in group)
-                add_box(page_no, b, "address_like", value)
+                add_box(page_no, b, "address_like", " ".join(tokens[g] for g in group))
             i = j + 1
             continue
         i += 1
@@ -254,14 +921,9 @@ def _detect_pii_boxes_fitz_page(page) -> List[dict]:
             return True
         return core[:1].isupper() and core[1:].islower() and core.isalpha()
 
-    # Group by (block,line) for stable name extraction
-    line_map = {}
-    for w in words_sorted:
-        key = (w[5], w[6])
-        line_map.setdefault(key, []).append(w)
-
-    for (_b, _l), line_words in line_map.items():
-        toks = [_clean_word(w[4] or "") for w in line_words]
+    # Per (block,line) for stable name extraction
+    for start, end in index.line_slices():
+        toks = tokens[start:end]
         toks_l = [t.lower() for t in toks]
         for idx, tl in enumerate(toks_l):
             if tl not in NAME_LABELS:
@@ -294,55 +956,64 @@ def _detect_pii_boxes_fitz_page(page) -> List[dict]:
                 if toks_l[k] in NAME_LABELS:
                     break
                 if looks_like_name_token(tk) or (tk.endswith(",") and looks_like_name_token(tk.rstrip(","))):
-                    picked.append(line_words[k])
+                    picked.append(start + k)
                     continue
                 # If we already picked at least 2 name tokens, stop on non-name token
                 if len(picked) >= 2:
                     break
             if len(picked) >= 2:
-                b = _union_bbox([p[0:4] for p in picked])
+                b = index.union(picked)
                 if b:
-                    value = " ".join(_clean_word(p[4] or "") for p in picked)
-                    add_box(page_no, b, "name", value)
+                    add_box(page_no, b, "name", " ".join(tokens[p] for p in picked))
 
     return boxes
 
 
-def _compute_pdf_page_signals(pdf_bytes: bytes) -> dict:
+def _compute_pdf_page_signals(pdf_bytes: bytes, grid: Optional[Tuple[int, int]] = None, consolidate: Optional[dict] = None) -> dict:
+    digest = _doc_digest(pdf_bytes)
+    key = f"{digest}:grid={grid[0]}x{grid[1]}" if grid else f"{digest}:grid=0"
+    if consolidate:
+        key += ":regions=" + json.dumps(consolidate, sort_keys=True)
+    return _cached_json("signals", key, lambda: _scan_pdf_page_signals(pdf_bytes, digest, grid, consolidate))
+
+def _scan_pdf_page_signals(
+    pdf_bytes: bytes,
+    digest: Optional[str] = None,
+    grid: Optional[Tuple[int, int]] = None,
+    consolidate: Optional[dict] = None,
+) -> dict:
     import fitz  # PyMuPDF
 
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
         out_pages = []
         for i in range(doc.page_count):
+            _check_cancelled()
             page = doc.load_page(i)
             rect = page.rect
             page_area = max(1.0, float(rect.width) * float(rect.height))
             image_boxes = []
-            text_area = 0.0
-            image_area = 0.0
+            coverage = None
+            regions = None
 
             try:
-                d = page.get_text("dict") or {}
-                for b in d.get("blocks", []) or []:
-                    bbox = b.get("bbox")
-                    btype = b.get("type")
-                    if not bbox or not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
-                        continue
-                    area = _bbox_area(bbox)
-                    if btype == 0:
-                        text_area += area
-                    elif btype == 1:
-                        image_area += area
-                        image_boxes.append({"bbox": [float(v) for v in bbox], "area_pct": _clamp01(area / page_area)})
+                index = _page_word_index(page, digest)
+                text_boxes = index.block_bboxes()
+                with _stage("coverage"):
+                    coverage = _layout_coverage(rect.width, rect.height, text_boxes, index.image_coords, grid)
+                image_areas = _box_areas(index.image_coords)
+                for bbox, area, inside in zip(index.image_coords.tolist(), image_areas.tolist(), coverage["box_text_overlap"]):
+                    image_boxes.append({"bbox": bbox, "area_pct": _clamp01(area / page_area), "text_overlap": round(inside, 4)})
+                if consolidate:
+                    regions = _consolidate_regions(index.image_coords, rect.width, rect.height, text_boxes, consolidate)
             except Exception:
-                # If dict extraction fails, fall back to coarse image counts
+                # If text extraction fails, report the page without layout signals
                 image_boxes = []
-                text_area = 0.0
-                image_area = 0.0
+                coverage = None
+                regions = None
 
-            text_pct = _clamp01(text_area / page_area)
-            image_pct = _clamp01(image_area / page_area)
+            text_pct = _clamp01(coverage["text"]) if coverage else 0.0
+            image_pct = _clamp01(coverage["image"]) if coverage else 0.0
             non_text_pct = _clamp01(1.0 - text_pct)
             figure_count = len(image_boxes)
             # Heuristic: figure-heavy page but little detectable text
@@ -358,10 +1029,16 @@ def _compute_pdf_page_signals(pdf_bytes: bytes) -> dict:
                     "non_text_coverage": non_text_pct,
                     "figure_count": figure_count,
                     "figure_content_missing": figure_content_missing,
+                    "text_image_overlap": _clamp01(coverage["overlap"]) if coverage else 0.0,
                     "image_boxes": image_boxes,
                 }
             )
+            if coverage and "density" in coverage:
+                out_pages[-1]["density"] = coverage["density"]
+            if consolidate:
+                out_pages[-1]["regions"] = regions or []
 
+        _M_PAGES.inc(doc.page_count, stage="signals")
         return {"pages": doc.page_count, "page_signals": out_pages}
     finally:
         doc.close()
@@ -371,25 +1048,63 @@ def _render_pdf_pages(pdf_bytes: bytes, pages: List[int], dpi: int) -> List[dict
 
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
+        digest = _doc_digest(pdf_bytes)
         images = []
         for p in pages:
             if not isinstance(p, int) or p < 1 or p > doc.page_count:
                 continue
-            page = doc.load_page(p - 1)
-            pix = page.get_pixmap(dpi=dpi)
-            png_bytes = pix.tobytes("png")
-            images.append({"page": p, "mime": "image/png", "data_b64": base64.b64encode(png_bytes).decode("ascii")})
+            _check_cancelled()
+
+            def render(p=p):
+                page = doc.load_page(p - 1)
+                with _stage("rasterize"):
+                    pix = page.get_pixmap(dpi=dpi)
+                with _stage("png_encode"):
+                    png_bytes = pix.tobytes("png")
+                _M_RENDER_BYTES.inc(len(png_bytes), kind="pages")
+                _M_PAGES.inc(stage="render")
+                return {"page": p, "mime": "image/png", "data_b64": base64.b64encode(png_bytes).decode("ascii")}
+
+            images.append(_cached_json("render", f"{digest}:p{p}:dpi{dpi}", render))
         return images
     finally:
         doc.close()
 
-def _render_pdf_regions(pdf_bytes: bytes, regions: List[dict], dpi: int) -> List[dict]:
+def _consolidate_requested_regions(doc, digest: str, regions: List[dict], policy: dict) -> List[dict]:
+    """
+    Apply a consolidation policy to caller-supplied regions, page by page. Merged regions keep the
+    first member's id and list every member id under `members`; pages keep their request order.
+    """
+    by_page: "OrderedDict[int, List[Tuple[str, List[float]]]]" = OrderedDict()
+    for idx, r in enumerate(regions):
+        try:
+            page_no = int(r.get("page"))
+            bbox = [float(v) for v in r.get("bbox")]
+        except Exception:
+            continue
+        if 1 <= page_no <= doc.page_count and len(bbox) == 4:
+            by_page.setdefault(page_no, []).append((str(r.get("id") or f"r{idx}"), bbox))
+    out = []
+    for page_no, items in by_page.items():
+        _check_cancelled()
+        page = doc.load_page(page_no - 1)
+        text_boxes = _page_word_index(page, digest).block_bboxes() if policy["rank"] == "text_gap" else []
+        for region in _consolidate_regions([b for _, b in items], page.rect.width, page.rect.height, text_boxes, policy):
+            ids = [items[i][0] for i in region.pop("members")]
+            out.append({"id": ids[0], "page": page_no, "members": ids, **region})
+    return out
+
+def _render_pdf_regions(pdf_bytes: bytes, regions: List[dict], dpi: int, consolidate: Optional[dict] = None) -> List[dict]:
     import fitz  # PyMuPDF
 
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
+        digest = _doc_digest(pdf_bytes)
+        if consolidate:
+            regions = _consolidate_requested_regions(doc, digest, regions, consolidate)
         images = []
         for idx, r in enumerate(regions):
+            _check_cancelled()
             try:
                 page_no = int(r.get("page"))
                 bbox = r.get("bbox")
@@ -399,35 +1114,154 @@ def _render_pdf_regions(pdf_bytes: bytes, regions: List[dict], dpi: int) -> List
                 if not bbox or not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
                     continue
                 rect = fitz.Rect([float(v) for v in bbox])
-                page = doc.load_page(page_no - 1)
-                pix = page.get_pixmap(dpi=dpi, clip=rect)
-                png_bytes = pix.tobytes("png")
+
+                def render(page_no=page_no, rect=rect):
+                    page = doc.load_page(page_no - 1)
+                    with _stage("rasterize"):
+                        pix = page.get_pixmap(dpi=dpi, clip=rect)
+                    with _stage("png_encode"):
+                        png_bytes = pix.tobytes("png")
+                    _M_RENDER_BYTES.inc(len(png_bytes), kind="regions")
+                    return base64.b64encode(png_bytes).decode("ascii")
+
+                clip_key = ",".join(f"{v:.2f}" for v in (rect.x0, rect.y0, rect.x1, rect.y1))
                 images.append(
                     {
                         "id": str(rid),
                         "page": page_no,
                         "bbox": [float(v) for v in bbox],
                         "mime": "image/png",
-                        "data_b64": base64.b64encode(png_bytes).decode("ascii"),
+                        "data_b64": _cached_json("render", f"{digest}:p{page_no}:clip{clip_key}:dpi{dpi}", render),
                     }
                 )
+                if "members" in r:
+                    images[-1]["members"] = r["members"]
             except Exception:
                 continue
         return images
     finally:
         doc.close()
 
+# Rough peak bytes per tile pixel while it is in flight: RGB raster, PNG buffer and base64 copy
+_TILE_BYTES_PER_PX = 8
+
+def _tile_size(tile_px: int, max_memory_mb: Optional[float] = None) -> int:
+    """Tile edge in pixels (128..8192), shrunk so one in-flight tile stays within `max_memory_mb`."""
+    tile = max(128, min(8192, int(tile_px)))
+    if max_memory_mb and max_memory_mb > 0:
+        fit = int((float(max_memory_mb) * 1024 * 1024 / _TILE_BYTES_PER_PX) ** 0.5)
+        tile = max(128, min(tile, fit))
+    return tile
+
+def _tile_origins(extent: int, tile: int, overlap: int) -> List[int]:
+    """Evenly spaced tile origins covering [0, extent) with at least `overlap` pixels shared by neighbours."""
+    if extent <= tile:
+        return [0]
+    step = max(1, tile - max(0, min(overlap, tile // 2)))
+    n = -(-(extent - tile) // step) + 1
+    return [round(i * (extent - tile) / (n - 1)) for i in range(n)]
+
+def _iter_page_tiles(pdf_bytes: bytes, pages: List[int], dpi: int, tile: int, overlap: int):
+    """
+    Render pages as fixed-size PNG tiles (edge tiles are clipped to the page), one at a time.
+
+    Only one tile raster exists at any moment, so very large pages (drawings, large-format scans)
+    render without a full-page buffer. Tiles are not put in the result cache: each is rendered,
+    encoded, yielded and dropped. Yields one dict per tile in row-major order per page, with
+    its pixel offset in the full-page raster and its bbox in PDF points, then a final
+    `{"summary": ...}`.
+    """
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        scale = dpi / 72.0
+        matrix = fitz.Matrix(scale, scale)
+        t0 = time.time()
+        tiles = pages_done = b64_bytes = 0
+        for p in pages:
+            if not isinstance(p, int) or p < 1 or p > doc.page_count:
+                continue
+            page = doc.load_page(p - 1)
+            rect = page.rect
+            full = (rect * matrix).irect  # the size get_pixmap would produce for the whole page
+            page_w = max(1, full.width)
+            page_h = max(1, full.height)
+            xs = _tile_origins(page_w, tile, overlap)
+            ys = _tile_origins(page_h, tile, overlap)
+            for row, y in enumerate(ys):
+                for col, x in enumerate(xs):
+                    _check_cancelled()
+                    clip = fitz.Rect(
+                        rect.x0 + x / scale,
+                        rect.y0 + y / scale,
+                        rect.x0 + min(page_w, x + tile) / scale,
+                        rect.y0 + min(page_h, y + tile) / scale,
+                    )
+                    with _stage("rasterize"):
+                        pix = page.get_pixmap(matrix=matrix, clip=clip)
+                    with _stage("png_encode"):
+                        png_bytes = pix.tobytes("png")
+                    _M_RENDER_BYTES.inc(len(png_bytes), kind="tiles")
+                    data_b64 = base64.b64encode(png_bytes).decode("ascii")
+                    width, height = pix.width, pix.height
+                    del pix, png_bytes
+                    tiles += 1
+                    b64_bytes += len(data_b64)
+                    yield {
+                        "page": p,
+                        "row": row,
+                        "col": col,
+                        "rows": len(ys),
+                        "cols": len(xs),
+                        "x": x,
+                        "y": y,
+                        "width": width,
+                        "height": height,
+                        "page_width": page_w,
+                        "page_height": page_h,
+                        "bbox": [clip.x0, clip.y0, clip.x1, clip.y1],
+                        "dpi": dpi,
+                        "mime": "image/png",
+                        "data_b64": data_b64,
+                    }
+            _M_PAGES.inc(stage="render")
+            pages_done += 1
+        yield {
+            "summary": {
+                "pages": pages_done,
+                "tiles": tiles,
+                "tile": tile,
+                "overlap": overlap,
+                "dpi": dpi,
+                "bytes_b64": b64_bytes,
+                "elapsed_ms": int((time.time() - t0) * 1000),
+            }
+        }
+    finally:
+        doc.close()
+
+def _detect_pii_boxes(doc, digest: Optional[str] = None) -> List[dict]:
+    """PII redaction boxes for every page of an open PyMuPDF document."""
+    boxes: List[dict] = []
+    for i in range(doc.page_count):
+        _check_cancelled()
+        page = doc.load_page(i)
+        index = _page_word_index(page, digest)
+        with _stage("pii_detect"):
+            boxes.extend(_detect_pii_boxes_fitz_page(page, index))
+    return boxes
+
 def _apply_pdf_redactions(pdf_bytes: bytes, boxes: List[dict], detect_pii: bool, search_texts: List[dict]) -> dict:
     import fitz  # PyMuPDF
 
     doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
+        digest = _doc_digest(pdf_bytes)
         all_boxes: List[dict] = []
         if detect_pii:
             try:
-                for i in range(doc.page_count):
-                    page = doc.load_page(i)
-                    all_boxes.extend(_detect_pii_boxes_fitz_page(page))
+                all_boxes.extend(_detect_pii_boxes(doc, digest))
             except Exception as e:
                 logger.warning(f"PII bbox detection failed: {e}")
 
@@ -446,8 +1280,9 @@ def _apply_pdf_redactions(pdf_bytes: bytes, boxes: List[dict], detect_pii: bool,
                 except Exception:
                     continue
 
-        # Caller-provided text queries (e.g., safety matches) resolved to bboxes via search.
-        # NOTE: fitz.search_for is exact-string search; this is best-effort.
+        # Caller-provided text queries (e.g., safety matches) resolved to bboxes via the page word
+        # index with fitz.search_for semantics; search_for runs clipped to the hit's lines for hits
+        # inside a word, and over the whole page when the index has no hit.
         if search_texts:
             for q in search_texts:
                 try:
@@ -459,16 +1294,13 @@ def _apply_pdf_redactions(pdf_bytes: bytes, boxes: List[dict], detect_pii: bool,
                     if page_no < 1 or page_no > doc.page_count:
                         continue
                     page = doc.load_page(page_no - 1)
-                    rects = page.search_for(qtext)
-                    for r in rects or []:
-                        all_boxes.append(
-                            {
-                                "page": page_no,
-                                "bbox": [float(r.x0), float(r.y0), float(r.x1), float(r.y1)],
-                                "label": label,
-                                "value": qtext[:120],
-                            }
-                        )
+                    index = _page_word_index(page, digest)
+                    with _stage("text_search"):
+                        rects = index.search(qtext, page)
+                        if not rects:
+                            rects = [[float(r.x0), float(r.y0), float(r.x1), float(r.y1)] for r in page.search_for(qtext) or []]
+                    for r in rects:
+                        all_boxes.append({"page": page_no, "bbox": r, "label": label, "value": qtext[:120]})
                 except Exception:
                     continue
 
@@ -477,6 +1309,7 @@ def _apply_pdf_redactions(pdf_bytes: bytes, boxes: List[dict], detect_pii: bool,
         for b in all_boxes:
             per_page.setdefault(int(b["page"]), []).append(b)
 
+        t_apply = time.perf_counter()
         for page_no, page_boxes in per_page.items():
             page = doc.load_page(page_no - 1)
             for b in page_boxes:
@@ -491,104 +1324,1027 @@ def _apply_pdf_redactions(pdf_bytes: bytes, boxes: List[dict], detect_pii: bool,
                 # If apply_redactions fails, continue; caller still gets original bytes
                 pass
 
-        out_bytes = doc.tobytes(garbage=4, deflate=True)
+        _add_stage("apply_redactions", time.perf_counter() - t_apply)
+        with _stage("save_pdf"):
+            out_bytes = doc.tobytes(garbage=4, deflate=True)
+        _M_PAGES.inc(doc.page_count, stage="redact")
         return {"pdf_bytes": out_bytes, "boxes": all_boxes}
     finally:
         doc.close()
 
-def _extract_with_docling(bytes_data: bytes, filename: Optional[str] = None):
-    # Minimal safe wrapper around docling. Falls back on errors.
+# --- Per-request stage timings (Server-Timing) and on-demand profiling ---
+
+class _StageTimings:
+    """Accumulated wall time per named stage for one request; safe to update from worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._stages[name] = self._stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {k: round(v * 1000.0, 2) for k, v in self._stages.items()}
+
+    def server_timing(self, total_s: Optional[float] = None) -> str:
+        parts = [f"{k};dur={v:.2f}" for k, v in self.as_dict().items()]
+        if total_s is not None:
+            parts.append(f"total;dur={total_s * 1000.0:.2f}")
+        return ", ".join(parts)
+
+
+_TIMINGS: contextvars.ContextVar = contextvars.ContextVar("docling_timings", default=None)
+
+def _add_stage(name: str, seconds: float) -> None:
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+@contextlib.contextmanager
+def _stage(name: str):
+    """Time a block into the current request's timings; free when timings are off."""
+    timings = _TIMINGS.get()
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
     try:
-        suffix = ".pdf"
-        try:
-            if filename:
-                _, ext = os.path.splitext(filename)
-                if ext and ext.lower() in [".pdf", ".docx", ".doc"]:
-                    suffix = ext
-        except Exception:
-            pass
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-            tmp.write(bytes_data)
-            tmp_path = tmp.name
-        dc = DocumentConverter()
-        res = dc.convert(tmp_path)
-        # Prefer markdown or plain text representation
-        text = ""
-        try:
-            text = res.document.export_to_markdown()
-        except Exception:
-            try:
-                text = res.document.export_to_text()
-            except Exception:
-                text = ""
-        # Blocks: collect paragraph/text nodes if available
-        blocks: List[str] = []
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - t0)
+
+def _timings_requested(request: Request) -> bool:
+    flag = request.query_params.get("timings") or request.headers.get("x-timings")
+    if flag is None:
+        return _env_flag("TIMINGS_ENABLED", "0")
+    return str(flag).strip().lower() in ("1", "true", "yes", "on")
+
+def _profile_requested(request: Request) -> bool:
+    """
+    Profiling is a debug switch: it needs PROFILE_ENABLED=1 (any caller) or a matching
+    PROFILE_TOKEN sent as `X-Profile`, so it can be used in production without redeploying.
+    """
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    if not flag:
+        return False
+    secret = os.getenv("PROFILE_TOKEN")
+    if secret:
+        return flag == secret
+    return _env_flag("PROFILE_ENABLED", "0") and flag.strip().lower() in ("1", "true", "yes", "on")
+
+def _finish_profile(profiler, path: str) -> dict:
+    """Summarise a cProfile run (top functions by cumulative time) and optionally persist it."""
+    import pstats
+
+    buf = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buf)
+    stats.sort_stats("cumulative").print_stats(int(_env_float("PROFILE_TOP_N", 40)))
+    out = {"summary": buf.getvalue()}
+    profile_dir = os.getenv("PROFILE_DIR")
+    if profile_dir:
         try:
-            for sec in getattr(res.document, "sections", []) or []:
-                for para in getattr(sec, "paragraphs", []) or []:
-                    t = getattr(para, "text", None)
-                    if t:
-                        blocks.append(t)
-        except Exception:
-            pass
-        pages = len(getattr(res, "pages", []) or [])
-        os.unlink(tmp_path)
-        return {
-            "pages": pages,
-            "text": text or "\n".join(blocks),
-            "blocks": [{"text": b} for b in blocks][:200]
-        }
-    except Exception:
-        return None
+            os.makedirs(profile_dir, exist_ok=True)
+            name = f"{path.strip('/').replace('/', '_') or 'root'}-{int(time.time())}-{uuid.uuid4().hex[:8]}.prof"
+            stats.dump_stats(os.path.join(profile_dir, name))
+            out["id"] = name
+        except Exception as e:
+            logger.warning(f"failed to store profile: {e}")
+    return out
 
-def _extract_with_docling_python(data: bytes, filename: str) -> dict:
+async def _read_upload(request: Request, file: UploadFile) -> bytes:
+    """Read the upload, charging body receipt + multipart parsing + read to the `upload` stage."""
+    data = await file.read()
+    timings = getattr(request.state, "timings", None)
+    t0 = getattr(request.state, "t0", None)
+    if timings is not None and t0 is not None:
+        timings.add("upload", time.perf_counter() - t0)
+    return data
+
+def _decorate_response(request: Request, payload: dict) -> dict:
+    """Attach `timings` (plus `scratch` usage) / `profile` to a JSON payload when they were requested."""
+    timings = getattr(request.state, "timings", None)
+    if timings is not None:
+        payload["timings"] = timings.as_dict()
+        scratch = getattr(request.state, "scratch", None)
+        if scratch is not None and scratch.files:
+            payload["scratch"] = scratch.as_dict()
+    profile = getattr(request.state, "profile", None)
+    if profile is not None:
+        payload["profile"] = profile
+    return payload
+
+
+# --- Cancellation / deadlines for running conversions ---
+
+class _WorkCancelled(BaseException):
     """
-    Extract text from document using Docling Python API with standard pipeline.
-    Uses DocumentConverter directly - no CLI, no VLM, just reliable document understanding.
-    Supports both PDF and DOCX files with page tracking.
+    Raised inside worker code when its request/job was abandoned or ran past its deadline.
+
+    Derives from BaseException (like asyncio.CancelledError) so the many best-effort
+    `except Exception` fallbacks do not swallow it and start the next tier.
     """
-    import io
-    import tempfile
-    import os
-    
-    # Set headless mode to avoid OpenGL requirements
-    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
-    os.environ['MPLBACKEND'] = 'Agg'
-    
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _CancelToken:
+    """Cancellation flag plus optional deadline, shared between the event loop and a worker thread."""
+
+    def __init__(self, timeout_s: Optional[float] = None):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self.deadline = (time.monotonic() + timeout_s) if timeout_s and timeout_s > 0 else None
+
+    def cancel(self, reason: str) -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline_exceeded")
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        if self.cancelled():
+            raise _WorkCancelled(self.reason or "cancelled")
+
+
+_CANCEL: contextvars.ContextVar = contextvars.ContextVar("docling_cancel", default=None)
+
+_CANCELLED_WORK = {"requests": 0, "jobs": 0, "processes_killed": 0}
+_CANCELLED_WORK_LOCK = threading.Lock()
+
+def _record_cancelled(kind: str, n: int = 1) -> None:
+    with _CANCELLED_WORK_LOCK:
+        _CANCELLED_WORK[kind] = _CANCELLED_WORK.get(kind, 0) + n
+    _M_CANCELLED.inc(n, kind=kind)
+
+def _check_cancelled() -> None:
+    """Cooperative cancellation point for long loops (pages, regions, ...)."""
+    token = _CANCEL.get()
+    if token is not None:
+        token.check()
+
+def _kill_process_tree(proc: subprocess.Popen) -> None:
+    """Terminate a child started in its own session, including anything it spawned."""
+    try:
+        if hasattr(os, "killpg"):
+            import signal
+
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                return
+            try:
+                proc.wait(timeout=2)
+                return
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except Exception as e:
+        logger.warning(f"failed to kill child process {proc.pid}: {e}")
+    finally:
+        _record_cancelled("processes_killed")
+
+def _run_subprocess(args: List[str], timeout: float) -> subprocess.CompletedProcess:
+    """
+    subprocess.run replacement that honours the current cancel token.
+
+    The child runs in its own process group so Docling/llama.cpp helpers die with it when the
+    request is abandoned or its deadline passes, instead of running to the fixed timeout.
+    """
+    token: Optional[_CancelToken] = _CANCEL.get()
+    proc = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=hasattr(os, "killpg"),
+    )
+    started = time.monotonic()
+    out_chunks: List[str] = []
+    err_chunks: List[str] = []
+    while True:
+        try:
+            out, err = proc.communicate(timeout=0.25)
+            out_chunks.append(out or "")
+            err_chunks.append(err or "")
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        if token is not None and token.cancelled():
+            _kill_process_tree(proc)
+            proc.communicate()
+            raise _WorkCancelled(token.reason or "cancelled")
+        if time.monotonic() - started > timeout:
+            _kill_process_tree(proc)
+            proc.communicate()
+            raise subprocess.TimeoutExpired(args, timeout)
+    return subprocess.CompletedProcess(args, proc.returncode, "".join(out_chunks), "".join(err_chunks))
+
+def _request_timeout_s(request: Request) -> Optional[float]:
+    """Per-request deadline from `X-Request-Timeout-Ms`, else REQUEST_TIMEOUT_MS (0 = none)."""
+    raw = request.headers.get("x-request-timeout-ms") or os.getenv("REQUEST_TIMEOUT_MS", "0")
+    try:
+        ms = float(raw)
+    except Exception:
+        return None
+    return ms / 1000.0 if ms > 0 else None
+
+_LANE: contextvars.ContextVar = contextvars.ContextVar("docling_lane", default="batch")
+
+class _WorkScope:
+    """Per-request state handed to the worker thread: cancel token, stage timings, profiler switch, admission lane, scratch usage."""
+
+    def __init__(self, token: _CancelToken, timings: Optional[_StageTimings] = None, profile: bool = False, lane: str = "interactive", scratch: Optional["_ScratchUsage"] = None):
+        self.token = token
+        self.timings = timings
+        self.scratch = scratch
+        self.profile = profile
+        self.lane = lane
+        self.profile_result: Optional[dict] = None
+        self.path = ""
+
+def _call_in_scope(scope: _WorkScope, fn, *args, **kwargs):
+    cancel_token = _CANCEL.set(scope.token)
+    timings_token = _TIMINGS.set(scope.timings)
+    lane_token = _LANE.set(scope.lane)
+    scratch_token = _SCRATCH.set(scope.scratch)
+    profiler = None
+    if scope.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        scope.token.check()
+        return fn(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            scope.profile_result = _finish_profile(profiler, scope.path)
+        _SCRATCH.reset(scratch_token)
+        _LANE.reset(lane_token)
+        _TIMINGS.reset(timings_token)
+        _CANCEL.reset(cancel_token)
+
+async def _run_request_work(request: Request, fn, *args, cost: Optional["_CostEstimate"] = None, **kwargs):
+    """
+    Run blocking work in the threadpool, cancelling it when the client disconnects or the
+    request deadline passes. Cancelled work surfaces as 499 (client gone) / 504 (deadline).
+
+    With a cost estimate the work first passes admission control (lane, fair queuing, shedding).
+    """
+    token = _CancelToken(_request_timeout_s(request))
+    scheduler = _get_scheduler() if cost is not None else None
+    lane = "interactive"
+    if scheduler is not None:
+        lane = scheduler.lane_for(cost, (request.headers.get("x-priority") or "").strip().lower())
+    scope = _WorkScope(token, getattr(request.state, "timings", None), _profile_requested(request), lane, getattr(request.state, "scratch", None))
+    scope.path = request.url.path
+    done = asyncio.Event()
+
+    async def watch_disconnect():
+        while not done.is_set():
+            if await request.is_disconnected():
+                token.cancel("client_disconnected")
+                return
+            if token.cancelled():
+                return
+            try:
+                await asyncio.wait_for(done.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
+
+    watcher = asyncio.create_task(watch_disconnect())
+    ticket = None
+    try:
+        if scheduler is not None:
+            t0 = time.time()
+            ticket = await scheduler.admit(lane, _admission_client(request), cost, token)
+            if scope.timings is not None:
+                scope.timings.add("admission_wait", time.time() - t0)
+        return await run_in_threadpool(_call_in_scope, scope, fn, *args, **kwargs)
+    except _WorkCancelled as e:
+        _record_cancelled("requests")
+        logger.info(f"request_cancelled path={request.url.path} reason={e.reason}")
+        status = 504 if e.reason == "deadline_exceeded" else 499
+        raise HTTPException(status, f"request_cancelled: {e.reason}")
+    finally:
+        if ticket is not None:
+            scheduler.release(ticket)
+        done.set()
+        watcher.cancel()
+        if scope.profile_result is not None:
+            request.state.profile = scope.profile_result
+
+class _WorkStreamResponse(StreamingResponse):
+    """StreamingResponse that runs `on_close` once sending ends, also when the body was never iterated."""
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+            self._on_close()
+
+async def _stream_request_work(request: Request, gen_fn, *args, cost: Optional["_CostEstimate"] = None) -> StreamingResponse:
+    """
+    `_run_request_work` for work that yields results one by one (a sync generator); returns the
+    NDJSON response.
+
+    Admission happens before the response starts, so shedding still returns 503. Each item is then
+    produced in the threadpool under the request's scope and streamed as an NDJSON line; failures
+    after the first byte become a final `{error}` line. Closing the stream (client disconnect, even
+    before the first line) cancels the work and releases the admission slot.
+    """
+    token = _CancelToken(_request_timeout_s(request))
+    scheduler = _get_scheduler() if cost is not None else None
+    lane = "interactive"
+    if scheduler is not None:
+        lane = scheduler.lane_for(cost, (request.headers.get("x-priority") or "").strip().lower())
+    scope = _WorkScope(token, None, False, lane, getattr(request.state, "scratch", None))
+    scope.path = request.url.path
+    ticket = None
+    if scheduler is not None:
+        try:
+            ticket = await scheduler.admit(lane, _admission_client(request), cost, token)
+        except _WorkCancelled as e:
+            _record_cancelled("requests")
+            raise HTTPException(504 if e.reason == "deadline_exceeded" else 499, f"request_cancelled: {e.reason}")
+    state = {"gen": None, "finished": False, "closed": False}
+
+    def close() -> None:
+        if state["closed"]:
+            return
+        state["closed"] = True
+        if not state["finished"]:
+            token.cancel("client_disconnected")
+            _record_cancelled("requests")
+            logger.info(f"request_cancelled path={request.url.path} reason=client_disconnected")
+        if state["gen"] is not None:
+            try:
+                state["gen"].close()
+            except ValueError:
+                pass  # still running in a worker thread; it stops at its next cancellation check
+        if ticket is not None:
+            scheduler.release(ticket)
+
+    async def lines():
+        try:
+            state["gen"] = gen = await run_in_threadpool(_call_in_scope, scope, gen_fn, *args)
+            while True:
+                item = await run_in_threadpool(_call_in_scope, scope, next, gen, None)
+                if item is None:
+                    break
+                yield _json_dumps(item) + b"\n"
+            state["finished"] = True
+        except _WorkCancelled as e:
+            state["finished"] = True
+            _record_cancelled("requests")
+            yield _json_dumps({"error": f"request_cancelled: {e.reason}"}) + b"\n"
+        except Exception as e:
+            state["finished"] = True
+            yield _json_dumps({"error": str(e)[:500]}) + b"\n"
+        finally:
+            close()
+
+    return _WorkStreamResponse(lines(), close, media_type="application/x-ndjson")
+
+# --- Admission control (cost classes, interactive/batch lanes, weighted fair queuing) ---
+
+# Rough single-core seconds per page; ADMISSION_PAGE_COSTS='{"docling_ocr": 6}' overrides entries.
+_PAGE_COST_S = {
+    "fast": 0.02,
+    "docling": 1.0,
+    "docling_ocr": 4.0,
+    "vlm": 20.0,
+    "signals": 0.01,
+    "render": 0.15,  # at 220 dpi, scales with dpi^2
+    "redact": 0.03,
+    "redact_pii": 0.06,
+}
+ADMISSION_LANES = ("interactive", "batch")
+
+
+class _CostEstimate:
+    """Estimated work for one request: pages, scanned share and expected seconds of CPU."""
+
+    def __init__(self, kind: str, pages: int, scanned_ratio: float, pipeline: Optional[str], seconds: float):
+        self.kind = kind
+        self.pages = pages
+        self.scanned_ratio = scanned_ratio
+        self.pipeline = pipeline
+        self.seconds = seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "pages": self.pages,
+            "scanned_ratio": round(self.scanned_ratio, 2),
+            "pipeline": self.pipeline,
+            "seconds": round(self.seconds, 2),
+        }
+
+
+def _page_costs() -> Dict[str, float]:
+    costs = dict(_PAGE_COST_S)
+    overrides = _safe_json_loads(os.getenv("ADMISSION_PAGE_COSTS") or "{}", {})
+    if isinstance(overrides, dict):
+        for k, v in overrides.items():
+            try:
+                costs[str(k)] = float(v)
+            except (TypeError, ValueError):
+                pass
+    return costs
+
+def _probe_pdf(data: bytes, sample: int = 4) -> Tuple[int, float]:
+    """(page_count, share of sampled pages without a usable text layer); cheap, no layout analysis."""
+    if data[:4] != b"%PDF":
+        return 1, 1.0
+    import fitz  # PyMuPDF
+
+    try:
+        doc = fitz.open(stream=data, filetype="pdf")
+    except Exception:
+        return 1, 0.0
+    try:
+        n = doc.page_count
+        if n == 0 or sample <= 0:
+            return n, 0.0
+        idxs = sorted({int(i * n / sample) for i in range(min(sample, n))})
+        # Word indexes built here are reused by the extraction that follows
+        digest = _doc_digest(data)
+        scanned = sum(1 for i in idxs if sum(len(v) for v in _page_word_index(doc.load_page(i), digest).tokens()) < 30)
+        return n, scanned / len(idxs)
+    finally:
+        doc.close()
+
+def _estimate_cost(kind: str, data: bytes, pipeline: Optional[str] = None, pages: Optional[int] = None, dpi: int = 220, detect_pii: bool = False) -> _CostEstimate:
+    costs = _page_costs()
+    if kind == "extract":
+        pipeline = _resolve_extract_pipeline(pipeline)
+        n, scanned = _probe_pdf(data)
+        ocr_mode = (os.getenv("DOCLING_OCR_MODE", "auto") or "auto").strip().lower()
+        docling_page = costs["docling_ocr"] * scanned + costs["docling"] * (1.0 - scanned)
+        if ocr_mode == "on":
+            docling_page = costs["docling_ocr"]
+        if pipeline == "fast":
+            per_page = costs["fast"]
+        elif pipeline == "auto":
+            # Only pages the fast tier flags (mostly scanned ones) escalate to Docling
+            per_page = costs["fast"] + scanned * costs["docling_ocr"]
+        elif pipeline in ("vlm_cli", "vlm"):
+            per_page = costs["vlm"]
+        else:
+            per_page = docling_page
+        if pages is not None:
+            n = min(n, pages)  # page selection (ranges / sample)
+        return _CostEstimate(kind, n, scanned, pipeline, per_page * max(1, n))
+
+    if kind == "analyze":
+        # Extraction (unless pipeline is "none"), signals, up to `pages` routed renders, PII plan
+        base = _estimate_cost("extract", data, pipeline) if pipeline != "none" else _estimate_cost("signals", data)
+        n = base.pages
+        render_page = costs["render"] * (max(72, dpi) / 220.0) ** 2
+        seconds = base.seconds + n * costs["signals"] + min(n, pages if pages is not None else n) * render_page
+        if detect_pii:
+            seconds += n * costs["redact_pii"]
+        return _CostEstimate(kind, n, base.scanned_ratio, base.pipeline, seconds)
+
+    n, _ = _probe_pdf(data, sample=0) if pages is None else (pages, 0.0)
+    if kind == "signals":
+        per_page = costs["signals"]
+    elif kind == "render":
+        per_page = costs["render"] * (max(72, dpi) / 220.0) ** 2
+    else:
+        per_page = costs["redact_pii"] if detect_pii else costs["redact"]
+    return _CostEstimate(kind, n, 0.0, None, per_page * max(1, n))
+
+
+class _AdmissionTicket:
+    def __init__(self, lane: str, client: str, cost: _CostEstimate, tag: float):
+        self.lane = lane
+        self.client = client
+        self.cost = cost
+        self.tag = tag
+        self.enqueued = time.time()
+        self.granted = False
+        self.wake: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = None
+
+
+class _AdmissionScheduler:
+    """
+    Gate in front of request work. Requests are split into an interactive and a batch lane by
+    estimated cost; batch may use at most `batch_slots` of the `slots` concurrent places so cheap
+    calls always find room. Inside a lane, clients share slots by weighted fair queuing (virtual
+    finish tags: cost / client weight). A lane sheds new work with 503 once its estimated backlog
+    per slot exceeds the lane's wait budget.
+    """
+
+    def __init__(self, slots: int, batch_slots: int, max_wait_s: Dict[str, float], weights: Dict[str, float]):
+        self.slots = slots
+        self.batch_slots = batch_slots
+        self.max_wait_s = max_wait_s
+        self.weights = weights
+        self._lock = threading.Lock()
+        self._queues: Dict[str, List[_AdmissionTicket]] = {lane: [] for lane in ADMISSION_LANES}
+        self._running: Dict[str, int] = {lane: 0 for lane in ADMISSION_LANES}
+        self._backlog_s: Dict[str, float] = {lane: 0.0 for lane in ADMISSION_LANES}
+        self._vtime: Dict[str, float] = {lane: 0.0 for lane in ADMISSION_LANES}
+        self._last_tag: Dict[Tuple[str, str], float] = {}
+
+    def lane_for(self, cost: _CostEstimate, requested: Optional[str]) -> str:
+        if requested == "batch":
+            return "batch"
+        return "interactive" if cost.seconds <= _env_float("ADMISSION_INTERACTIVE_MAX_S", 10) else "batch"
+
+    def _lane_slots(self, lane: str) -> int:
+        return self.slots if lane == "interactive" else self.batch_slots
+
+    def estimated_wait_s(self, lane: str) -> float:
+        return self._backlog_s[lane] / max(1, self._lane_slots(lane))
+
+    def _can_run(self, lane: str) -> bool:
+        total = sum(self._running.values())
+        return total < self.slots and self._running[lane] < self._lane_slots(lane)
+
+    def _dispatch_locked(self) -> None:
+        for lane in ADMISSION_LANES:
+            queue = self._queues[lane]
+            while queue and self._can_run(lane):
+                ticket = min(queue, key=lambda t: t.tag)
+                queue.remove(ticket)
+                self._vtime[lane] = max(self._vtime[lane], ticket.tag)
+                self._running[lane] += 1
+                ticket.granted = True
+                if isinstance(ticket.wake, threading.Event):
+                    ticket.wake.set()
+                else:
+                    loop, event = ticket.wake
+                    loop.call_soon_threadsafe(event.set)
+
+    def _enqueue(self, lane: str, client: str, cost: _CostEstimate, wake, shed: bool = True) -> _AdmissionTicket:
+        weight = max(0.01, float(self.weights.get(client, 1.0)))
+        with self._lock:
+            wait_s = self.estimated_wait_s(lane)
+            if shed and wait_s > self.max_wait_s[lane]:
+                _M_ADMISSION.inc(lane=lane, outcome="shed")
+                raise HTTPException(
+                    503,
+                    f"overloaded: estimated {lane} backlog {int(wait_s)}s exceeds {int(self.max_wait_s[lane])}s",
+                    headers={"Retry-After": str(max(1, int(wait_s)))},
+                )
+            start = max(self._vtime[lane], self._last_tag.get((lane, client), 0.0))
+            ticket = _AdmissionTicket(lane, client, cost, start + cost.seconds / weight)
+            ticket.wake = wake
+            self._last_tag[(lane, client)] = ticket.tag
+            self._backlog_s[lane] += cost.seconds
+            self._queues[lane].append(ticket)
+            self._dispatch_locked()
+        return ticket
+
+    def _abandon(self, ticket: _AdmissionTicket) -> None:
+        with self._lock:
+            if ticket.granted:
+                self._release_locked(ticket)
+            else:
+                self._queues[ticket.lane].remove(ticket)
+                self._backlog_s[ticket.lane] = max(0.0, self._backlog_s[ticket.lane] - ticket.cost.seconds)
+        _M_ADMISSION.inc(lane=ticket.lane, outcome="cancelled")
+
+    def _admitted(self, ticket: _AdmissionTicket) -> _AdmissionTicket:
+        _M_ADMISSION.inc(lane=ticket.lane, outcome="admitted")
+        _M_ADMISSION_WAIT.observe(time.time() - ticket.enqueued, lane=ticket.lane)
+        return ticket
+
+    async def admit(self, lane: str, client: str, cost: _CostEstimate, token: "_CancelToken") -> _AdmissionTicket:
+        event = asyncio.Event()
+        ticket = self._enqueue(lane, client, cost, (asyncio.get_running_loop(), event))
+        try:
+            while not event.is_set():
+                token.check()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=0.25)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        return self._admitted(ticket)
+
+    def admit_blocking(self, lane: str, client: str, cost: _CostEstimate, token: "_CancelToken") -> _AdmissionTicket:
+        """
+        `admit` for worker threads (batch documents, background jobs). The work was already accepted,
+        so it waits for a slot instead of being shed, but its cost still counts toward the backlog.
+        """
+        event = threading.Event()
+        ticket = self._enqueue(lane, client, cost, event, shed=False)
+        try:
+            while not event.wait(0.25):
+                token.check()
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        return self._admitted(ticket)
+
+    def _release_locked(self, ticket: _AdmissionTicket) -> None:
+        self._running[ticket.lane] -= 1
+        self._backlog_s[ticket.lane] = max(0.0, self._backlog_s[ticket.lane] - ticket.cost.seconds)
+        if not self._queues[ticket.lane] and not self._running[ticket.lane]:
+            # Lane drained: reset virtual time so tags do not grow without bound
+            self._vtime[ticket.lane] = 0.0
+            for key in [k for k in self._last_tag if k[0] == ticket.lane]:
+                del self._last_tag[key]
+        self._dispatch_locked()
+
+    def release(self, ticket: _AdmissionTicket) -> None:
+        with self._lock:
+            self._release_locked(ticket)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "batch_slots": self.batch_slots,
+                "lanes": {
+                    lane: {
+                        "running": self._running[lane],
+                        "queued": len(self._queues[lane]),
+                        "backlog_s": round(self._backlog_s[lane], 1),
+                        "estimated_wait_s": round(self.estimated_wait_s(lane), 1),
+                        "max_wait_s": self.max_wait_s[lane],
+                    }
+                    for lane in ADMISSION_LANES
+                },
+            }
+
+
+_SCHEDULER: Optional[_AdmissionScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+def _get_scheduler() -> Optional[_AdmissionScheduler]:
+    """ADMISSION_ENABLED=1|0 (default 1); slots default to the CPU count."""
+    global _SCHEDULER
+    if not _env_flag("ADMISSION_ENABLED"):
+        return None
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            slots = max(1, int(_env_float("ADMISSION_SLOTS", max(2, os.cpu_count() or 1))))
+            reserved = max(1, slots // 4) if slots > 1 else 0
+            batch_slots = max(1, min(slots, int(_env_float("ADMISSION_BATCH_SLOTS", slots - reserved))))
+            weights = _safe_json_loads(os.getenv("ADMISSION_CLIENT_WEIGHTS") or "{}", {})
+            _SCHEDULER = _AdmissionScheduler(
+                slots,
+                batch_slots,
+                {
+                    "interactive": _env_float("ADMISSION_INTERACTIVE_MAX_WAIT_S", 30),
+                    "batch": _env_float("ADMISSION_BATCH_MAX_WAIT_S", 900),
+                },
+                weights if isinstance(weights, dict) else {},
+            )
+        return _SCHEDULER
+
+async def _admission_cost(kind: str, data: bytes, **kwargs) -> Optional[_CostEstimate]:
+    """Cost estimate for `_run_request_work`, or None when admission control is off."""
+    if _get_scheduler() is None:
+        return None
+    try:
+        return await run_in_threadpool(_estimate_cost, kind, data, **kwargs)
+    except Exception as e:
+        logger.warning(f"cost estimate failed for {kind}: {e}")
+        return _CostEstimate(kind, 1, 0.0, kwargs.get("pipeline"), 1.0)
+
+def _background_cost_args(kind: str, params: dict) -> Tuple[str, dict]:
+    """(`_estimate_cost` kind, kwargs) for a batch document or job, as its endpoint would estimate it."""
+    if kind == "extract":
+        return "extract", {"pipeline": params.get("pipeline"), "pages": _selection_size(params.get("pages"), params.get("sample"))}
+    if kind == "render_pages":
+        return "render", {"pages": len(params.get("pages") or []), "dpi": max(72, min(600, int(params.get("dpi") or 220)))}
+    if kind == "render_regions":
+        return "render", {"pages": len(params.get("regions") or []), "dpi": max(72, min(600, int(params.get("dpi") or 220)))}
+    if kind == "redact":
+        return "redact", {"detect_pii": bool(params.get("detect_pii"))}
+    return "signals", {}
+
+@contextlib.contextmanager
+def _background_admission(client: str, token: "_CancelToken", kind: str, data: bytes, **kwargs):
+    """
+    Admission for work that does not go through `_run_request_work` (batch documents, queued jobs):
+    batch lane, the same cost estimate as the matching endpoint, waiting in the worker thread.
+    """
+    scheduler = _get_scheduler()
+    if scheduler is None:
+        yield
+        return
+    try:
+        cost = _estimate_cost(kind, data, **kwargs)
+    except Exception as e:
+        logger.warning(f"cost estimate failed for {kind}: {e}")
+        cost = _CostEstimate(kind, 1, 0.0, kwargs.get("pipeline"), 1.0)
+    ticket = scheduler.admit_blocking("batch", client, cost, token)
+    try:
+        yield
+    finally:
+        scheduler.release(ticket)
+
+def _admission_client(request: Request) -> str:
+    return (request.headers.get("x-client-id") or (request.client.host if request.client else "") or "anonymous")[:128]
+
+def _admission_backlog() -> Dict[tuple, float]:
+    if _SCHEDULER is None:
+        return {}
+    lanes = _SCHEDULER.snapshot()["lanes"]
+    return {(lane, "seconds"): float(v["backlog_s"]) for lane, v in lanes.items()} | {
+        (lane, "queued"): float(v["queued"]) for lane, v in lanes.items()
+    }
+
+# --- Scratch space for tools that only take file paths ---
+
+_SCRATCH: contextvars.ContextVar = contextvars.ContextVar("docling_scratch", default=None)
+_SCRATCH_LOCK = threading.Lock()
+_SCRATCH_IN_USE = [0]  # bytes currently reserved on the scratch filesystem by this process
+_SCRATCH_ROOT: Dict[str, str] = {}
+
+class _ScratchUsage:
+    """Scratch bytes a single request (or job) wrote, by kind and backend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = 0
+        self.bytes_written = 0
+        self._by: Dict[str, int] = {}
+
+    def add(self, kind: str, backend: str, nbytes: int) -> None:
+        with self._lock:
+            self.files += 1
+            self.bytes_written += nbytes
+            key = f"{kind}:{backend}"
+            self._by[key] = self._by.get(key, 0) + nbytes
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {"files": self.files, "bytes_written": self.bytes_written, "by_kind": dict(self._by)}
+
+def _record_scratch(kind: str, backend: str, nbytes: int) -> None:
+    _M_SCRATCH_BYTES.inc(nbytes, kind=kind, backend=backend)
+    usage = _SCRATCH.get()
+    if usage is not None and backend != "memory":
+        usage.add(kind, backend, nbytes)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        pass
+    return True
+
+def _scratch_dir_for_process() -> str:
+    """
+    This worker's scratch directory: SCRATCH_DIR, else /dev/shm when writable, else the system temp dir.
+
+    Each process owns `docling-scratch-<pid>`; directories left behind by dead workers (OOM kill,
+    SIGKILL) are swept the first time a process creates its own.
+    """
+    with _SCRATCH_LOCK:
+        cached = _SCRATCH_ROOT.get("dir")
+        if cached is not None and os.path.isdir(cached):
+            return cached
+        base = (os.getenv("SCRATCH_DIR") or "").strip()
+        if not base:
+            base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+        try:
+            for name in os.listdir(base):
+                pid = name[len("docling-scratch-"):]
+                if name.startswith("docling-scratch-") and pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+                    shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+        except Exception:
+            pass
+        path = os.path.join(base, f"docling-scratch-{os.getpid()}")
+        os.makedirs(path, exist_ok=True)
+        _SCRATCH_ROOT["dir"] = path
+        return path
+
+def _scratch_reserve(nbytes: int) -> Tuple[str, str]:
+    """
+    Reserve `nbytes` on the scratch filesystem and return (directory, backend).
+
+    SCRATCH_MAX_MB caps what one worker may hold there at once (tmpfs is RAM); past the budget,
+    or when the filesystem itself is short on space, files spill to the system temp dir instead.
+    """
+    try:
+        root = _scratch_dir_for_process()
+    except Exception as e:
+        logger.warning(f"scratch dir unavailable, spilling to {tempfile.gettempdir()}: {e}")
+        return tempfile.gettempdir(), "spill"
+    budget = int(_env_float("SCRATCH_MAX_MB", 512) * 1024 * 1024)
+    try:
+        free = shutil.disk_usage(root).free
+    except Exception:
+        free = budget
+    with _SCRATCH_LOCK:
+        if _SCRATCH_IN_USE[0] + nbytes <= budget and nbytes < free:
+            _SCRATCH_IN_USE[0] += nbytes
+            return root, "scratch"
+    return tempfile.gettempdir(), "spill"
+
+def _scratch_release(backend: str, nbytes: int) -> None:
+    if backend == "scratch":
+        with _SCRATCH_LOCK:
+            _SCRATCH_IN_USE[0] = max(0, _SCRATCH_IN_USE[0] - nbytes)
+
+@contextlib.contextmanager
+def _scratch_file(data: bytes, suffix: str, kind: str):
+    """Write `data` to a scratch file and yield its path; the file is removed however the block exits."""
+    directory, backend = _scratch_reserve(len(data))
+    path = None
+    try:
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+        with _stage("temp_write"), os.fdopen(fd, "wb") as f:
+            f.write(data)
+        _record_scratch(kind, backend, len(data))
+        yield path
+    finally:
+        if path is not None:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        _scratch_release(backend, len(data))
+
+def _tree_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+@contextlib.contextmanager
+def _scratch_dir(kind: str, expected_bytes: int = 0):
+    """Yield an empty scratch directory for a tool's output; what it wrote is accounted, then removed."""
+    directory, backend = _scratch_reserve(expected_bytes)
+    path = tempfile.mkdtemp(prefix="docling_out_", dir=directory)
+    try:
+        yield path
+    finally:
+        _record_scratch(kind, backend, _tree_bytes(path))
+        shutil.rmtree(path, ignore_errors=True)
+        _scratch_release(backend, expected_bytes)
+
+@contextlib.contextmanager
+def _docling_source(data: bytes, suffix: str):
+    """
+    Input for DocumentConverter.convert: an in-memory DocumentStream when this Docling has one,
+    otherwise a scratch file path.
+    """
+    try:
+        from docling.datamodel.base_models import DocumentStream  # type: ignore
+    except Exception:
+        DocumentStream = None
+    if DocumentStream is not None and _env_flag("SCRATCH_DOCLING_STREAM", "1"):
+        _record_scratch("input", "memory", len(data))
+        yield DocumentStream(name=f"document{suffix}", stream=io.BytesIO(data))
+        return
+    with _scratch_file(data, suffix, "input") as path:
+        yield path
+
+@atexit.register
+def _remove_scratch_dir() -> None:
+    path = _SCRATCH_ROOT.get("dir")
+    if path and os.path.basename(path) == f"docling-scratch-{os.getpid()}":
+        shutil.rmtree(path, ignore_errors=True)
+
+def _extract_with_docling(bytes_data: bytes, filename: Optional[str] = None):
+    # Minimal safe wrapper around docling. Falls back on errors.
     try:
+        suffix = ".pdf"
+        try:
+            if filename:
+                _, ext = os.path.splitext(filename)
+                if ext and ext.lower() in [".pdf", ".docx", ".doc"]:
+                    suffix = ext
+        except Exception:
+            pass
+        from docling.document_converter import DocumentConverter  # type: ignore
+
+        dc = DocumentConverter()
+        with _docling_source(bytes_data, suffix) as source:
+            res = dc.convert(source)
+        # Prefer markdown or plain text representation
+        text = ""
+        try:
+            text = res.document.export_to_markdown()
+        except Exception:
+            try:
+                text = res.document.export_to_text()
+            except Exception:
+                text = ""
+        # Blocks: collect paragraph/text nodes if available
+        blocks: List[str] = []
+        try:
+            for sec in getattr(res.document, "sections", []) or []:
+                for para in getattr(sec, "paragraphs", []) or []:
+                    t = getattr(para, "text", None)
+                    if t:
+                        blocks.append(t)
+        except Exception:
+            pass
+        pages = len(getattr(res, "pages", []) or [])
+        return {
+            "pages": pages,
+            "text": text or "\n".join(blocks),
+            "blocks": [{"text": b} for b in blocks][:200]
+        }
+    except Exception:
+        return None
+
+_DOCLING_CONVERTERS: Dict[Tuple[bool, bool], tuple] = {}
+_DOCLING_CONVERTERS_LOCK = threading.Lock()
+
+def _get_docling_converter(do_ocr: bool, do_tables: bool):
+    """
+    Return a cached (DocumentConverter, lock) for the standard PDF pipeline.
+
+    Building a converter loads layout/OCR models; reusing it keeps that cost out of every
+    request (and every document of a batch).
+    """
+    key = (do_ocr, do_tables)
+    with _DOCLING_CONVERTERS_LOCK:
+        cached = _DOCLING_CONVERTERS.get(key)
+        if cached is not None:
+            _M_CACHE.inc(cache="docling_converter", result="hit")
+            return cached
+        _M_CACHE.inc(cache="docling_converter", result="miss")
         from docling.document_converter import DocumentConverter, PdfFormatOption
         from docling.datamodel.pipeline_options import PdfPipelineOptions
-        
+
         # Configure for standard pipeline (no VLM). OCR/table extraction can be toggled via env.
         pipeline_options = PdfPipelineOptions()
-        pipeline_options.do_ocr = os.getenv("DOCLING_OCR", "1") in ("1", "true", "True", "yes")
-        pipeline_options.do_table_structure = os.getenv("DOCLING_TABLES", "1") in ("1", "true", "True", "yes")
-        
-        # Create converter with standard pipeline
+        pipeline_options.do_ocr = do_ocr
+        pipeline_options.do_table_structure = do_tables
         converter = DocumentConverter(
             format_options={
                 "pdf": PdfFormatOption(pipeline_options=pipeline_options)
             }
         )
-        
-        # Determine file extension from filename
-        suffix = ".pdf"  # default
-        try:
-            if filename:
-                _, ext = os.path.splitext(filename)
-                if ext and ext.lower() in [".pdf", ".docx", ".doc"]:
-                    suffix = ext.lower()
-        except Exception:
-            pass
-        
-        # Write bytes to temp file (Docling needs file path)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(data)
-            tmp_path = tmp.name
-        
+        cached = (converter, threading.Lock())
+        _DOCLING_CONVERTERS[key] = cached
+        return cached
+
+def _extract_with_docling_python(data: bytes, filename: str) -> dict:
+    """
+    Extract text from document using Docling Python API with standard pipeline.
+    Uses DocumentConverter directly - no CLI, no VLM, just reliable document understanding.
+    Supports both PDF and DOCX files with page tracking.
+    """
+    import os
+    
+    # Set headless mode to avoid OpenGL requirements
+    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    os.environ['MPLBACKEND'] = 'Agg'
+    
+    try:
+        do_ocr = os.getenv("DOCLING_OCR", "1") in ("1", "true", "True", "yes")
+        do_tables = os.getenv("DOCLING_TABLES", "1") in ("1", "true", "True", "yes")
+        converter, converter_lock = _get_docling_converter(do_ocr, do_tables)
+        _M_OCR.inc(decision="on" if do_ocr else "off", mode="env")
+        
+        # Determine file extension from filename
+        suffix = ".pdf"  # default
         try:
-            # Convert document
-            result = converter.convert(tmp_path)
+            if filename:
+                _, ext = os.path.splitext(filename)
+                if ext and ext.lower() in [".pdf", ".docx", ".doc"]:
+                    suffix = ext.lower()
+        except Exception:
+            pass
+        
+        # Hand the bytes over in memory when Docling accepts a stream, else via a scratch file
+        with _docling_source(data, suffix) as source:
+            # Convert document (the shared converter is not assumed to be thread-safe)
+            with converter_lock:
+                result = converter.convert(source)
             doc = result.document
             
             # Export to markdown for structured text
@@ -606,7 +2362,7 @@ def _extract_with_docling_python(data: bytes, filename: str) -> dict:
                     if hasattr(element, 'prov') and element.prov:
                         for prov_item in element.prov:
                             if hasattr(prov_item, 'page_no'):
-                                page_num = prov_item.page_no + 1  # Convert 0-indexed to 1-indexed
+                                page_num = prov_item.page_no  # DoclingDocument provenance is 1-based
                                 current_page = page_num  # Update current page tracker
                                 break
                     
@@ -632,397 +2388,2544 @@ def _extract_with_docling_python(data: bytes, filename: str) -> dict:
                 "text": markdown_text,
                 "blocks": blocks
             }
-        finally:
-            # Clean up temp file
-            import os
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
                 
     except Exception as e:
-        logger.error(f"Docling Python API extraction error: {e}")
-        return None
+        logger.error(f"Docling Python API extraction error: {e}")
+        return None
+
+# --- pdfminer tier: page-parallel, per-page time budget ---
+
+def _pdfminer_open(data: bytes) -> dict:
+    """Parse the document structure once; pages are interpreted lazily by `_pdfminer_page`."""
+    from pdfminer.pdfinterp import PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    fp = io.BytesIO(data)
+    return {"fp": fp, "pages": list(PDFPage.get_pages(fp)), "resources": PDFResourceManager(caching=True)}
+
+def _pdfminer_page(state: dict, index: int) -> Tuple[str, List[str]]:
+    """
+    Text of one page exactly as extract_text_to_fp writes it (TextConverter, no layout analysis),
+    without the trailing form feed, and its paragraphs (`_to_paragraphs` of the text lines) as blocks.
+    """
+    from pdfminer.converter import TextConverter
+    from pdfminer.pdfinterp import PDFPageInterpreter
+
+    output = io.StringIO()
+    device = TextConverter(state["resources"], output, laparams=None)
+    try:
+        PDFPageInterpreter(state["resources"], device).process_page(state["pages"][index])
+    finally:
+        device.close()
+    text = output.getvalue()
+    if text.endswith("\f"):
+        text = text[:-1]
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    return text, _to_paragraphs(lines)
+
+def _pdfminer_worker(conn) -> None:
+    """Child process loop: ("count" | "page", path, key, index) in, ("ok" | "error", index, payload) out."""
+    state_key, state = None, None
+    while True:
+        try:
+            op, path, key, index = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            return
+        try:
+            if state_key != key:
+                with open(path, "rb") as f:
+                    state_key, state = key, _pdfminer_open(f.read())
+            if op == "count":
+                conn.send(("ok", index, len(state["pages"])))
+            else:
+                conn.send(("ok", index, _pdfminer_page(state, index)))
+        except Exception as e:
+            state_key, state = None, None
+            conn.send(("error", index, f"{type(e).__name__}: {e}"[:500]))
+
+class _PdfminerTimeout(Exception):
+    """Reading the page tree overran PDFMINER_PAGE_TIMEOUT_S."""
+
+class _PdfminerPool:
+    """
+    Long-lived pdfminer worker processes (pdfminer is pure Python, so threads would serialize on the GIL).
+
+    Callers check workers out, hand them one page at a time and return them afterwards. A worker
+    that overruns the per-page budget, dies, or is abandoned mid-page by a cancelled request is
+    killed and replaced, so one pathological page costs at most one budget.
+    """
+
+    def __init__(self, size: int):
+        import multiprocessing
+
+        self.size = size
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: List[tuple] = []
+        self._live = 0
+        self._cond = threading.Condition()
+
+    def _spawn(self) -> tuple:
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_pdfminer_worker, args=(child_conn,), name="pdfminer-worker", daemon=True)
+        proc.start()
+        child_conn.close()
+        return proc, parent_conn
+
+    def acquire(self, want: int, block: bool = True) -> List[tuple]:
+        """Up to `want` workers (at least one when `block`), spawning new ones while under `size`."""
+        with self._cond:
+            while True:
+                dead = [w for w in self._idle if not w[0].is_alive()]
+                if dead:
+                    self._idle = [w for w in self._idle if w[0].is_alive()]
+                    self._live -= len(dead)
+                got = self._idle[:want]
+                del self._idle[:len(got)]
+                spawn = max(0, min(want - len(got), self.size - self._live))
+                self._live += spawn
+                if got or spawn or not block:
+                    break
+                self._cond.wait(0.5)
+                _check_cancelled()
+        try:
+            for _ in range(spawn):
+                got.append(self._spawn())
+                spawn -= 1
+        finally:
+            if spawn:
+                self._forget(spawn)
+        return got
+
+    def release(self, workers: List[tuple]) -> None:
+        with self._cond:
+            for worker in workers:
+                if worker[0].is_alive():
+                    self._idle.append(worker)
+                else:
+                    self._live -= 1
+            self._cond.notify_all()
+
+    def discard(self, worker: tuple) -> None:
+        proc, conn = worker
+        if proc.is_alive():
+            proc.kill()
+            _record_cancelled("processes_killed")
+        proc.join(2)
+        conn.close()
+        self._forget(1)
+
+    def _forget(self, n: int) -> None:
+        with self._cond:
+            self._live -= n
+            self._cond.notify_all()
+
+    def _page_count(self, worker: tuple, path: str, key: str, budget_s: float) -> int:
+        """Page count of the document, from one worker, under the per-page budget."""
+        worker[1].send(("count", path, key, -1))
+        started = time.monotonic()
+        while not worker[1].poll(0.2):
+            _check_cancelled()
+            if time.monotonic() - started > budget_s:
+                raise _PdfminerTimeout(f"page count exceeded {budget_s:g}s")
+        status, _, payload = worker[1].recv()
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def extract(self, path: str, key: str, budget_s: float) -> Tuple[int, Dict[int, tuple]]:
+        """Extract every page of the PDF at `path`; returns (page_count, {index: (status, payload)})."""
+        from multiprocessing.connection import wait
+
+        idle = self.acquire(self.size)
+        busy: Dict[object, tuple] = {}
+        results: Dict[int, tuple] = {}
+        try:
+            try:
+                count = self._page_count(idle[0], path, key, budget_s)
+            except RuntimeError:
+                raise  # the worker reported a parse error and stays usable
+            except BaseException:
+                self.discard(idle.pop(0))
+                raise
+            if count < len(idle):
+                self.release(idle[max(1, count):])
+                del idle[max(1, count):]
+            pending = list(range(count - 1, -1, -1))
+            while pending or busy:
+                while pending and idle:
+                    worker = idle.pop()
+                    index = pending.pop()
+                    worker[1].send(("page", path, key, index))
+                    busy[worker[1]] = (worker, index, time.monotonic())
+                if pending and not busy:
+                    idle = self.acquire(1)
+                    continue
+                _check_cancelled()
+                next_deadline = min(started + budget_s for _, _, started in busy.values())
+                for conn in wait(list(busy), timeout=max(0.0, min(0.5, next_deadline - time.monotonic()))):
+                    worker, index, _ = busy.pop(conn)
+                    try:
+                        status, _, payload = conn.recv()
+                        idle.append(worker)
+                    except (EOFError, OSError):
+                        status, payload = "error", "pdfminer worker exited"
+                        self.discard(worker)
+                    results[index] = (status, payload)
+                    _report_progress(len(results) / max(1, count))
+                now = time.monotonic()
+                for conn, (worker, index, started) in list(busy.items()):
+                    if now - started > budget_s:
+                        del busy[conn]
+                        self.discard(worker)
+                        results[index] = ("timeout", f"exceeded {budget_s:g}s")
+                        logger.warning(f"pdfminer_page_timeout page={index + 1} budget_s={budget_s:g}")
+                        if pending:
+                            idle.extend(self.acquire(1, block=False))
+            return count, results
+        finally:
+            # Busy workers are mid-page for a cancelled or failed call: they cannot be reused.
+            for worker, _, _ in busy.values():
+                self.discard(worker)
+            self.release(idle)
+
+_PDFMINER_POOL: Optional[_PdfminerPool] = None
+_PDFMINER_POOL_LOCK = threading.Lock()
+_PDFMINER_POOL_PID = [0]
+
+def _get_pdfminer_pool() -> Optional[_PdfminerPool]:
+    """Per-process pool (re-created after fork); None when PDFMINER_WORKERS=0."""
+    global _PDFMINER_POOL
+    with _PDFMINER_POOL_LOCK:
+        if _PDFMINER_POOL is None or _PDFMINER_POOL_PID[0] != os.getpid():
+            workers = int(_env_float("PDFMINER_WORKERS", min(4, os.cpu_count() or 1)))
+            _PDFMINER_POOL = _PdfminerPool(workers) if workers > 0 else None
+            _PDFMINER_POOL_PID[0] = os.getpid()
+        return _PDFMINER_POOL
+
+def _extract_with_pdfminer(bytes_data: bytes):
+    """
+    Last-resort tier. Pages run in parallel on the pdfminer worker pool, each under
+    PDFMINER_PAGE_TIMEOUT_S; pages that time out or fail come back empty and are listed in
+    `pages_failed`. Page texts are joined with form feeds and blocks carry 1-based page numbers
+    (the first 200 blocks, as before).
+    """
+    pool = _get_pdfminer_pool()
+    if pool is not None:
+        with _scratch_file(bytes_data, ".pdf", "input") as path:
+            count, results = pool.extract(path, _doc_digest(bytes_data), _env_float("PDFMINER_PAGE_TIMEOUT_S", 20))
+    else:
+        state = _pdfminer_open(bytes_data)
+        count, results = len(state["pages"]), {}
+        for i in range(count):
+            _check_cancelled()
+            try:
+                results[i] = ("ok", _pdfminer_page(state, i))
+            except Exception as e:
+                results[i] = ("error", f"{type(e).__name__}: {e}"[:500])
+
+    texts: List[str] = []
+    blocks: List[dict] = []
+    failed: List[dict] = []
+    for i in range(count):
+        status, payload = results.get(i, ("error", "not processed"))
+        _M_PDFMINER_PAGES.inc(outcome=status)
+        if status != "ok":
+            failed.append({"page": i + 1, "reason": status, "detail": payload})
+            texts.append("\f")
+            continue
+        page_text, page_blocks = payload
+        texts.append(page_text + "\f")
+        blocks.extend({"text": b, "page": i + 1} for b in page_blocks)
+    if count and len(failed) == count:
+        raise RuntimeError(f"pdfminer failed on every page ({failed[0]['reason']}: {failed[0]['detail']})")
+    out = {"pages": count, "text": "".join(texts), "blocks": blocks[:200]}
+    if failed:
+        out["pages_failed"] = failed
+    return out
+
+def _to_paragraphs(lines: List[str]) -> List[str]:
+    paras: List[str] = []
+    buf: List[str] = []
+    for ln in lines:
+        if len(ln) <= 2 and buf:
+            paras.append(" ".join(buf))
+            buf = []
+        else:
+            buf.append(ln)
+        if len(buf) >= 8:
+            paras.append(" ".join(buf))
+            buf = []
+    if buf:
+        paras.append(" ".join(buf))
+    return paras
+
+def _extract_with_docling_cli(bytes_data: bytes, filename: Optional[str] = None):
+    """
+    Invoke Docling CLI to convert the source to Markdown/JSON.
+    Uses authoritative flags: --to, --pipeline, --ocr/--no-ocr, --pdf-backend, --tables/--no-tables, --output
+
+    Note: Using 'standard' pipeline instead of 'vlm' to avoid model loading issues.
+    VLM pipeline requires additional model files that may not be available.
+    """
+    cli = os.getenv("DOCLING_CLI", "docling")
+    to_fmt = os.getenv("DOCLING_TO", "md")
+    # Use standard pipeline by default (faster, more reliable)
+    pipeline = os.getenv("DOCLING_PIPELINE", "standard")
+    vlm_model = os.getenv("DOCLING_VLM_MODEL", "granite_docling")
+    # OCR is the biggest performance lever for Docling.
+    # Modes:
+    # - DOCLING_OCR_MODE=on|off|auto (default auto)
+    # - DOCLING_OCR=1|0 (legacy; used when DOCLING_OCR_MODE not set)
+    ocr_mode = (os.getenv("DOCLING_OCR_MODE", "auto") or "auto").strip().lower()
+    use_ocr = os.getenv("DOCLING_OCR", "1") in ("1", "true", "True", "yes")
+    pdf_backend = os.getenv("DOCLING_PDF_BACKEND")
+    use_tables = os.getenv("DOCLING_TABLES", "1") in ("1", "true", "True", "yes")
+    # Avoid massive markdown outputs by default (Docling may embed base64 images).
+    # We do NOT rely on embedded images for Vision (we render via /render-pages and /render-regions).
+    image_export_mode = (os.getenv("DOCLING_IMAGE_EXPORT_MODE", "placeholder") or "placeholder").strip().lower()
+
+    suffix = ".pdf"
+    try:
+        if filename:
+            _, ext = os.path.splitext(filename)
+            if ext and ext.lower() in [".pdf", ".docx", ".doc"]:
+                suffix = ext
+    except Exception:
+        pass
+
+    with _scratch_file(bytes_data, suffix, "input") as tmp_path:
+        # Docling CLI writes outputs to files, not stdout. Always use a scratch output directory and read back the artifact.
+        with _scratch_dir("cli_output", len(bytes_data)) as out_dir:
+            args = [cli, "--to", to_fmt, "--output", out_dir, tmp_path]
+            # Page-incremental callers need page provenance, which only the JSON export carries
+            paged = _PAGED_OUTPUT.get() and (to_fmt or "md").strip().lower() != "json"
+            if paged:
+                args += ["--to", "json"]
+            if pipeline:
+                args += ["--pipeline", pipeline]
+            if pipeline == "vlm" and vlm_model:
+                # Optional: only applies to VLM pipeline
+                args += ["--vlm-model", vlm_model]
+            # Auto OCR heuristic: if the PDF already has selectable text, skip OCR (much faster).
+            # For scanned PDFs, enable OCR.
+            use_ocr_final = use_ocr
+            if ocr_mode in ("on", "true", "1", "yes"):
+                use_ocr_final = True
+            elif ocr_mode in ("off", "false", "0", "no"):
+                use_ocr_final = False
+            elif ocr_mode == "auto":
+                try:
+                    with _stage("selectable_text_check"):
+                        has_text = _pdf_has_selectable_text(bytes_data)
+                    if has_text:
+                        use_ocr_final = False
+                except Exception:
+                    # If auto-detection fails, fall back to DOCLING_OCR
+                    use_ocr_final = use_ocr
+
+            _M_OCR.inc(decision="on" if use_ocr_final else "off", mode=ocr_mode)
+            if use_ocr_final:
+                args += ["--ocr"]
+            else:
+                args += ["--no-ocr"]
+            if pdf_backend:
+                args += ["--pdf-backend", pdf_backend]
+            if use_tables:
+                args += ["--tables"]
+            else:
+                args += ["--no-tables"]
+            if image_export_mode in ("placeholder", "embedded", "referenced"):
+                args += ["--image-export-mode", image_export_mode]
+
+            t0 = time.time()
+            proc = _run_subprocess(args, timeout=300)
+            elapsed_ms = int((time.time() - t0) * 1000)
+            _add_stage("docling_subprocess", time.time() - t0)
+            if proc.returncode != 0:
+                stderr = (proc.stderr or "").strip()
+                raise RuntimeError(stderr[:1000] or "docling CLI failed")
+
+            logger.info(
+                f"docling_cli_ok to={to_fmt} pipeline={pipeline} ocr={use_ocr_final} tables={use_tables} image_export={image_export_mode} ms={elapsed_ms}"
+            )
+
+            # Prefer exact expected output path, otherwise fall back to first matching file in output dir.
+            t_discover = time.perf_counter()
+            stem = "document"
+            try:
+                if filename:
+                    stem = os.path.splitext(os.path.basename(filename))[0] or stem
+                else:
+                    stem = os.path.splitext(os.path.basename(tmp_path))[0] or stem
+            except Exception:
+                pass
+
+            ext_map = {
+                "md": ".md",
+                "markdown": ".md",
+                "json": ".json",
+                "yaml": ".yaml",
+                "yml": ".yml",
+                "text": ".txt",
+                "txt": ".txt",
+                "doctags": ".doctags",
+                "html": ".html",
+                "html_split_page": ".html",
+            }
+            out_ext = ext_map.get((to_fmt or "md").strip().lower(), f".{(to_fmt or 'md').strip().lower()}")
+            expected = os.path.join(out_dir, f"{stem}{out_ext}")
+            candidates: List[str] = []
+            try:
+                if os.path.isfile(expected):
+                    candidates = [expected]
+                else:
+                    candidates = sorted(
+                        [
+                            os.path.join(out_dir, f)
+                            for f in os.listdir(out_dir)
+                            if f.lower().endswith(out_ext.lower())
+                        ]
+                    )
+            except Exception:
+                candidates = []
+
+            if not candidates:
+                # Include a small amount of context to help debugging.
+                dir_listing = ""
+                try:
+                    dir_listing = ", ".join(sorted(os.listdir(out_dir))[:30])
+                except Exception:
+                    dir_listing = ""
+                raise RuntimeError(
+                    f"docling_cli_no_output_file (to={to_fmt}, ext={out_ext}, out_dir_listing={dir_listing})"
+                )
+
+            with open(candidates[0], "r", encoding="utf-8", errors="replace") as f:
+                output = f.read()
+            page_blocks: List[dict] = []
+            json_path = os.path.join(out_dir, f"{stem}.json")
+            if paged and os.path.isfile(json_path):
+                try:
+                    with open(json_path, "r", encoding="utf-8") as f:
+                        page_blocks = _docling_json_page_blocks(json.load(f))
+                except Exception as e:
+                    logger.warning(f"docling JSON export unreadable, blocks lack page numbers: {e}")
+            _add_stage("output_discovery", time.perf_counter() - t_discover)
+
+        # Determine pages best-effort
+        pages = 0
+        try:
+            import fitz
+            with _stage("page_count"):
+                doc = fitz.open(tmp_path)
+                pages = doc.page_count
+                doc.close()
+        except Exception:
+            pages = 0
+        text = output
+        if page_blocks:
+            return {"pages": pages, "text": text, "blocks": page_blocks}
+        blocks = _to_paragraphs([ln.strip() for ln in output.splitlines()])
+        return { "pages": pages, "text": text, "blocks": [{"text": b} for b in blocks][:200] }
+
+
+def _docling_json_page_blocks(doc: dict) -> List[dict]:
+    """Text and table blocks with 1-based page numbers from a DoclingDocument JSON export, in body order."""
+    blocks: List[dict] = []
+
+    def resolve(ref: str):
+        try:
+            _, collection, idx = ref.split("/")
+            return collection, doc[collection][int(idx)]
+        except Exception:
+            return None, None
+
+    def page_of(item: dict) -> Optional[int]:
+        for prov in item.get("prov") or []:
+            if isinstance(prov.get("page_no"), int):
+                return prov["page_no"]
+        return None
+
+    def walk(node: dict, depth: int = 0):
+        if depth > 64:
+            return
+        for child in node.get("children") or []:
+            collection, item = resolve(child.get("$ref") or child.get("cref") or "")
+            if item is None:
+                continue
+            text = ""
+            if collection == "texts":
+                text = (item.get("text") or "").strip()
+            elif collection == "tables":
+                rows: Dict[int, Dict[int, str]] = {}
+                for cell in (item.get("data") or {}).get("table_cells") or []:
+                    rows.setdefault(int(cell.get("start_row_offset_idx", 0)), {})[int(cell.get("start_col_offset_idx", 0))] = (cell.get("text") or "").strip()
+                text = "\n".join(" | ".join(cols[c] for c in sorted(cols)) for _, cols in sorted(rows.items()))
+            page = page_of(item)
+            if text and page is not None:
+                blocks.append({"text": text, "page": page})
+            if collection != "tables":
+                walk(item, depth + 1)
+
+    walk(doc.get("body") or {})
+    return blocks
+
+def _pdf_has_selectable_text(data: bytes) -> bool:
+    """
+    Best-effort heuristic: return True if the PDF appears to contain real embedded text.
+    This avoids enabling OCR on digital PDFs (OCR is expensive and usually unnecessary).
+    """
+    if not data or data[:4] != b"%PDF":
+        return False
+    import fitz  # PyMuPDF
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        n = min(3, doc.page_count)
+        total = 0
+        for i in range(n):
+            page = doc.load_page(i)
+            total += len((page.get_text("text") or "").strip())
+            if total >= 200:
+                return True
+        return total >= 200
+    finally:
+        doc.close()
+
+def _guess_is_image(ext: str) -> bool:
+    return ext.lower() in [".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp"]
+
+def _run_vlm_cli(cli, model, mmproj, image_path, prompt, ctx, temp, topk, topp) -> str:
+    args = [cli, "-m", model, "--image", image_path, "-p", prompt, "--ctx-size", str(ctx), "--temp", str(temp), "--top-k", str(topk), "--top-p", str(topp), "--verbose"]
+    if mmproj:
+        args += ["--mmproj", mmproj]
+    proc = _run_subprocess(args, timeout=600)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip()[:500] or "vlm cli failed")
+    return proc.stdout or ""
+
+def _vlm_output_to_markdown(output: str, img_path: str) -> str:
+    txt = (output or "").strip()
+    try:
+        from docling_core.types.doc.document import DocTagsDocument
+        from docling_core.types.doc import DoclingDocument
+        doctags = txt
+        doc = DocTagsDocument.from_doctags_and_image_pairs([doctags], [img_path])
+        ddoc = DoclingDocument.load_from_doctags(doc, document_name="Document")
+        md = ddoc.export_to_markdown()
+        if md and len(md.strip()) > 0:
+            return md
+    except Exception:
+        pass
+    return txt
+
+def _extract_with_vlm_cli(bytes_data: bytes, filename: Optional[str] = None):
+    cli = os.getenv("VLM_CLI")
+    model = os.getenv("VLM_MODEL")
+    if not cli or not model:
+        raise RuntimeError("VLM_CLI and VLM_MODEL must be set for vlm_cli pipeline")
+    mmproj = os.getenv("VLM_MMPROJ")
+    prompt = os.getenv("VLM_PROMPT", "<__media__>Convert this page to docling.")
+    ctx = int(os.getenv("VLM_CTX", "8192") or 8192)
+    temp = float(os.getenv("VLM_TEMP", "0") or 0)
+    topk = int(os.getenv("VLM_TOPK", "0") or 0)
+    topp = float(os.getenv("VLM_TOPP", "1.0") or 1.0)
+    dpi = int(os.getenv("VLM_DPI", "240") or 240)
+
+    ext = ".pdf"
+    try:
+        if filename:
+            _, e = os.path.splitext(filename)
+            if e:
+                ext = e
+    except Exception:
+        pass
+
+    # If it's an image, run single pass
+    if _guess_is_image(ext):
+        with _scratch_file(bytes_data, ext, "input") as img_path:
+            out_txt = _run_vlm_cli(cli, model, mmproj, img_path, prompt, ctx, temp, topk, topp)
+            text = _vlm_output_to_markdown(out_txt, img_path)
+            return {"pages": 1, "text": text, "blocks": [{"text": t} for t in _to_paragraphs(text.splitlines())][:200]}
+
+    # Else assume PDF
+    import fitz  # PyMuPDF
+    doc = fitz.open(stream=bytes_data, filetype="pdf")
+    pages = doc.page_count
+    md_pages: List[str] = []
+    try:
+        for i in range(pages):
+            _check_cancelled()
+            page = doc.load_page(i)
+            png = page.get_pixmap(dpi=dpi).tobytes("png")
+            with _scratch_file(png, ".png", "page_image") as img_path:
+                out_txt = _run_vlm_cli(cli, model, mmproj, img_path, prompt, ctx, temp, topk, topp)
+                md = _vlm_output_to_markdown(out_txt, img_path)
+            md_pages.append(md)
+            _report_progress((i + 1) / max(1, pages))
+    finally:
+        doc.close()
+
+    text = ("\f".join(md_pages)).strip()
+    blocks = _to_paragraphs([ln.strip() for ln in text.splitlines()])
+    return {"pages": pages, "text": text, "blocks": [{"text": b} for b in blocks][:200]}
+
+# --- Fast native (PyMuPDF) extraction tier ---
+
+FAST_TIER_PIPELINES = ("fast", "auto")
+
+def _pdf_subset_bytes(data: bytes, pages: List[int]) -> bytes:
+    """Return a new PDF containing only the given 1-based pages, in the given order."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        doc.select([p - 1 for p in pages if 1 <= p <= doc.page_count])
+        return doc.tobytes(garbage=1)
+    finally:
+        doc.close()
+
+def _parse_page_ranges(spec) -> Optional[List[List[Optional[int]]]]:
+    """
+    Parse a page selection: `"1-3,7,10-"` or a JSON array such as `[1, "4-6"]` (1-based, `10-`
+    runs to the last page). Returns [start, end] pairs (end None = open) or None when empty.
+    Raises ValueError on malformed input.
+    """
+    if spec is None:
+        return None
+    if isinstance(spec, str):
+        text = spec.strip()
+        if not text:
+            return None
+        parsed = _safe_json_loads(text, None) if text.startswith("[") else None
+        items = parsed if isinstance(parsed, list) else text.split(",")
+    elif isinstance(spec, list):
+        items = spec
+    else:
+        items = [spec]
+    ranges: List[List[Optional[int]]] = []
+    for item in items:
+        end: Optional[int]
+        if isinstance(item, (list, tuple)) and len(item) == 2:
+            # [start, end] pairs get the same checks as "start-end"
+            try:
+                start = int(item[0])
+                end = None if item[1] is None else int(item[1])
+            except (TypeError, ValueError):
+                raise ValueError("pages_must_be_ranges_like_1-3,7,10-")
+        else:
+            part = str(item).strip()
+            if not part:
+                continue
+            m = re.fullmatch(r"(\d+)\s*(?:-\s*(\d*))?", part)
+            if not m:
+                raise ValueError("pages_must_be_ranges_like_1-3,7,10-")
+            start = int(m.group(1))
+            if m.group(2) is None:
+                end = start
+            else:
+                end = int(m.group(2)) if m.group(2) else None
+        if start < 1 or (end is not None and end < start):
+            raise ValueError("pages_must_be_ranges_like_1-3,7,10-")
+        ranges.append([start, end])
+    return ranges or None
+
+def _sample_policy(value) -> Optional[dict]:
+    """
+    Page sampling for previews: `true` uses the SAMPLE_* defaults, a JSON object overrides them
+    (`first` leading pages, `spread` evenly spaced pages, `flagged` pages picked from the layout
+    signals). Empty / false disables. Raises ValueError on malformed input.
+    """
+    if value is None or value is False:
+        return None
+    if isinstance(value, dict):
+        overrides = value
+    else:
+        text = str(value).strip()
+        if text.lower() in ("", "0", "false", "no", "off", "none"):
+            return None
+        overrides = {} if text.lower() in ("1", "true", "yes", "on") else _safe_json_loads(text, None)
+        if not isinstance(overrides, dict):
+            raise ValueError("sample_must_be_true_or_json_object")
+    policy = {
+        "first": int(_env_float("SAMPLE_FIRST", 3)),
+        "spread": int(_env_float("SAMPLE_SPREAD", 3)),
+        "flagged": int(_env_float("SAMPLE_FLAGGED", 3)),
+    }
+    for key in policy:
+        if overrides.get(key) is not None:
+            try:
+                policy[key] = max(0, int(overrides[key]))
+            except (TypeError, ValueError):
+                raise ValueError("sample_values_must_be_integers")
+    return policy
+
+def _selection_size(ranges: Optional[List[List[Optional[int]]]], sample: Optional[dict]) -> Optional[int]:
+    """Upper bound on the pages a selection converts (None when it is open-ended), for admission."""
+    if ranges is None and sample is None:
+        return None
+    total = 0
+    for start, end in ranges or []:
+        if end is None:
+            return None
+        total += end - start + 1
+    if sample:
+        total += sample["first"] + sample["spread"] + sample["flagged"]
+    return total
+
+def _select_pages(data: bytes, ranges: Optional[List[List[Optional[int]]]], sample: Optional[dict]) -> List[int]:
+    """
+    Resolve page ranges plus a sample policy to sorted 1-based page numbers of this PDF.
+
+    Sampled pages are the first N, pages spread evenly over the rest of the document, and the pages
+    the layout signals flag (figures without text first, then by image coverage) that are not yet
+    selected. Pages past the end of the document are ignored; raises ValueError when none remain.
+    """
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        n = doc.page_count
+    finally:
+        doc.close()
+    selected = set()
+    for start, end in ranges or []:
+        selected.update(range(start, min(n, end if end is not None else n) + 1))
+    if sample:
+        first = set(range(1, min(n, sample["first"]) + 1))
+        selected |= first
+        rest = [p for p in range(1, n + 1) if p not in first]
+        k = min(len(rest), sample["spread"])
+        selected.update(rest[int((i + 0.5) * len(rest) / k)] for i in range(k))
+        if sample["flagged"]:
+            signals = _compute_pdf_page_signals(data).get("page_signals") or []
+            flagged = sorted(
+                (s for s in signals if s.get("figure_count") and s["page"] not in selected),
+                key=lambda s: (not s.get("figure_content_missing"), -float(s.get("image_coverage") or 0)),
+            )
+            selected.update(s["page"] for s in flagged[: sample["flagged"]])
+    pages = sorted(p for p in selected if 1 <= p <= n)
+    if not pages:
+        raise ValueError("no_pages_selected")
+    return pages
+
+def _page_fingerprints(data: bytes, pages: Optional[List[int]] = None) -> Tuple[int, Dict[int, str]]:
+    """
+    (page_count, {page: fingerprint}) for `pages` (1-based, default all). A fingerprint is a
+    digest of what determines a page's extraction result: geometry and rotation, the
+    decoded content stream, the streams of images and form XObjects it draws, its fonts (by name
+    without subset tag, type and encoding), form-field values and the native text layer.
+
+    Font programs are not hashed: subset fonts are regenerated whenever any page of a revision
+    changes, which would invalidate every page. The text layer is taken from the shared word
+    index, so pages already indexed by the fast tier, /signals or /redact are not re-extracted.
+    """
+    import fitz  # PyMuPDF
+
+    digest = _doc_digest(data)
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        stream_digests: Dict[int, bytes] = {}
+
+        def stream_digest(xref: int) -> bytes:
+            if xref not in stream_digests:
+                try:
+                    raw = doc.xref_stream(xref) or b""
+                except Exception:
+                    raw = b""
+                stream_digests[xref] = hashlib.sha1(raw).digest()
+            return stream_digests[xref]
+
+        out: Dict[int, str] = {}
+        for p in pages or range(1, doc.page_count + 1):
+            _check_cancelled()
+            page = doc.load_page(p - 1)
+            h = hashlib.sha256()
+            h.update(f"{tuple(page.rect)}|{page.rotation}".encode("utf-8"))
+            h.update(page.read_contents() or b"")
+            for img in page.get_images(full=True):
+                h.update(img[7].encode("utf-8", "replace"))
+                h.update(stream_digest(img[0]))
+                if img[1]:
+                    h.update(stream_digest(img[1]))
+            for xobj in page.get_xobjects():
+                h.update(stream_digest(xobj[0]))
+            for font in page.get_fonts(full=True):
+                basefont = font[3].split("+", 1)[-1]
+                h.update(f"{basefont}|{font[2]}|{font[5]}".encode("utf-8", "replace"))
+            for widget in page.widgets() or []:
+                h.update(f"{widget.field_name}={widget.field_value}".encode("utf-8", "replace"))
+            h.update("\x1f".join(_page_word_index(page, digest).tokens()).encode("utf-8", "replace"))
+            out[p] = h.hexdigest()
+        return doc.page_count, out
+    finally:
+        doc.close()
+
+def _sort_blocks_reading_order(blocks: List[dict], page_width: float) -> List[dict]:
+    """
+    Order text blocks for reading: top-to-bottom, and column-by-column on two-column pages.
+
+    Full-width blocks (titles, wide paragraphs) split the page into bands. Inside a band, blocks
+    are only read column-wise when both halves hold several blocks that do not share rows;
+    row-aligned layouts such as forms ("Name: ...   Date: ...") keep plain top-to-bottom order.
+    """
+    if len(blocks) < 2:
+        return list(blocks)
+    mid = page_width / 2.0
+    wide = page_width * 0.55
+    ordered: List[dict] = []
+    band: List[dict] = []
+
+    def flush():
+        if not band:
+            return
+        left = [b for b in band if (b["bbox"][0] + b["bbox"][2]) / 2.0 < mid]
+        right = [b for b in band if (b["bbox"][0] + b["bbox"][2]) / 2.0 >= mid]
+        aligned = sum(1 for r in right if any(abs(r["bbox"][1] - lb["bbox"][1]) < 3.0 for lb in left))
+        if len(left) >= 2 and len(right) >= 2 and aligned <= len(right) // 2:
+            band_sorted = sorted(left, key=lambda b: (b["bbox"][1], b["bbox"][0]))
+            band_sorted += sorted(right, key=lambda b: (b["bbox"][1], b["bbox"][0]))
+        else:
+            band_sorted = sorted(band, key=lambda b: (b["bbox"][1], b["bbox"][0]))
+        ordered.extend(band_sorted)
+        band.clear()
+
+    for b in sorted(blocks, key=lambda b: (b["bbox"][1], b["bbox"][0])):
+        if (b["bbox"][2] - b["bbox"][0]) >= wide:
+            flush()
+            ordered.append(b)
+        else:
+            band.append(b)
+    flush()
+    return ordered
+
+def _fast_page_quality(text: str, avg_word_len: float, image_pct: float) -> Optional[str]:
+    """
+    Decide whether a natively extracted page is good enough, returning an escalation reason if not.
+
+    - scanned: (almost) no text layer but significant image coverage
+    - low_quality: text layer exists but looks garbled (replacement glyphs, few alphanumerics,
+      or run-together words typical of broken font encodings)
+    """
+    min_chars = int(_env_float("FAST_MIN_PAGE_CHARS", 30))
+    stripped = (text or "").strip()
+    n = len(stripped)
+    if n < min_chars:
+        if image_pct >= _env_float("FAST_SCANNED_IMAGE_COVERAGE", 0.3):
+            return "scanned"
+        return None
+    visible = [ch for ch in stripped if not ch.isspace()]
+    if not visible:
+        return "low_quality"
+    bad = sum(1 for ch in visible if ch == "\ufffd" or (ord(ch) < 32))
+    if bad / len(visible) > 0.05:
+        return "low_quality"
+    alnum = sum(1 for ch in visible if ch.isalnum())
+    if alnum / len(visible) < 0.4:
+        return "low_quality"
+    if avg_word_len > 25:
+        return "low_quality"
+    return None
+
+def _fast_page_has_tables(page) -> bool:
+    if not _env_flag("FAST_DETECT_TABLES", "1"):
+        return False
+    try:
+        # find_tables() (default "lines" strategy) needs vector ruling lines and costs ~100 ms per page;
+        # skip it outright on pages with too few drawings to form a grid.
+        if len(page.get_cdrawings()) < 4:
+            return False
+        return bool(page.find_tables().tables)
+    except Exception:
+        return False
+
+def _fast_extract_page(page, digest: Optional[str] = None) -> dict:
+    """Native text for one page: reading-ordered blocks with bboxes plus an escalation verdict."""
+    index = _page_word_index(page, digest)
+    page_no = index.page_no
+
+    blocks: List[dict] = []
+    for t, bbox in zip(index.block_texts(), index.block_bboxes().tolist()):
+        t = t.strip()
+        if t:
+            blocks.append({"text": t, "page": page_no, "bbox": bbox})
+    blocks = _sort_blocks_reading_order(blocks, index.width)
+    text = "\n\n".join(b["text"] for b in blocks)
+
+    image_pct = _clamp01(float(_box_areas(index.image_coords).sum()) / index.page_area)
+
+    reason = _fast_page_quality(text, index.mean_word_length(), image_pct)
+    if reason is None and _fast_page_has_tables(page):
+        reason = "tables"
+
+    return {
+        "page": page_no,
+        "text": text,
+        "blocks": blocks,
+        "chars": len(text),
+        "words": len(index),
+        "escalate": reason,
+    }
+
+_PAGED_OUTPUT: contextvars.ContextVar = contextvars.ContextVar("docling_paged_output", default=False)
+
+def _split_result_by_page(res: dict, pages: List[int]) -> Optional[Dict[int, dict]]:
+    """
+    Attribute a conversion of `pages` (in that order) back to the original page numbers.
+
+    Works when only one page was converted, when every block carries page provenance, or when the
+    text separates pages with form feeds (VLM CLI, pdfminer). Returns None otherwise.
+    """
+    blocks = res.get("blocks") or []
+    if len(pages) == 1:
+        return {pages[0]: {"text": (res.get("text") or "").strip(), "blocks": [{**b, "page": pages[0]} for b in blocks]}}
+
+    if blocks and all(isinstance(b.get("page"), int) and 1 <= b["page"] <= len(pages) for b in blocks):
+        per_page = {p: {"text": "", "blocks": []} for p in pages}
+        for b in blocks:
+            orig = pages[b["page"] - 1]
+            per_page[orig]["blocks"].append({**b, "page": orig})
+        for p, entry in per_page.items():
+            entry["text"] = "\n\n".join(b.get("text", "") for b in entry["blocks"])
+        return per_page
+
+    parts = (res.get("text") or "").split("\f")
+    if len(parts) == len(pages) + 1 and not parts[-1].strip():
+        parts = parts[:-1]
+    if len(parts) == len(pages):
+        per_page = {}
+        for p, part in zip(pages, parts):
+            lines = [ln.strip() for ln in part.splitlines() if ln.strip()]
+            per_page[p] = {"text": part.strip(), "blocks": [{"text": t, "page": p} for t in _to_paragraphs(lines)]}
+        return per_page
+    return None
+
+def _page_cache_key(fingerprint: str, pipeline: str) -> str:
+    return f"{fingerprint}:{pipeline}:{_config_fingerprint(*_EXTRACT_CONFIG_ENV)}"
+
+def _convert_pages(
+    data: bytes,
+    pages: List[int],
+    filename: Optional[str],
+    pipeline: str = "docling_cli",
+    fingerprints: Optional[Tuple[int, Dict[int, str]]] = None,
+) -> Tuple[Dict[int, dict], Optional[dict], Optional[str], List[int]]:
+    """
+    Convert a subset of pages through the Docling cascade, reusing page results cached under the
+    same page fingerprint. `fingerprints` is `_page_fingerprints` output (computed for `pages`
+    when omitted and a result cache is configured); pages without a fingerprint are neither
+    looked up nor cached.
+
+    Returns (per_page, group, tier, reused). `per_page` maps original page numbers to
+    {text, blocks, tier}; `reused` lists the pages served from the page cache. When the
+    conversion cannot be split back onto pages, it is returned as `group` and attributed to the
+    converted pages collectively (nothing is cached for them).
+    """
+    if fingerprints is None and _get_result_cache() is None:
+        fingerprints = (_probe_pdf(data, sample=0)[0], {})
+    elif fingerprints is None:
+        with _stage("page_fingerprint"):
+            fingerprints = _page_fingerprints(data, pages)
+    page_count, by_page = fingerprints
+    per_page: Dict[int, dict] = {}
+    reused: List[int] = []
+    missing: List[int] = []
+    for p in pages:
+        cached = _cache_get_json("page", _page_cache_key(by_page[p], pipeline)) if p in by_page else None
+        if cached is None:
+            missing.append(p)
+            continue
+        per_page[p] = {**cached, "blocks": [{**b, "page": p} for b in cached.get("blocks") or []]}
+        reused.append(p)
+
+    tier = per_page[reused[0]].get("tier") if reused else None
+    if not missing:
+        return per_page, None, tier, reused
+
+    whole = missing == list(range(1, page_count + 1))
+    sub = data if whole else _pdf_subset_bytes(data, missing)
+    paged_token = _PAGED_OUTPUT.set(True)
+    try:
+        res, tier = _extract_docling_cascade(sub, filename, pipeline)
+    finally:
+        _PAGED_OUTPUT.reset(paged_token)
+    if res is None:
+        return per_page, None, None, reused
+
+    split = _split_result_by_page(res, missing)
+    if split is None:
+        return per_page, res, tier, reused
+    # Fallback-tier pages and pages the tier gave up on are returned but not cached
+    failed = {missing[f["page"] - 1]: f.get("reason") for f in res.get("pages_failed") or [] if 1 <= f.get("page", 0) <= len(missing)}
+    cacheable = tier == _cascade_primary_tier(pipeline)
+    for p, entry in split.items():
+        entry["tier"] = tier
+        per_page[p] = entry
+        if p in failed:
+            entry["failed"] = failed[p]
+            continue
+        if not cacheable or p not in by_page:
+            continue
+        _cache_put_json(
+            "page",
+            _page_cache_key(by_page[p], pipeline),
+            {"text": entry["text"], "blocks": [{k: v for k, v in b.items() if k != "page"} for b in entry["blocks"]], "tier": tier},
+        )
+    return per_page, None, tier, reused
+
+def _extract_with_fast_tier(
+    data: bytes, filename: Optional[str] = None, escalate: bool = False, pages: Optional[List[int]] = None
+) -> Optional[dict]:
+    """
+    Page-aware native extraction via PyMuPDF (milliseconds per digital page).
+
+    With escalate=True (EXTRACT_PIPELINE=auto), pages that look scanned, contain tables or fail the
+    quality check are re-converted through Docling; all other pages keep their native text.
+    Escalated pages already converted in an earlier revision of the document are taken from the
+    page cache. The response reports which tier handled each page in `page_tiers`. With `pages`,
+    only those (1-based) pages are extracted.
+    """
+    import fitz  # PyMuPDF
+
+    t0 = time.time()
+    digest = _doc_digest(data)
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        page_count = doc.page_count
+        selected = pages or list(range(1, page_count + 1))
+        page_results = []
+        for i, p in enumerate(selected):
+            _check_cancelled()
+            with _stage("fast_native"):
+                page_results.append(_fast_extract_page(doc.load_page(p - 1), digest))
+            _report_progress(0.5 * (i + 1) / max(1, len(selected)))
+    finally:
+        doc.close()
+
+    flagged = [r["page"] for r in page_results if r["escalate"]]
+    per_page: Dict[int, dict] = {}
+    group = None
+    esc_tier = None
+    reused: List[int] = []
+    if escalate and flagged:
+        try:
+            with _stage("escalation"):
+                per_page, group, esc_tier, reused = _convert_pages(data, flagged, filename)
+        except Exception as e:
+            logger.warning(f"Fast tier escalation failed, keeping native text: {e}")
+
+    texts: List[str] = []
+    blocks: List[dict] = []
+    page_tiers: List[dict] = []
+    group_emitted = False
+    for r in page_results:
+        p = r["page"]
+        entry = {"page": p, "tier": "fast"}
+        if r["escalate"]:
+            entry["reason"] = r["escalate"]
+
+        if p in per_page:
+            entry["tier"] = per_page[p].get("tier") or esc_tier
+            if p in reused:
+                entry["cached"] = True
+            texts.append(per_page[p]["text"])
+            blocks.extend(per_page[p]["blocks"])
+        elif group is not None and p in flagged:
+            entry["tier"] = esc_tier
+            entry["page_split"] = False
+            if not group_emitted:
+                texts.append(group.get("text") or "")
+                blocks.extend({k: v for k, v in b.items() if k != "page"} for b in group.get("blocks") or [])
+                group_emitted = True
+        else:
+            if r["text"]:
+                texts.append(r["text"])
+            blocks.extend(r["blocks"])
+        page_tiers.append(entry)
+
+    logger.info(
+        f"fast_tier_ok pages={len(selected)}/{page_count} flagged={len(flagged)} escalated={bool(per_page or group)} reused={len(reused)} ms={int((time.time() - t0) * 1000)}"
+    )
+    out = {
+        "pages": page_count,
+        "text": "\n\n".join(t for t in texts if t),
+        "blocks": blocks,
+        "tier": "auto" if escalate else "fast",
+        "page_tiers": page_tiers,
+    }
+    if escalate:
+        out["pages_reused"] = len(reused)
+    if pages:
+        out["pages_selected"] = selected
+    return out
+
+_INCREMENTAL_WITHOUT_CACHE_WARNED = [False]
+
+def _incremental_requested(flag: Optional[bool] = None) -> bool:
+    """
+    Per-request `incremental` form field, else INCREMENTAL_EXTRACT (default off). Page results
+    live in the result cache, so without one (CACHE_BACKEND=off) there is nothing to reuse and
+    incremental extraction is skipped, with a warning logged once.
+    """
+    requested = _env_flag("INCREMENTAL_EXTRACT", "0") if flag is None else bool(flag)
+    if requested and _get_result_cache() is None:
+        if not _INCREMENTAL_WITHOUT_CACHE_WARNED[0]:
+            _INCREMENTAL_WITHOUT_CACHE_WARNED[0] = True
+            logger.warning("incremental extraction needs a result cache (CACHE_BACKEND=memory|sqlite); converting without page reuse")
+        return False
+    return requested
+
+def _extract_paged(
+    data: bytes, filename: Optional[str], pipeline: str, pages: Optional[List[int]] = None, incremental: bool = True
+) -> Optional[dict]:
+    """
+    Page-wise Docling extraction. With `pages`, only those pages are converted (as a subset PDF)
+    and reported under their original page numbers; `pages` in the result stays the document's
+    page count. `text` is assembled page by page from the converted blocks.
+
+    With `incremental`, pages whose fingerprint was converted before (e.g. in an earlier revision
+    of the same document) are stitched from the page cache and only new or changed pages are
+    converted. Only the selected pages are fingerprinted.
+    """
+    if incremental:
+        with _stage("page_fingerprint"):
+            fingerprints = _page_fingerprints(data, pages)
+    else:
+        fingerprints = (_probe_pdf(data, sample=0)[0], {})
+    n = fingerprints[0]
+    if n == 0:
+        return None
+    selected = pages or list(range(1, n + 1))
+    subset = {"pages_selected": selected} if pages else {}
+    per_page, group, tier, reused = _convert_pages(data, selected, filename, pipeline, fingerprints)
+
+    if len(per_page) < len(selected):
+        if group is not None and not reused:
+            # Converted but not attributable to pages: plain (non-incremental) result
+            group.setdefault("tier", tier)
+            if incremental:
+                group["pages_reused"] = 0
+            if pages:
+                group.update(pages=n, blocks=[{k: v for k, v in b.items() if k != "page"} for b in group.get("blocks") or []], **subset)
+            return group
+        if reused:
+            logger.info(f"incremental extraction could not stitch pages ({len(reused)} cached), reconverting")
+            res, tier = _extract_docling_cascade(data if not pages else _pdf_subset_bytes(data, selected), filename, pipeline)
+            if res is not None:
+                res.setdefault("tier", tier)
+                res["pages_reused"] = 0
+                if pages:
+                    res.update(pages=n, blocks=[{k: v for k, v in b.items() if k != "page"} for b in res.get("blocks") or []], **subset)
+            return res
+        return None
+
+    texts = [per_page[p]["text"] for p in selected]
+    failed = [{"page": p, "reason": per_page[p]["failed"]} for p in selected if per_page[p].get("failed")]
+    logger.info(f"paged_extract_ok pages={len(selected)}/{n} reused={len(reused)} converted={len(selected) - len(reused)}")
+    return {
+        "pages": n,
+        "text": "\n\n".join(t for t in texts if t),
+        "blocks": [b for p in selected for b in per_page[p]["blocks"]],
+        "tier": tier or per_page[selected[0]].get("tier"),
+        "page_tiers": [
+            {"page": p, "tier": per_page[p].get("tier"), **({"cached": True} if p in reused else {})} for p in selected
+        ],
+        **({"pages_reused": len(reused), "pages_converted": len(selected) - len(reused)} if incremental else {}),
+        **({"pages_failed": failed} if failed else {}),
+        **subset,
+    }
+
+def _cascade_attempts(pipeline: str) -> list:
+    """(tier, extractor) pairs the Docling cascade tries for `pipeline`, in order."""
+    attempts = []
+    # Prefer CLI when available (enables OCR via DOCLING_OCR=1)
+    if pipeline in ("docling_cli", "cli") and CLI_AVAILABLE:
+        attempts.append(("docling_cli", _extract_with_docling_cli))
+    if pipeline in ("vlm_cli", "vlm") and os.getenv("VLM_CLI") and os.getenv("VLM_MODEL"):
+        attempts.append(("vlm_cli", _extract_with_vlm_cli))
+    # Python API (may disable OCR by default; see DOCLING_OCR env)
+    if DOCILING_AVAILABLE:
+        attempts.append(("docling_python", _extract_with_docling_python))
+    attempts.append(("pdfminer", lambda d, _f: _extract_with_pdfminer(d)))
+    return attempts
+
+def _cascade_primary_tier(pipeline: str) -> str:
+    """The first tier the cascade tries for `pipeline`; a result from any later tier is a fallback."""
+    return _cascade_attempts(pipeline)[0][0]
+
+def _extract_docling_cascade(
+    data: bytes, filename: Optional[str], pipeline: str, offload: bool = True
+) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Run the Docling conversion cascade (CLI -> VLM CLI -> Python API -> pdfminer).
+
+    Returns (result, tier) where tier names the stage that produced the result. HTTP workers of
+    a multi-process deployment hand this off to the model workers instead (see `_offload_cascade`).
+    """
+    if offload and _service_role() == "http":
+        return _offload_cascade(data, filename, pipeline)
+    prev = None
+    for tier, fn in _cascade_attempts(pipeline):
+        if prev is not None:
+            _M_FALLBACKS.inc(from_tier=prev, to_tier=tier)
+        t0 = time.time()
+        try:
+            res = fn(data, filename)
+        except Exception as e:
+            logger.warning(f"{tier} extraction failed, falling back: {e}")
+            res = None
+        _M_TIER_SECONDS.observe(time.time() - t0, tier=tier, outcome="ok" if res is not None else "failed")
+        _add_stage(f"tier_{tier}", time.time() - t0)
+        if res is not None:
+            return res, tier
+        prev = tier
+    return None, None
+
+
+def _resolve_extract_pipeline(pipeline: Optional[str] = None) -> str:
+    raw = pipeline or os.getenv("EXTRACT_PIPELINE", "docling_cli") or "docling_cli"
+    return raw.strip().lower()
+
+
+# Settings that change extraction output; part of the result cache key.
+_EXTRACT_CONFIG_ENV = (
+    "DOCLING_CLI", "DOCLING_OCR", "DOCLING_OCR_MODE", "DOCLING_TABLES", "DOCLING_PIPELINE", "DOCLING_TO",
+    "DOCLING_PDF_BACKEND", "DOCLING_IMAGE_EXPORT_MODE", "DOCLING_VLM_MODEL", "VLM_CLI", "VLM_MODEL",
+    "VLM_MMPROJ", "VLM_PROMPT", "VLM_DPI", "VLM_TEMP", "VLM_TOPK", "VLM_TOPP", "VLM_CTX",
+    "FAST_DETECT_TABLES", "FAST_MIN_PAGE_CHARS", "FAST_SCANNED_IMAGE_COVERAGE",
+)
+
+def _run_extract(
+    data: bytes,
+    filename: Optional[str],
+    pipeline: Optional[str] = None,
+    incremental: Optional[bool] = None,
+    page_ranges: Optional[List[List[Optional[int]]]] = None,
+    sample: Optional[dict] = None,
+) -> Optional[dict]:
+    """
+    Synchronous extraction entrypoint shared by the HTTP endpoint and background callers.
+
+    `fast` / `auto` try the native PyMuPDF tier first; everything else (and any fast-tier
+    failure) goes through the Docling cascade, page-incrementally when requested. `page_ranges`
+    / `sample` (PDF only) restrict extraction to the selected pages. Results are cached by
+    document digest, file type, pipeline, page selection and extraction settings, but only when
+    they came from the pipeline's primary tier (see `_extract_cacheable`).
+    """
+    pipeline = _resolve_extract_pipeline(pipeline)
+    pages = None
+    if (page_ranges or sample) and data[:4] == b"%PDF":
+        with _stage("page_select"):
+            pages = _select_pages(data, page_ranges, sample)
+    incremental = pipeline not in FAST_TIER_PIPELINES and data[:4] == b"%PDF" and _incremental_requested(incremental)
+    ext = os.path.splitext(filename or "")[1].lower()
+    key = f"{_doc_digest(data)}:{ext}:{pipeline}:{int(incremental)}:{_config_fingerprint(*_EXTRACT_CONFIG_ENV)}"
+    if pages:
+        key += ":pages=" + ",".join(map(str, pages))
+    return _cached_json(
+        "extract",
+        key,
+        lambda: _run_extract_uncached(data, filename, pipeline, incremental, pages),
+        cacheable=lambda res: _extract_cacheable(res, pipeline),
+    )
+
+def _extract_cacheable(res: Optional[dict], pipeline: str) -> bool:
+    """
+    Only full-fidelity results are cached: a fallback tier after a transient Docling failure, an
+    auto-tier page whose escalation failed, or pages the pdfminer tier gave up on would otherwise
+    be served for CACHE_TTL_S.
+    """
+    if not res or res.get("pages_failed"):
+        return False
+    tier = res.get("tier")
+    if tier == "fast":
+        return True
+    if tier == "auto":
+        primary = _cascade_primary_tier("docling_cli")
+        return all(e.get("tier") == primary for e in res.get("page_tiers") or [] if e.get("reason"))
+    primary = _cascade_primary_tier("docling_cli" if pipeline in FAST_TIER_PIPELINES else pipeline)
+    return all(t == primary for t in [e.get("tier") for e in res.get("page_tiers") or []] or [tier])
+
+def _run_extract_uncached(
+    data: bytes, filename: Optional[str], pipeline: str, incremental: bool = False, pages: Optional[List[int]] = None
+) -> Optional[dict]:
+    if pipeline in FAST_TIER_PIPELINES and data[:4] == b"%PDF":
+        tier = "auto" if pipeline == "auto" else "fast"
+        t0 = time.time()
+        res = None
+        try:
+            res = _extract_with_fast_tier(data, filename, escalate=(pipeline == "auto"), pages=pages)
+        except Exception as e:
+            logger.warning(f"Fast tier extraction failed, falling back to Docling: {e}")
+        ok = bool(res and (res.get("text") or res.get("blocks")))
+        _M_TIER_SECONDS.observe(time.time() - t0, tier=tier, outcome="ok" if ok else "failed")
+        if ok:
+            _M_PAGES.inc(len(pages) if pages else int(res.get("pages") or 0), stage="extract")
+            return res
+        _M_FALLBACKS.inc(from_tier=tier, to_tier="docling_cli" if CLI_AVAILABLE else "docling_python")
+        pipeline = "docling_cli"
+
+    res, tier, paged = None, None, False
+    if incremental or pages:
+        try:
+            res = _extract_paged(data, filename, pipeline, pages, incremental=incremental)
+            paged = True
+        except _WorkCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"paged extraction failed, converting {'selected pages' if pages else 'whole document'}: {e}")
+        tier = res.get("tier") if res else None
+    # A selection the paged path already ran through the cascade is not converted a second time
+    if res is None and pages and not paged:
+        res, tier = _extract_docling_cascade(_pdf_subset_bytes(data, pages), filename, pipeline)
+        if res is not None:
+            res.update(pages=_probe_pdf(data, sample=0)[0], pages_selected=pages)
+            res["blocks"] = [{k: v for k, v in b.items() if k != "page"} for b in res.get("blocks") or []]
+    if res is None and not pages:
+        res, tier = _extract_docling_cascade(data, filename, pipeline)
+    if res is not None:
+        res.setdefault("tier", tier)
+        _M_PAGES.inc(len(pages) if pages else int(res.get("pages") or 0), stage="extract")
+    return res
+
+
+# --- Result cache (per-process memory or cross-process SQLite) ---
+
+class _ResultCache:
+    """
+    Content-addressed cache for extraction/signals/render results.
+
+    backend=memory keeps a per-process LRU; backend=sqlite stores entries in CACHE_DIR so every
+    worker process on the node shares one copy (used by `python main.py serve`). Both are bounded
+    by CACHE_MAX_MB and evict least-recently-used entries first.
+    """
+
+    def __init__(self, backend: str, max_bytes: int, ttl_s: float, root: Optional[str] = None):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[Tuple[str, str], Tuple[float, bytes]]" = OrderedDict()
+        self._mem_bytes = 0
+        self._puts = 0
+        if backend == "sqlite":
+            os.makedirs(root, exist_ok=True)
+            self.db_path = os.path.join(root, "cache.sqlite3")
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS cache (
+                        ns TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        value BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL,
+                        PRIMARY KEY (ns, key)
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def get(self, ns: str, key: str) -> Optional[bytes]:
+        now = time.time()
+        if self.backend == "memory":
+            with self._lock:
+                entry = self._mem.get((ns, key))
+                if entry is None:
+                    return None
+                if self.ttl_s and now - entry[0] > self.ttl_s:
+                    self._mem.pop((ns, key))
+                    self._mem_bytes -= len(entry[1])
+                    return None
+                self._mem.move_to_end((ns, key))
+                return entry[1]
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM cache WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+            if row is None:
+                return None
+            if self.ttl_s and now - row[1] > self.ttl_s:
+                conn.execute("DELETE FROM cache WHERE ns = ? AND key = ?", (ns, key))
+                return None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE ns = ? AND key = ?", (now, ns, key))
+            return bytes(row[0])
+
+    def put(self, ns: str, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes // 4:
+            return
+        now = time.time()
+        if self.backend == "memory":
+            with self._lock:
+                old = self._mem.pop((ns, key), None)
+                if old is not None:
+                    self._mem_bytes -= len(old[1])
+                self._mem[(ns, key)] = (now, value)
+                self._mem_bytes += len(value)
+                while self._mem_bytes > self.max_bytes and self._mem:
+                    _, (_, evicted) = self._mem.popitem(last=False)
+                    self._mem_bytes -= len(evicted)
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (ns, key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (ns, key, sqlite3.Binary(value), len(value), now, now),
+            )
+            with self._lock:
+                self._puts += 1
+                check = self._puts % 16 == 1
+            if check:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = conn.execute("SELECT ns, key, size FROM cache ORDER BY accessed_at").fetchall()
+        for ns, key, size in rows:
+            if total <= target:
+                break
+            conn.execute("DELETE FROM cache WHERE ns = ? AND key = ?", (ns, key))
+            total -= size
+
+    def stats(self) -> Dict[tuple, float]:
+        if self.backend == "memory":
+            with self._lock:
+                return {("memory", "bytes"): float(self._mem_bytes), ("memory", "entries"): float(len(self._mem))}
+        with self._connect() as conn:
+            n, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {("sqlite", "bytes"): float(size), ("sqlite", "entries"): float(n)}
+
+
+_RESULT_CACHE: Optional[_ResultCache] = None
+_RESULT_CACHE_INIT = False
+_RESULT_CACHE_LOCK = threading.Lock()
+
+def _get_result_cache() -> Optional[_ResultCache]:
+    """CACHE_BACKEND=off (default; `serve` sets sqlite) | memory | sqlite."""
+    global _RESULT_CACHE, _RESULT_CACHE_INIT
+    with _RESULT_CACHE_LOCK:
+        if not _RESULT_CACHE_INIT:
+            _RESULT_CACHE_INIT = True
+            backend = (os.getenv("CACHE_BACKEND", "off") or "off").strip().lower()
+            if backend in ("memory", "sqlite"):
+                root = os.getenv("CACHE_DIR") or os.path.join(tempfile.gettempdir(), "docling_cache")
+                max_bytes = int(_env_float("CACHE_MAX_MB", 256) * 1024 * 1024)
+                try:
+                    _RESULT_CACHE = _ResultCache(backend, max_bytes, _env_float("CACHE_TTL_S", 86400), root)
+                except Exception as e:
+                    logger.warning(f"result cache disabled: {e}")
+        return _RESULT_CACHE
+
+def _doc_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _config_fingerprint(*names: str) -> str:
+    """Stable digest of the env settings that influence a cached result."""
+    return hashlib.sha1("|".join(f"{n}={os.getenv(n, '')}" for n in names).encode("utf-8")).hexdigest()[:12]
+
+def _cache_get_json(ns: str, key: str):
+    """Cached JSON value for (ns, key), or None on a miss or when caching is off."""
+    cache = _get_result_cache()
+    if cache is None:
+        return None
+    try:
+        raw = cache.get(ns, key)
+    except Exception as e:
+        logger.warning(f"cache get failed ns={ns}: {e}")
+        raw = None
+    _M_CACHE.inc(cache=ns, result="hit" if raw is not None else "miss")
+    return json.loads(raw) if raw is not None else None
+
+def _cache_put_json(ns: str, key: str, value) -> None:
+    cache = _get_result_cache()
+    if cache is None or value is None:
+        return
+    try:
+        cache.put(ns, key, _json_dumps(value))
+    except Exception as e:
+        logger.warning(f"cache put failed ns={ns}: {e}")
+
+def _cached_json(ns: str, key: str, compute, cacheable=None):
+    """
+    Return the cached JSON value for (ns, key) or compute, store and return it. None is never
+    cached, nor is a value `cacheable(value)` rejects.
+    """
+    value = _cache_get_json(ns, key)
+    if value is None:
+        value = compute()
+        if value is not None and (cacheable is None or cacheable(value)):
+            _cache_put_json(ns, key, value)
+    return value
+
+
+# --- Durable background jobs (POST /jobs, GET /jobs/{id}) ---
+
+JOB_KINDS = ("extract", "signals", "render_pages", "render_regions", "redact")
+JOB_FINAL_STATES = ("succeeded", "failed", "cancelled")
+
+_PROGRESS: contextvars.ContextVar = contextvars.ContextVar("docling_progress", default=None)
+
+def _report_progress(fraction: float) -> None:
+    """Report coarse progress (0..1) for the current unit of work; no-op outside a job."""
+    cb = _PROGRESS.get()
+    if cb is None:
+        return
+    try:
+        cb(max(0.0, min(1.0, float(fraction))))
+    except Exception:
+        pass
+
+
+class _JobStore:
+    """
+    SQLite-backed job queue. Job inputs and results are stored as files next to the database,
+    so queued and finished work survives a restart.
+
+    Running jobs hold a lease that their worker keeps refreshing; a job whose lease expired
+    (e.g. the process died mid-conversion) becomes claimable again.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.db_path = os.path.join(root, "jobs.sqlite3")
+        self.lease_s = max(10.0, _env_float("JOBS_LEASE_S", 60))
+        self.max_attempts = max(1, int(_env_float("JOBS_MAX_ATTEMPTS", 3)))
+        self.wake = threading.Condition()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    filename TEXT,
+                    input_path TEXT,
+                    result_path TEXT,
+                    result_type TEXT,
+                    error TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    fetched_at REAL,
+                    priority INTEGER NOT NULL DEFAULT 1
+                )
+                """
+            )
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(jobs)").fetchall()}
+            if "priority" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 1")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_priority ON jobs (status, priority, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _write_blob(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.blob_dir, name)
+        tmp_path = path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def submit(self, kind: str, data: bytes, filename: Optional[str], params: dict, priority: int = 1) -> str:
+        """Queue a job; lower priority values are claimed first (0 = interactive, 1 = batch)."""
+        job_id = uuid.uuid4().hex
+        input_path = self._write_blob(f"{job_id}.in", data)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, filename, input_path, created_at, priority) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), filename, input_path, time.time(), priority),
+            )
+        with self.wake:
+            self.wake.notify()
+        return job_id
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    """
+                    SELECT * FROM jobs
+                    WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+                    ORDER BY priority, created_at LIMIT 1
+                    """,
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["attempts"] >= self.max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+                        ("max_attempts_exceeded", now, row["id"]),
+                    )
+                    conn.execute("COMMIT")
+                    self._remove_blob(row["input_path"])
+                    return self.claim()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, started_at = ?, progress = 0 WHERE id = ?",
+                    (now + self.lease_s, now, row["id"]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def heartbeat(self, job_id: str, progress: Optional[float] = None) -> bool:
+        """Renew the lease of a running job; False means it was cancelled or deleted meanwhile."""
+        with self._connect() as conn:
+            if progress is None:
+                cur = conn.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                    (time.time() + self.lease_s, job_id),
+                )
+            else:
+                cur = conn.execute(
+                    "UPDATE jobs SET lease_until = ?, progress = ? WHERE id = ? AND status = 'running'",
+                    (time.time() + self.lease_s, progress, job_id),
+                )
+        return cur.rowcount > 0
+
+    def finish(self, job_id: str, status: str, result: Optional[bytes] = None, result_type: Optional[str] = None, error: Optional[str] = None) -> None:
+        result_path = self._write_blob(f"{job_id}.out", result) if result is not None else None
+        with self._connect() as conn:
+            cur = conn.execute(
+                """
+                UPDATE jobs SET status = ?, result_path = ?, result_type = ?, error = ?,
+                                progress = CASE WHEN ? = 'succeeded' THEN 1.0 ELSE progress END,
+                                finished_at = ?, lease_until = NULL
+                WHERE id = ? AND status = 'running'
+                """,
+                (status, result_path, result_type, error, status, time.time(), job_id),
+            )
+            row = conn.execute("SELECT input_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if cur.rowcount == 0 and result_path:
+            # Job was deleted/cancelled while running: drop the orphaned result
+            self._remove_blob(result_path)
+        if row is not None:
+            self._remove_blob(row["input_path"])
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        with self._connect() as conn:
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def read_input(self, row: sqlite3.Row) -> bytes:
+        with open(row["input_path"], "rb") as f:
+            return f.read()
+
+    def read_result(self, row: sqlite3.Row) -> Optional[bytes]:
+        if not row["result_path"] or not os.path.isfile(row["result_path"]):
+            return None
+        with open(row["result_path"], "rb") as f:
+            return f.read()
+
+    def mark_fetched(self, job_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET fetched_at = ? WHERE id = ? AND fetched_at IS NULL", (time.time(), job_id))
+
+    def cancel(self, job_id: str) -> None:
+        """Flag a running job as cancelled; its worker notices on the next heartbeat."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', error = 'cancelled_by_client', finished_at = ?, lease_until = NULL WHERE id = ? AND status = 'running'",
+                (time.time(), job_id),
+            )
+
+    def delete(self, job_id: str) -> bool:
+        row = self.get(job_id)
+        if row is None:
+            return False
+        if row["status"] == "running":
+            self.cancel(job_id)
+            return True
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        self._remove_blob(row["input_path"])
+        self._remove_blob(row["result_path"])
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: int(r["n"]) for r in rows}
+
+    def purge(self) -> int:
+        """Drop fetched results after a grace period and abandoned results after JOBS_MAX_AGE_S."""
+        now = time.time()
+        fetched_ttl = _env_float("JOBS_FETCHED_TTL_S", 600)
+        max_age = _env_float("JOBS_MAX_AGE_S", 86400)
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT id FROM jobs
+                WHERE (fetched_at IS NOT NULL AND fetched_at < ?)
+                   OR (status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?)
+                """,
+                (now - fetched_ttl, now - max_age),
+            ).fetchall()
+        for r in rows:
+            self.delete(r["id"])
+        return len(rows)
+
+    def _remove_blob(self, path: Optional[str]) -> None:
+        if not path:
+            return
+        try:
+            os.unlink(path)
+        except Exception:
+            pass
+
+
+_JOB_STORE: Optional[_JobStore] = None
+_JOB_STORE_LOCK = threading.Lock()
+_JOB_WORKERS: List[threading.Thread] = []
+_JOB_STOP = threading.Event()
+_RUNNING_JOB_TOKENS: Dict[str, "_CancelToken"] = {}
+
+def _get_job_store() -> _JobStore:
+    global _JOB_STORE
+    with _JOB_STORE_LOCK:
+        if _JOB_STORE is None:
+            root = os.getenv("JOBS_DIR") or os.path.join(tempfile.gettempdir(), "docling_jobs")
+            _JOB_STORE = _JobStore(root)
+        return _JOB_STORE
+
+def _execute_job(kind: str, data: bytes, filename: Optional[str], params: dict) -> Tuple[bytes, str]:
+    """Run one unit of work synchronously; returns (result_bytes, content_type)."""
+    if kind == "extract":
+        if params.get("cascade"):
+            # Docling cascade handed off by an HTTP worker (`_offload_cascade`)
+            paged_token = _PAGED_OUTPUT.set(bool(params.get("paged")))
+            try:
+                res, tier = _extract_docling_cascade(data, filename, params.get("pipeline") or "docling_cli")
+            finally:
+                _PAGED_OUTPUT.reset(paged_token)
+            if res is not None:
+                res.setdefault("tier", tier)
+        else:
+            res = _run_extract(
+                data, filename, params.get("pipeline"), params.get("incremental"), params.get("pages"), params.get("sample")
+            )
+        if not (res and (res.get("text") or res.get("blocks"))):
+            raise RuntimeError("Docling extraction failed")
+        return _json_dumps(res), "application/json"
+
+    if data[:4] != b"%PDF":
+        raise ValueError(f"{kind}_only_supports_pdf")
+
+    if kind == "signals":
+        res = _compute_pdf_page_signals(data, _parse_grid(params.get("grid")), params.get("consolidate"))
+    elif kind == "render_pages":
+        dpi = max(72, min(600, int(params.get("dpi") or 220)))
+        pages = [int(p) for p in params.get("pages") or [] if str(p).isdigit()]
+        res = {"images": _render_pdf_pages(data, pages, dpi), "dpi": dpi}
+    elif kind == "render_regions":
+        dpi = max(72, min(600, int(params.get("dpi") or 220)))
+        res = {"images": _render_pdf_regions(data, params.get("regions") or [], dpi, params.get("consolidate")), "dpi": dpi}
+    elif kind == "redact":
+        out = _apply_pdf_redactions(data, params.get("boxes") or [], bool(params.get("detect_pii")), params.get("search_texts") or [])
+        return out.get("pdf_bytes") or b"", "application/pdf"
+    else:
+        raise ValueError(f"unknown_job_kind: {kind}")
+    return _json_dumps(res), "application/json"
+
+def _run_job(store: _JobStore, row: sqlite3.Row) -> None:
+    job_id = row["id"]
+    done = threading.Event()
+    cancel = _CancelToken(_env_float("JOBS_TIMEOUT_S", 3600))
+    _RUNNING_JOB_TOKENS[job_id] = cancel
+
+    def keep_lease():
+        # Heartbeats double as cross-process cancellation checks (DELETE /jobs/{id} from another worker).
+        while not done.wait(min(store.lease_s / 3.0, 2.0)):
+            try:
+                if not store.heartbeat(job_id):
+                    cancel.cancel("job_cancelled")
+            except Exception:
+                pass
+
+    def on_progress(fraction: float):
+        if not store.heartbeat(job_id, fraction):
+            cancel.cancel("job_cancelled")
+
+    threading.Thread(target=keep_lease, name=f"job-lease-{job_id[:8]}", daemon=True).start()
+    progress_token = _PROGRESS.set(on_progress)
+    cancel_token = _CANCEL.set(cancel)
+    scratch = _ScratchUsage()
+    scratch_token = _SCRATCH.set(scratch)
+    t0 = time.time()
+    try:
+        data = store.read_input(row)
+        cancel.check()
+        params = json.loads(row["params"] or "{}")
+        if params.get("cascade"):
+            # Offloaded by an HTTP worker that already admitted the request
+            admission = contextlib.nullcontext()
+        else:
+            cost_kind, cost_args = _background_cost_args(row["kind"], params)
+            admission = _background_admission(params.get("client") or "jobs", cancel, cost_kind, data, **cost_args)
+        with admission:
+            result, result_type = _execute_job(row["kind"], data, row["filename"], params)
+        store.finish(job_id, "succeeded", result, result_type)
+        _M_JOBS.inc(kind=row["kind"], status="succeeded")
+        logger.info(f"job_ok id={job_id} kind={row['kind']} ms={int((time.time() - t0) * 1000)} scratch_bytes={scratch.bytes_written}")
+    except _WorkCancelled as e:
+        _record_cancelled("jobs")
+        logger.info(f"job_cancelled id={job_id} kind={row['kind']} reason={e.reason}")
+        store.finish(job_id, "cancelled", error=e.reason)
+        _M_JOBS.inc(kind=row["kind"], status="cancelled")
+    except Exception as e:
+        logger.warning(f"job_failed id={job_id} kind={row['kind']}: {e}")
+        store.finish(job_id, "failed", error=str(e)[:1000])
+        _M_JOBS.inc(kind=row["kind"], status="failed")
+    finally:
+        _SCRATCH.reset(scratch_token)
+        _CANCEL.reset(cancel_token)
+        _PROGRESS.reset(progress_token)
+        _RUNNING_JOB_TOKENS.pop(job_id, None)
+        done.set()
 
-def _extract_with_pdfminer(bytes_data: bytes):
-    from pdfminer.high_level import extract_text_to_fp
-    output = io.StringIO()
-    extract_text_to_fp(io.BytesIO(bytes_data), output)
-    text = output.getvalue()
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+def _job_worker_loop(store: _JobStore) -> None:
+    last_purge = 0.0
+    while not _JOB_STOP.is_set():
+        try:
+            if time.time() - last_purge > 60:
+                store.purge()
+                last_purge = time.time()
+            row = store.claim()
+        except Exception as e:
+            logger.warning(f"job worker poll failed: {e}")
+            row = None
+        if row is None:
+            with store.wake:
+                # Jobs submitted by other processes (HTTP workers) only show up on the next poll.
+                store.wake.wait(timeout=_env_float("JOBS_POLL_S", 1.0))
+            continue
+        _run_job(store, row)
+
+def _job_workers_expected() -> int:
+    # HTTP workers of `python main.py serve` leave queued work to the model-worker processes
+    if _service_role() == "http":
+        return 0
+    return max(0, int(_env_float("JOBS_WORKERS", 1)))
+
+def _start_job_workers() -> None:
+    n = _job_workers_expected()
+    if n == 0 or _JOB_WORKERS:
+        return
+    store = _get_job_store()
+    for i in range(n):
+        t = threading.Thread(target=_job_worker_loop, args=(store,), name=f"job-worker-{i}", daemon=True)
+        t.start()
+        _JOB_WORKERS.append(t)
+    logger.info(f"job_workers_started n={n} dir={store.root}")
+
+def _job_status_payload(row: sqlite3.Row) -> dict:
     return {
-        "pages": 0,
-        "text": text,
-        "blocks": [{"text": b} for b in _to_paragraphs(lines)][:200]
+        "id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "progress": row["progress"],
+        "attempts": row["attempts"],
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "result_url": f"/jobs/{row['id']}/result" if row["status"] == "succeeded" else None,
     }
 
-def _to_paragraphs(lines: List[str]) -> List[str]:
-    paras: List[str] = []
-    buf: List[str] = []
-    for ln in lines:
-        if len(ln) <= 2 and buf:
-            paras.append(" ".join(buf))
-            buf = []
-        else:
-            buf.append(ln)
-        if len(buf) >= 8:
-            paras.append(" ".join(buf))
-            buf = []
-    if buf:
-        paras.append(" ".join(buf))
-    return paras
+# --- Batch processing (POST /batch/{kind}) ---
 
-def _extract_with_docling_cli(bytes_data: bytes, filename: Optional[str] = None):
+BATCH_KINDS = ("extract", "signals", "redact")
+BATCH_DOC_EXTS = (".pdf", ".docx", ".doc")
+
+_BATCH_POOL: Optional[ThreadPoolExecutor] = None
+_BATCH_POOL_SIZE = 0
+_BATCH_POOL_LOCK = threading.Lock()
+
+def _get_batch_pool() -> ThreadPoolExecutor:
+    global _BATCH_POOL, _BATCH_POOL_SIZE
+    with _BATCH_POOL_LOCK:
+        if _BATCH_POOL is None:
+            _BATCH_POOL_SIZE = max(1, int(_env_float("BATCH_WORKERS", min(4, os.cpu_count() or 1))))
+            _BATCH_POOL = ThreadPoolExecutor(max_workers=_BATCH_POOL_SIZE, thread_name_prefix="batch")
+        return _BATCH_POOL
+
+def _unpack_archive(data: bytes, max_bytes: int) -> List[Tuple[str, bytes]]:
+    """Read documents out of a .zip or .tar(.gz) upload, refusing archives that inflate past max_bytes."""
+    docs: List[Tuple[str, bytes]] = []
+    total = 0
+
+    def wanted(name: str) -> bool:
+        base = os.path.basename(name)
+        return bool(base) and not base.startswith(".") and "__MACOSX" not in name and base.lower().endswith(BATCH_DOC_EXTS)
+
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not wanted(info.filename):
+                    continue
+                total += info.file_size
+                if total > max_bytes:
+                    raise ValueError("archive_too_large")
+                docs.append((info.filename, zf.read(info)))
+        return docs
+
+    try:
+        tf = tarfile.open(fileobj=io.BytesIO(data), mode="r:*")
+    except tarfile.TarError:
+        raise ValueError("archive_must_be_zip_or_tar")
+    with tf:
+        for member in tf.getmembers():
+            if not member.isfile() or not wanted(member.name):
+                continue
+            total += member.size
+            if total > max_bytes:
+                raise ValueError("archive_too_large")
+            f = tf.extractfile(member)
+            if f is not None:
+                docs.append((member.name, f.read()))
+    return docs
+
+def _batch_process_doc(kind: str, data: bytes, filename: Optional[str], params: dict) -> Tuple[dict, int]:
+    """Process one batch document; returns (result_payload, pages)."""
+    if kind == "extract":
+        res = _run_extract(data, filename, params.get("pipeline"), params.get("incremental"))
+        if not (res and (res.get("text") or res.get("blocks"))):
+            raise RuntimeError("Docling extraction failed")
+        return res, int(res.get("pages") or 0)
+
+    if data[:4] != b"%PDF":
+        raise ValueError(f"{kind}_only_supports_pdf")
+    if kind == "signals":
+        res = _compute_pdf_page_signals(data, _parse_grid(params.get("grid")), params.get("consolidate"))
+        return res, int(res.get("pages") or 0)
+
+    out = _apply_pdf_redactions(data, [], bool(params.get("detect_pii")), [])
+    pdf_bytes = out.get("pdf_bytes") or b""
+    payload = {
+        "pdf_b64": base64.b64encode(pdf_bytes).decode("ascii"),
+        "redactions": len(out.get("boxes") or []),
+    }
+    pages = 0
+    try:
+        import fitz  # PyMuPDF
+
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            pages = doc.page_count
+    except Exception:
+        pages = 0
+    return payload, pages
+
+def _stream_batch(request: Request, kind: str, docs: List[Tuple[str, bytes]], params: dict) -> StreamingResponse:
     """
-    Invoke Docling CLI to convert the source to Markdown/JSON.
-    Uses authoritative flags: --to, --pipeline, --ocr/--no-ocr, --pdf-backend, --tables/--no-tables, --output
+    Spread documents across the batch pool and stream NDJSON lines as each one finishes.
 
-    Note: Using 'standard' pipeline instead of 'vlm' to avoid model loading issues.
-    VLM pipeline requires additional model files that may not be available.
+    Each document passes admission control in the batch lane before it runs. Failures are
+    reported per document; the final line carries aggregate throughput stats. The deadline is
+    the request's (`X-Request-Timeout-Ms` / REQUEST_TIMEOUT_MS), else BATCH_TIMEOUT_S. Closing
+    the stream before every document finished (client disconnect, even before the first line)
+    cancels the running documents and drops the queued ones.
     """
-    cli = os.getenv("DOCLING_CLI", "docling")
-    to_fmt = os.getenv("DOCLING_TO", "md")
-    # Use standard pipeline by default (faster, more reliable)
-    pipeline = os.getenv("DOCLING_PIPELINE", "standard")
-    vlm_model = os.getenv("DOCLING_VLM_MODEL", "granite_docling")
-    # OCR is the biggest performance lever for Docling.
-    # Modes:
-    # - DOCLING_OCR_MODE=on|off|auto (default auto)
-    # - DOCLING_OCR=1|0 (legacy; used when DOCLING_OCR_MODE not set)
-    ocr_mode = (os.getenv("DOCLING_OCR_MODE", "auto") or "auto").strip().lower()
-    use_ocr = os.getenv("DOCLING_OCR", "1") in ("1", "true", "True", "yes")
-    pdf_backend = os.getenv("DOCLING_PDF_BACKEND")
-    use_tables = os.getenv("DOCLING_TABLES", "1") in ("1", "true", "True", "yes")
-    # Avoid massive markdown outputs by default (Docling may embed base64 images).
-    # We do NOT rely on embedded images for Vision (we render via /render-pages and /render-regions).
-    image_export_mode = (os.getenv("DOCLING_IMAGE_EXPORT_MODE", "placeholder") or "placeholder").strip().lower()
+    client = _admission_client(request)
+    token = _CancelToken(_request_timeout_s(request) or _env_float("BATCH_TIMEOUT_S", 0) or None)
+    state = {"finished": False, "closed": False, "futures": []}
 
-    suffix = ".pdf"
+    def close() -> None:
+        if state["closed"]:
+            return
+        state["closed"] = True
+        if not state["finished"]:
+            token.cancel("client_disconnected")
+            _record_cancelled("requests")
+            logger.info(f"request_cancelled path={request.url.path} reason=client_disconnected")
+        for fut in state["futures"]:
+            fut.cancel()  # not started yet: never runs
+
+    def run_one(index: int, filename: str, data: bytes) -> dict:
+        started = time.time()
+        try:
+            cost_kind, cost_args = _background_cost_args(kind, params)
+            with _background_admission(client, token, cost_kind, data, **cost_args):
+                result, pages = _call_in_scope(_WorkScope(token, lane="batch"), _batch_process_doc, kind, data, filename, params)
+            return {"index": index, "filename": filename, "ok": True, "pages": pages, "ms": int((time.time() - started) * 1000), "result": result}
+        except _WorkCancelled as e:
+            return {"index": index, "filename": filename, "ok": False, "error": f"cancelled: {e.reason}", "ms": int((time.time() - started) * 1000)}
+        except Exception as e:
+            return {"index": index, "filename": filename, "ok": False, "error": str(e)[:500], "ms": int((time.time() - started) * 1000)}
+
+    async def lines():
+        loop = asyncio.get_running_loop()
+        pool = _get_batch_pool()
+        t0 = time.time()
+        futures = state["futures"] = [loop.run_in_executor(pool, run_one, i, name, data) for i, (name, data) in enumerate(docs)]
+        succeeded = failed = pages_total = 0
+        try:
+            for fut in asyncio.as_completed(futures):
+                item = await fut
+                _M_BATCH_DOCS.inc(kind=kind, outcome="ok" if item["ok"] else "failed")
+                if item["ok"]:
+                    succeeded += 1
+                    pages_total += item.get("pages") or 0
+                else:
+                    failed += 1
+                yield _json_dumps(item) + b"\n"
+            state["finished"] = True
+        finally:
+            close()
+
+        elapsed = max(1e-6, time.time() - t0)
+        summary = {
+            "documents": len(docs),
+            "succeeded": succeeded,
+            "failed": failed,
+            "pages": pages_total,
+            "elapsed_ms": int(elapsed * 1000),
+            "docs_per_s": round(len(docs) / elapsed, 3),
+            "pages_per_s": round(pages_total / elapsed, 3),
+            "workers": _BATCH_POOL_SIZE,
+        }
+        logger.info(f"batch_ok kind={kind} docs={len(docs)} failed={failed} pages={pages_total} ms={summary['elapsed_ms']}")
+        yield _json_dumps({"summary": summary}) + b"\n"
+
+    return _WorkStreamResponse(lines(), close, media_type="application/x-ndjson")
+
+# --- Single-pass routing workflow (POST /analyze) ---
+
+# Routing policy keys and defaults; the VISION_* names match server/src/services/extractor/visionRouting.js
+def _analyze_defaults() -> dict:
+    return {
+        "image_coverage_threshold": _env_float("VISION_IMAGE_COVERAGE_THRESHOLD", 0.25),
+        "figure_count_threshold": _env_float("VISION_FIGURE_COUNT_THRESHOLD", 1),
+        "min_text_chars_with_figures": _env_float("VISION_MIN_TEXT_CHARS_WITH_FIGURES", 200),
+        "max_pages": int(_env_float("VISION_MAX_PAGES", 12)),
+        "crop_figures": _env_flag("VISION_CROP_FIGURES", "1"),
+        "dpi": int(_env_float("VISION_RENDER_DPI", 220)),
+        "max_regions_per_page": int(_env_float("VISION_MAX_REGIONS_PER_PAGE", 3)),
+        "min_region_area_pct": _env_float("VISION_MIN_REGION_AREA_PCT", 0.03),
+        "min_total_region_area_pct": _env_float("VISION_MIN_TOTAL_REGION_AREA_PCT", 0.15),
+        "render": True,
+        "extract": True,
+        "pipeline": None,
+        "incremental": None,
+        "detect_pii": False,
+        "consolidate": None,
+        "grid": None,
+    }
+
+def _analyze_policy(raw: Optional[str]) -> dict:
+    """Merge a JSON routing policy over the defaults. Raises ValueError on unknown keys or bad values."""
+    policy = _analyze_defaults()
+    overrides = _safe_json_loads(raw, None) if raw else {}
+    if not isinstance(overrides, dict):
+        raise ValueError("policy_must_be_json_object")
+    unknown = sorted(set(overrides) - set(policy))
+    if unknown:
+        raise ValueError(f"unknown_policy_keys: {', '.join(unknown)}")
+    for key, value in overrides.items():
+        if value is None:
+            continue
+        if key in ("render", "extract", "crop_figures", "detect_pii", "incremental"):
+            policy[key] = value if isinstance(value, bool) else _optional_flag(value)
+        elif key == "pipeline":
+            policy[key] = str(value)
+        elif key == "consolidate":
+            policy[key] = _region_policy(value)
+        elif key == "grid":
+            policy[key] = _parse_grid(value)
+        else:
+            try:
+                policy[key] = max(0, int(value)) if isinstance(policy[key], int) else max(0.0, float(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"policy_value_must_be_numeric: {key}")
+    policy["dpi"] = max(72, min(600, int(policy["dpi"] or 220)))
+    return policy
+
+def _route_pages(page_signals: List[dict], page_chars: Dict[int, int], policy: dict) -> List[dict]:
+    """Pages that need vision analysis, with the reasons (same rules as visionRouting.js)."""
+    routed = []
+    for sig in page_signals:
+        page = int(sig.get("page") or 0)
+        if page < 1:
+            continue
+        if len(routed) >= policy["max_pages"]:
+            break
+        figures = int(sig.get("figure_count") or 0)
+        missing = bool(sig.get("figure_content_missing")) or (
+            figures > 0 and page_chars.get(page, 0) < policy["min_text_chars_with_figures"]
+        )
+        reasons = []
+        if float(sig.get("image_coverage") or 0) >= policy["image_coverage_threshold"]:
+            reasons.append("high_image_coverage")
+        if figures >= policy["figure_count_threshold"]:
+            reasons.append("figure_count")
+        if missing:
+            reasons.append("figure_content_missing")
+        if reasons:
+            routed.append({"page": page, "reasons": reasons})
+    return routed
+
+def _pick_figure_regions(sig: dict, policy: dict) -> List[dict]:
+    """Figure crops for one routed page: consolidated `regions` when requested, else the largest image boxes."""
+    if policy["consolidate"]:
+        candidates = sig.get("regions") or []
+    else:
+        candidates = sorted(
+            (b for b in sig.get("image_boxes") or [] if float(b.get("area_pct") or 0) >= policy["min_region_area_pct"]),
+            key=lambda b: -float(b.get("area_pct") or 0),
+        )
+    regions = []
+    for i, box in enumerate(candidates[: policy["max_regions_per_page"]]):
+        regions.append(
+            {"id": f"p{sig['page']}_fig{i}", "page": sig["page"], "bbox": box["bbox"], "kind": "figure", "area_pct": box.get("area_pct") or 0}
+        )
+    return regions
+
+def _page_text_chars(pdf_bytes: bytes, pages: List[int], digest: str) -> Dict[int, int]:
+    """Text-layer characters per page from the shared word index (already built by the signals scan)."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
-        if filename:
-            _, ext = os.path.splitext(filename)
-            if ext and ext.lower() in [".pdf", ".docx", ".doc"]:
-                suffix = ext
-    except Exception:
-        pass
+        out = {}
+        for p in pages:
+            index = _page_word_index(doc.load_page(p - 1), digest)
+            out[p] = int(sum(len(t) + 1 for t in index.tokens()))
+        return out
+    finally:
+        doc.close()
 
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        tmp.write(bytes_data)
-        tmp_path = tmp.name
+def _plan_pii_redactions(pdf_bytes: bytes) -> dict:
+    import fitz  # PyMuPDF
 
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
-        # Docling CLI writes outputs to files, not stdout. Always use a temp output directory and read back the artifact.
-        with tempfile.TemporaryDirectory(prefix="docling_out_") as out_dir:
-            args = [cli, "--to", to_fmt, "--output", out_dir, tmp_path]
-            if pipeline:
-                args += ["--pipeline", pipeline]
-            if pipeline == "vlm" and vlm_model:
-                # Optional: only applies to VLM pipeline
-                args += ["--vlm-model", vlm_model]
-            # Auto OCR heuristic: if the PDF already has selectable text, skip OCR (much faster).
-            # For scanned PDFs, enable OCR.
-            use_ocr_final = use_ocr
-            if ocr_mode in ("on", "true", "1", "yes"):
-                use_ocr_final = True
-            elif ocr_mode in ("off", "false", "0", "no"):
-                use_ocr_final = False
-            elif ocr_mode == "auto":
-                try:
-                    if _pdf_has_selectable_text(bytes_data):
-                        use_ocr_final = False
-                except Exception:
-                    # If auto-detection fails, fall back to DOCLING_OCR
-                    use_ocr_final = use_ocr
+        return {"boxes": _detect_pii_boxes(doc, _doc_digest(pdf_bytes))}
+    finally:
+        doc.close()
 
-            if use_ocr_final:
-                args += ["--ocr"]
-            else:
-                args += ["--no-ocr"]
-            if pdf_backend:
-                args += ["--pdf-backend", pdf_backend]
-            if use_tables:
-                args += ["--tables"]
-            else:
-                args += ["--no-tables"]
-            if image_export_mode in ("placeholder", "embedded", "referenced"):
-                args += ["--image-export-mode", image_export_mode]
 
-            t0 = time.time()
-            proc = subprocess.run(
-                args,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=300,
-            )
-            elapsed_ms = int((time.time() - t0) * 1000)
-            if proc.returncode != 0:
-                stderr = (proc.stderr or "").strip()
-                raise RuntimeError(stderr[:1000] or "docling CLI failed")
+_ANALYZE_POOL: Optional[ThreadPoolExecutor] = None
+_ANALYZE_POOL_LOCK = threading.Lock()
 
-            logger.info(
-                f"docling_cli_ok to={to_fmt} pipeline={pipeline} ocr={use_ocr_final} tables={use_tables} image_export={image_export_mode} ms={elapsed_ms}"
-            )
+def _get_analyze_pool() -> ThreadPoolExecutor:
+    global _ANALYZE_POOL
+    with _ANALYZE_POOL_LOCK:
+        if _ANALYZE_POOL is None:
+            workers = max(2, int(_env_float("ANALYZE_WORKERS", max(4, os.cpu_count() or 1))))
+            _ANALYZE_POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze")
+        return _ANALYZE_POOL
 
-            # Prefer exact expected output path, otherwise fall back to first matching file in output dir.
-            stem = "document"
+def _analyze_document(data: bytes, filename: Optional[str], policy: dict) -> dict:
+    """
+    Signals, routing, renders, extraction and an optional PII redaction plan for one upload.
+
+    Extraction and the redaction plan do not depend on routing and run on the analyze pool while
+    signals -> routing -> renders proceed here; region and full-page renders also run side by side.
+    Every stage shares the request's cancel token and timings, and the per-page word index / result
+    cache, so the PDF's text layer is read once. A failing stage is reported under `errors`
+    without discarding the others.
+    """
+    pool = _get_analyze_pool()
+
+    def submit(name: str, fn, *args):
+        ctx = contextvars.copy_context()  # one context per task: cancel token, timings, lane
+
+        def run():
+            with _stage(f"analyze_{name}"):
+                return fn(*args)
+
+        return pool.submit(ctx.run, run)
+
+    is_pdf = data[:4] == b"%PDF"
+    pending: Dict[str, object] = {}
+    if policy["extract"]:
+        pending["extraction"] = submit("extract", _run_extract, data, filename, policy["pipeline"], policy["incremental"])
+    if policy["detect_pii"] and is_pdf:
+        pending["redaction_plan"] = submit("redaction_plan", _plan_pii_redactions, data)
+
+    out: dict = {"signals": None, "routed": [], "renders": [], "extraction": None, "redaction_plan": None, "errors": {}}
+    try:
+        if is_pdf:
             try:
-                if filename:
-                    stem = os.path.splitext(os.path.basename(filename))[0] or stem
-                else:
-                    stem = os.path.splitext(os.path.basename(tmp_path))[0] or stem
-            except Exception:
-                pass
+                with _stage("analyze_signals"):
+                    sig = _compute_pdf_page_signals(data, policy["grid"], policy["consolidate"])
+                out["signals"] = sig
+                out["pages"] = sig.get("pages")
+                page_signals = sig.get("page_signals") or []
+                candidates = [int(p["page"]) for p in page_signals if int(p.get("figure_count") or 0) > 0]
+                chars = _page_text_chars(data, candidates, _doc_digest(data)) if candidates else {}
+                out["routed"] = _route_pages(page_signals, chars, policy)
+            except _WorkCancelled:
+                raise
+            except Exception as e:
+                out["errors"]["signals"] = str(e)[:500]
 
-            ext_map = {
-                "md": ".md",
-                "markdown": ".md",
-                "json": ".json",
-                "yaml": ".yaml",
-                "yml": ".yml",
-                "text": ".txt",
-                "txt": ".txt",
-                "doctags": ".doctags",
-                "html": ".html",
-                "html_split_page": ".html",
-            }
-            out_ext = ext_map.get((to_fmt or "md").strip().lower(), f".{(to_fmt or 'md').strip().lower()}")
-            expected = os.path.join(out_dir, f"{stem}{out_ext}")
-            candidates: List[str] = []
+        if out["routed"] and policy["render"]:
+            by_page = {int(p["page"]): p for p in out["signals"]["page_signals"]}
+            regions: List[dict] = []
+            if policy["crop_figures"]:
+                for r in out["routed"]:
+                    regions.extend(_pick_figure_regions(by_page[r["page"]], policy))
+            area_by_page: Dict[int, float] = {}
+            for r in regions:
+                area_by_page[r["page"]] = area_by_page.get(r["page"], 0.0) + float(r["area_pct"])
+            # Crops that cover too little of the page (many tiny image blocks): add the full page
+            full_pages = [r["page"] for r in out["routed"] if area_by_page.get(r["page"], 0.0) < policy["min_total_region_area_pct"]]
+            dpi = policy["dpi"]
+            renders = {}
+            if regions:
+                renders["regions"] = submit("render_regions", _render_pdf_regions, data, regions, dpi)
+            if full_pages:
+                renders["pages"] = submit("render_pages", _render_pdf_pages, data, full_pages, dpi)
             try:
-                if os.path.isfile(expected):
-                    candidates = [expected]
-                else:
-                    candidates = sorted(
-                        [
-                            os.path.join(out_dir, f)
-                            for f in os.listdir(out_dir)
-                            if f.lower().endswith(out_ext.lower())
-                        ]
-                    )
-            except Exception:
-                candidates = []
+                if "regions" in renders:
+                    meta = {r["id"]: r for r in regions}
+                    for img in renders["regions"].result():
+                        out["renders"].append({**img, "kind": "figure", "area_pct": meta[img["id"]]["area_pct"]})
+                if "pages" in renders:
+                    for img in renders["pages"].result():
+                        sig = by_page.get(int(img["page"])) or {}
+                        bbox = [0.0, 0.0, sig["width"], sig["height"]] if sig.get("width") else None
+                        out["renders"].append({"id": f"p{img['page']}_full", "kind": "page", "bbox": bbox, **img})
+            except _WorkCancelled:
+                raise
+            except Exception as e:
+                out["errors"]["render"] = str(e)[:500]
+            out["dpi"] = dpi
 
-            if not candidates:
-                # Include a small amount of context to help debugging.
-                dir_listing = ""
+        for name, fut in pending.items():
+            try:
+                out[name] = fut.result()
+                if name == "extraction" and not (out[name] and (out[name].get("text") or out[name].get("blocks"))):
+                    out["errors"][name] = "Docling extraction failed"
+            except _WorkCancelled:
+                raise
+            except Exception as e:
+                out["errors"][name] = str(e)[:500]
+        if out["extraction"] is not None:
+            out.setdefault("pages", out["extraction"].get("pages"))
+    finally:
+        for fut in pending.values():
+            fut.cancel()
+    return out
+
+@app.middleware("http")
+async def _metrics_middleware(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", None) or "unmatched"
+        _M_HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(status))
+        _M_HTTP_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint)
+
+
+@app.middleware("http")
+async def _scratch_middleware(request: Request, call_next):
+    """Account scratch-space use per request; reported as `X-Scratch-Bytes` when anything was written."""
+    request.state.scratch = _ScratchUsage()
+    response = await call_next(request)
+    if request.state.scratch.files:
+        response.headers["X-Scratch-Bytes"] = str(request.state.scratch.bytes_written)
+    return response
+
+
+@app.middleware("http")
+async def _timings_middleware(request: Request, call_next):
+    """Opt-in per-stage timings: `?timings=1`, `X-Timings: 1` or TIMINGS_ENABLED=1."""
+    if not _timings_requested(request):
+        return await call_next(request)
+    request.state.timings = _StageTimings()
+    request.state.t0 = time.perf_counter()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = request.state.timings.server_timing(time.perf_counter() - request.state.t0)
+    return response
+
+
+# --- Negotiated response compression (gzip / zstd / brotli, streamed) ---
+
+_COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+_COMPRESS_SLICE = 256 * 1024
+_COMPRESS_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+
+_INSTALLED_CODECS: Optional[Dict[str, bool]] = None
+
+def _available_encodings() -> List[str]:
+    """Encodings this process can produce, in server preference order (COMPRESSION_ENCODINGS)."""
+    global _INSTALLED_CODECS
+    if _INSTALLED_CODECS is None:
+        _INSTALLED_CODECS = {
+            "gzip": True,
+            "zstd": importlib.util.find_spec("zstandard") is not None,
+            "br": importlib.util.find_spec("brotli") is not None or importlib.util.find_spec("brotlicffi") is not None,
+        }
+    installed = _INSTALLED_CODECS
+    wanted = (os.getenv("COMPRESSION_ENCODINGS") or "zstd,br,gzip").lower().split(",")
+    return [e.strip() for e in wanted if installed.get(e.strip())]
+
+def _negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding for an Accept-Encoding header: highest q-value, ties broken by server preference."""
+    offered: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
                 try:
-                    dir_listing = ", ".join(sorted(os.listdir(out_dir))[:30])
-                except Exception:
-                    dir_listing = ""
-                raise RuntimeError(
-                    f"docling_cli_no_output_file (to={to_fmt}, ext={out_ext}, out_dir_listing={dir_listing})"
-                )
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name.strip():
+            offered[name.strip().lower()] = q
+    best: Optional[Tuple[str, float]] = None
+    for enc in _available_encodings():
+        q = offered.get(enc, offered.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (enc, q)
+    return best[0] if best else None
 
-            with open(candidates[0], "r", encoding="utf-8", errors="replace") as f:
-                output = f.read()
 
-        # Determine pages best-effort
-        pages = 0
-        try:
-            import fitz
-            doc = fitz.open(tmp_path)
-            pages = doc.page_count
-            doc.close()
-        except Exception:
-            pages = 0
-        text = output
-        blocks = _to_paragraphs([ln.strip() for ln in output.splitlines()])
-        return { "pages": pages, "text": text, "blocks": [{"text": b} for b in blocks][:200] }
-    finally:
-        try:
-            os.unlink(tmp_path)
-        except Exception:
-            pass
+class _StreamCompressor:
+    """Incremental compressor for one response body: `compress` slices, then `flush` or `finish`."""
+
+    def __init__(self, encoding: str):
+        level = _COMPRESS_LEVELS[encoding]
+        if encoding == "zstd":
+            import zstandard
+
+            obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self.compress = obj.compress
+            self.flush = lambda: obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self.finish = lambda: obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        elif encoding == "br":
+            try:
+                import brotli
+            except ImportError:
+                import brotlicffi as brotli
+
+            obj = brotli.Compressor(quality=level)
+            self.compress = obj.process
+            self.flush = obj.flush
+            self.finish = obj.finish
+        else:
+            obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+            self.compress = obj.compress
+            self.flush = lambda: obj.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = obj.flush
 
 
-def _pdf_has_selectable_text(data: bytes) -> bool:
+class _CompressionMiddleware:
     """
-    Best-effort heuristic: return True if the PDF appears to contain real embedded text.
-    This avoids enabling OCR on digital PDFs (OCR is expensive and usually unnecessary).
+    Compress JSON / NDJSON / text responses with the client's preferred encoding.
+
+    Pure ASGI: only the first COMPRESSION_MIN_BYTES of a body are buffered to decide whether it is
+    worth compressing; after that each body message is compressed in slices and sent as it is
+    produced, streamed messages (batch results, tiles) are flushed so lines arrive promptly, and a
+    large single-message body never exists a second time in compressed form. Bodies under
+    COMPRESSION_MIN_BYTES and already-encoded responses (PDFs, PNGs) pass through. Raw and wire
+    bytes per endpoint are counted in docling_response_bytes_total.
     """
-    if not data or data[:4] != b"%PDF":
-        return False
-    import fitz  # PyMuPDF
-    doc = fitz.open(stream=data, filetype="pdf")
-    try:
-        n = min(3, doc.page_count)
-        total = 0
-        for i in range(n):
-            page = doc.load_page(i)
-            total += len((page.get_text("text") or "").strip())
-            if total >= 200:
-                return True
-        return total >= 200
-    finally:
-        doc.close()
 
-def _guess_is_image(ext: str) -> bool:
-    return ext.lower() in [".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp"]
+    def __init__(self, app):
+        self.app = app
 
-def _run_vlm_cli(cli, model, mmproj, image_path, prompt, ctx, temp, topk, topp) -> str:
-    args = [cli, "-m", model, "--image", image_path, "-p", prompt, "--ctx-size", str(ctx), "--temp", str(temp), "--top-k", str(topk), "--top-p", str(topp), "--verbose"]
-    if mmproj:
-        args += ["--mmproj", mmproj]
-    proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=600)
-    if proc.returncode != 0:
-        raise RuntimeError(proc.stderr.strip()[:500] or "vlm cli failed")
-    return proc.stdout or ""
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _env_flag("COMPRESSION_ENABLED", "1"):
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope.get("headers") or []:
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+        encoding = _negotiate_encoding(accept) if accept else None
+        min_bytes = int(_env_float("COMPRESSION_MIN_BYTES", 1024))
+        state: dict = {"start": None, "pending": [], "pending_bytes": 0, "compressor": None, "label": "identity"}
 
-def _vlm_output_to_markdown(output: str, img_path: str) -> str:
-    txt = (output or "").strip()
-    try:
-        from docling_core.types.doc.document import DocTagsDocument
-        from docling_core.types.doc import DoclingDocument
-        doctags = txt
-        doc = DocTagsDocument.from_doctags_and_image_pairs([doctags], [img_path])
-        ddoc = DoclingDocument.load_from_doctags(doc, document_name="Document")
-        md = ddoc.export_to_markdown()
-        if md and len(md.strip()) > 0:
-            return md
-    except Exception:
-        pass
-    return txt
+        def endpoint() -> str:
+            return getattr(scope.get("route"), "path", None) or "unmatched"
 
-def _extract_with_vlm_cli(bytes_data: bytes, filename: Optional[str] = None):
-    cli = os.getenv("VLM_CLI")
-    model = os.getenv("VLM_MODEL")
-    if not cli or not model:
-        raise RuntimeError("VLM_CLI and VLM_MODEL must be set for vlm_cli pipeline")
-    mmproj = os.getenv("VLM_MMPROJ")
-    prompt = os.getenv("VLM_PROMPT", "<__media__>Convert this page to docling.")
-    ctx = int(os.getenv("VLM_CTX", "8192") or 8192)
-    temp = float(os.getenv("VLM_TEMP", "0") or 0)
-    topk = int(os.getenv("VLM_TOPK", "0") or 0)
-    topp = float(os.getenv("VLM_TOPP", "1.0") or 1.0)
-    dpi = int(os.getenv("VLM_DPI", "240") or 240)
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                ctype = headers.get("content-type", "")
+                if ctype.startswith(_COMPRESSIBLE_TYPES) and "content-encoding" not in headers:
+                    headers.add_vary_header("Accept-Encoding")
+                    if encoding is not None and message["status"] not in (204, 304):
+                        # Held back until COMPRESSION_MIN_BYTES of body or the final message decide
+                        state["start"] = message
+                        return
+                await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                # Inner BaseHTTPMiddleware layers send every body with more_body=True, so the
+                # size decision needs the buffered prefix rather than the first message.
+                state["pending"].append(body)
+                state["pending_bytes"] += len(body)
+                if more and state["pending_bytes"] < min_bytes:
+                    return
+                body = b"".join(state["pending"])
+                state.update(start=None, pending=[])
+                if len(body) >= min_bytes:
+                    headers = MutableHeaders(raw=start["headers"])
+                    del headers["content-length"]
+                    headers["content-encoding"] = encoding
+                    state["compressor"] = _StreamCompressor(encoding)
+                    state["label"] = encoding
+                await send(start)
 
-    ext = ".pdf"
-    try:
-        if filename:
-            _, e = os.path.splitext(filename)
-            if e:
-                ext = e
-    except Exception:
-        pass
+            compressor = state["compressor"]
+            _M_RESPONSE_BYTES.inc(len(body), endpoint=endpoint(), encoding=state["label"], stage="raw")
+            if compressor is None:
+                _M_RESPONSE_BYTES.inc(len(body), endpoint=endpoint(), encoding=state["label"], stage="wire")
+                await send({"type": "http.response.body", "body": body, "more_body": more})
+                return
+            wire = 0
+            for offset in range(0, len(body), _COMPRESS_SLICE):
+                out = compressor.compress(body[offset:offset + _COMPRESS_SLICE])
+                if out:
+                    wire += len(out)
+                    await send({"type": "http.response.body", "body": out, "more_body": True})
+            tail = compressor.flush() if more else compressor.finish()
+            wire += len(tail)
+            _M_RESPONSE_BYTES.inc(wire, endpoint=endpoint(), encoding=state["label"], stage="wire")
+            await send({"type": "http.response.body", "body": tail, "more_body": more})
 
-    # If it's an image, run single pass
-    if _guess_is_image(ext):
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            tmp.write(bytes_data)
-            img_path = tmp.name
-        try:
-            out_txt = _run_vlm_cli(cli, model, mmproj, img_path, prompt, ctx, temp, topk, topp)
-            text = _vlm_output_to_markdown(out_txt, img_path)
-            return {"pages": 1, "text": text, "blocks": [{"text": t} for t in _to_paragraphs(text.splitlines())][:200]}
-        finally:
-            try: os.unlink(img_path)
-            except Exception: pass
+        await self.app(scope, receive, send_compressed)
 
-    # Else assume PDF
-    import fitz  # PyMuPDF
-    doc = fitz.open(stream=bytes_data, filetype="pdf")
-    pages = doc.page_count
-    md_pages: List[str] = []
-    try:
-        for i in range(pages):
-            page = doc.load_page(i)
-            pix = page.get_pixmap(dpi=dpi)
-            with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as ptmp:
-                img_path = ptmp.name
-                pix.save(img_path)
-            try:
-                out_txt = _run_vlm_cli(cli, model, mmproj, img_path, prompt, ctx, temp, topk, topp)
-                md = _vlm_output_to_markdown(out_txt, img_path)
-                md_pages.append(md)
-            finally:
-                try: os.unlink(img_path)
-                except Exception: pass
-    finally:
-        doc.close()
 
-    text = ("\f".join(md_pages)).strip()
-    blocks = _to_paragraphs([ln.strip() for ln in text.splitlines()])
-    return {"pages": pages, "text": text, "blocks": [{"text": b} for b in blocks][:200]}
+app.add_middleware(_CompressionMiddleware)
+
 
 @app.post("/extract")
-async def extract(file: UploadFile = File(...)):
+async def extract(
+    request: Request,
+    file: UploadFile = File(...),
+    pipeline: Optional[str] = Form(None),
+    incremental: Optional[str] = Form(None),
+    pages: Optional[str] = Form(None),
+    sample: Optional[str] = Form(None),
+):
     """
     Extract text from an uploaded document.
 
-    Pipeline selection via env:
+    Pipeline selection via env (or the optional `pipeline` form field):
       - EXTRACT_PIPELINE=docling_cli (default): prefer Docling CLI conversion (supports --ocr)
       - EXTRACT_PIPELINE=python: Docling Python API
       - EXTRACT_PIPELINE=vlm_cli: llama.cpp multimodal CLI fallback
+      - EXTRACT_PIPELINE=fast: native PyMuPDF text only (no Docling)
+      - EXTRACT_PIPELINE=auto: native PyMuPDF, escalating scanned/table/low-quality pages to Docling
 
-    Returns JSON with pages, text, and structured blocks.
-    """
-    data = await file.read()
-
-    pipeline = (os.getenv("EXTRACT_PIPELINE", "docling_cli") or "docling_cli").strip().lower()
-
-    res = None
-
-    # Prefer CLI when available (enables OCR via DOCLING_OCR=1)
-    if pipeline in ("docling_cli", "cli") and CLI_AVAILABLE:
-        try:
-            res = _extract_with_docling_cli(data, file.filename)
-        except Exception as e:
-            logger.warning(f"Docling CLI extraction failed, falling back: {e}")
-            res = None
+    With `incremental=true` (or INCREMENTAL_EXTRACT=1) Docling pipelines convert only pages not
+    seen in an earlier revision and stitch the rest from the page cache (`pages_reused`).
 
-    if res is None and pipeline in ("vlm_cli", "vlm") and os.getenv("VLM_CLI") and os.getenv("VLM_MODEL"):
-        try:
-            res = _extract_with_vlm_cli(data, file.filename)
-        except Exception as e:
-            logger.warning(f"VLM CLI extraction failed, falling back: {e}")
-            res = None
+    Previews (PDF): `pages` ("1-3,7,10-" or a JSON array) and/or `sample` (`true` or
+    {"first", "spread", "flagged"}) convert only the selected pages; blocks keep their original
+    page numbers and `pages_selected` lists them.
 
-    if res is None:
-        # Python API (may disable OCR by default; see DOCLING_OCR env)
-        try:
-            res = _extract_with_docling_python(data, file.filename)
-        except Exception as e:
-            logger.warning(f"Docling Python API extraction failed, falling back: {e}")
-            res = None
+    Returns JSON with pages, text, structured blocks and the tier that produced them.
+    Honours `X-Request-Timeout-Ms`; work is aborted when the client disconnects.
+    With `?timings=1` the response carries a `Server-Timing` header and a `timings` object.
+    """
+    try:
+        page_ranges = _parse_page_ranges(pages)
+        sample_policy = _sample_policy(sample)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    data = await _read_upload(request, file)
+    if (page_ranges or sample_policy) and data[:4] != b"%PDF":
+        raise HTTPException(400, "pages_and_sample_only_support_pdf")
 
-    if res is None:
-        try:
-            res = _extract_with_pdfminer(data)
-        except Exception:
-            res = None
+    cost = await _admission_cost("extract", data, pipeline=pipeline, pages=_selection_size(page_ranges, sample_policy))
+    try:
+        res = await _run_request_work(
+            request, _run_extract, data, file.filename, pipeline, _optional_flag(incremental), page_ranges, sample_policy, cost=cost
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
     if res and (res.get("text") or res.get("blocks")):
-        return JSONResponse(res)
+        return _JSONResponse(_decorate_response(request, res))
     raise HTTPException(500, "Docling extraction failed")
 
 
 @app.post("/signals")
-async def signals(file: UploadFile = File(...)):
+async def signals(
+    request: Request,
+    file: UploadFile = File(...),
+    grid: Optional[str] = Form(None),
+    consolidate: Optional[str] = Form(None),
+):
     """
     Return per-page layout signals needed for hybrid routing to Granite Vision.
 
     Signals:
-      - image/text/non-text coverage (bbox density)
+      - image/text/non-text coverage (union area of the blocks; overlaps count once)
+      - text_image_overlap (page fraction covered by both text and images)
       - figure_count (image blocks)
       - figure_content_missing (heuristic: figures but low text coverage)
-      - image_boxes bboxes for optional region-cropped Vision calls
+      - image_boxes bboxes (with the text fraction inside each) for optional region-cropped Vision calls
+      - density (optional, `grid=N` or `grid=RxC`): per-cell text/image coverage heatmaps
+      - regions (optional, `consolidate=true` or a JSON policy): merged, filtered and ranked figure
+        regions ready for /render-regions
 
     NOTE: This endpoint is PDF-focused. Non-PDF inputs will return 400.
     """
-    data = await file.read()
+    data = await _read_upload(request, file)
     if not (data[:4] == b"%PDF"):
         raise HTTPException(400, "signals_only_supports_pdf")
     try:
-        res = _compute_pdf_page_signals(data)
-        return JSONResponse(res)
+        grid_spec = _parse_grid(grid if grid is not None else os.getenv("SIGNALS_GRID"))
+        policy = _region_policy(consolidate)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    try:
+        cost = await _admission_cost("signals", data)
+        res = await _run_request_work(request, _compute_pdf_page_signals, data, grid_spec, policy, cost=cost)
+        return _JSONResponse(_decorate_response(request, res))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"signals_failed: {str(e)[:200]}")
 
 
 @app.post("/render-pages")
 async def render_pages(
+    request: Request,
     file: UploadFile = File(...),
     pages: str = Form("[]"),
     dpi: int = Form(220),
+    tile: int = Form(0),
+    tile_overlap: int = Form(64),
+    max_memory_mb: Optional[float] = Form(None),
 ):
     """
     Render requested PDF pages to PNG (base64) for downstream Granite Vision calls.
@@ -1030,6 +4933,10 @@ async def render_pages(
     Form fields:
       - pages: JSON array of 1-based page numbers, e.g. [1,3]
       - dpi: render DPI (default 220)
+      - tile: tile edge in pixels; > 0 switches to tiled mode, streamed as NDJSON (one tile per line,
+        then a summary line) without ever rasterizing a whole page
+      - tile_overlap: pixels shared by neighbouring tiles (default 64)
+      - max_memory_mb: shrink tiles so one in-flight tile stays within this budget
     """
     page_list = _safe_json_loads(pages, [])
     if not isinstance(page_list, list):
@@ -1038,21 +4945,32 @@ async def render_pages(
     dpi_int = int(dpi) if dpi else 220
     dpi_int = max(72, min(600, dpi_int))
 
-    data = await file.read()
+    data = await _read_upload(request, file)
     if not (data[:4] == b"%PDF"):
         raise HTTPException(400, "render_only_supports_pdf")
     try:
-        images = _render_pdf_pages(data, [int(p) for p in page_list if str(p).isdigit()], dpi_int)
-        return JSONResponse({"images": images, "dpi": dpi_int})
+        page_nums = [int(p) for p in page_list if str(p).isdigit()]
+        cost = await _admission_cost("render", data, pages=len(page_nums), dpi=dpi_int)
+        if tile and tile > 0:
+            tile_px = _tile_size(tile, max_memory_mb)
+            return await _stream_request_work(
+                request, _iter_page_tiles, data, page_nums, dpi_int, tile_px, max(0, int(tile_overlap or 0)), cost=cost
+            )
+        images = await _run_request_work(request, _render_pdf_pages, data, page_nums, dpi_int, cost=cost)
+        return _JSONResponse(_decorate_response(request, {"images": images, "dpi": dpi_int}))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"render_pages_failed: {str(e)[:200]}")
 
 
 @app.post("/render-regions")
 async def render_regions(
+    request: Request,
     file: UploadFile = File(...),
     regions: str = Form("[]"),
     dpi: int = Form(220),
+    consolidate: Optional[str] = Form(None),
 ):
     """
     Render cropped PDF regions to PNG (base64) for figure-only Granite Vision calls.
@@ -1060,26 +4978,73 @@ async def render_regions(
     Form fields:
       - regions: JSON array of {id, page, bbox:[x0,y0,x1,y1]}
       - dpi: render DPI (default 220)
+      - consolidate: `true` or a JSON policy; merges overlapping/adjacent regions per page, drops
+        tiny ones and keeps the top-ranked before rendering (merged images list their `members`)
     """
     region_list = _safe_json_loads(regions, [])
     if not isinstance(region_list, list):
         raise HTTPException(400, "regions_must_be_json_array")
+    try:
+        policy = _region_policy(consolidate)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
     dpi_int = int(dpi) if dpi else 220
     dpi_int = max(72, min(600, dpi_int))
 
-    data = await file.read()
+    data = await _read_upload(request, file)
     if not (data[:4] == b"%PDF"):
         raise HTTPException(400, "render_only_supports_pdf")
     try:
-        images = _render_pdf_regions(data, region_list, dpi_int)
-        return JSONResponse({"images": images, "dpi": dpi_int})
+        cost = await _admission_cost("render", data, pages=len(region_list), dpi=dpi_int)
+        images = await _run_request_work(request, _render_pdf_regions, data, region_list, dpi_int, policy, cost=cost)
+        return _JSONResponse(_decorate_response(request, {"images": images, "dpi": dpi_int}))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"render_regions_failed: {str(e)[:200]}")
 
 
+@app.post("/analyze")
+async def analyze(request: Request, file: UploadFile = File(...), policy: Optional[str] = Form(None)):
+    """
+    Run the whole vision-routing workflow on one upload: signals, page routing, figure/page renders,
+    extraction and (optionally) a PII redaction plan, with independent stages running concurrently.
+
+    Form fields:
+      - policy: JSON object overriding the routing defaults (image_coverage_threshold,
+        figure_count_threshold, min_text_chars_with_figures, max_pages, crop_figures, dpi,
+        max_regions_per_page, min_region_area_pct, min_total_region_area_pct, render, extract,
+        pipeline, incremental, detect_pii, consolidate, grid)
+
+    Non-PDF uploads only run extraction.
+    """
+    try:
+        pol = _analyze_policy(policy)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    data = await _read_upload(request, file)
+    try:
+        cost = await _admission_cost(
+            "analyze",
+            data,
+            pipeline=pol["pipeline"] if pol["extract"] else "none",
+            pages=pol["max_pages"] if pol["render"] else 0,
+            dpi=pol["dpi"],
+            detect_pii=bool(pol["detect_pii"]),
+        )
+        res = await _run_request_work(request, _analyze_document, data, file.filename, pol, cost=cost)
+        res["policy"] = pol
+        return _JSONResponse(_decorate_response(request, res))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"analyze_failed: {str(e)[:200]}")
+
+
 @app.post("/redact")
 async def redact(
+    request: Request,
     file: UploadFile = File(...),
     boxes: str = Form("[]"),
     search_texts: str = Form("[]"),
@@ -1101,23 +5066,338 @@ async def redact(
         raise HTTPException(400, "search_texts_must_be_json_array")
 
     detect = str(detect_pii).lower() in ("1", "true", "yes", "y")
-    data = await file.read()
+    data = await _read_upload(request, file)
     if not (data[:4] == b"%PDF"):
         raise HTTPException(400, "redact_only_supports_pdf")
 
     try:
-        res = _apply_pdf_redactions(data, boxes_list, detect, search_list)
+        cost = await _admission_cost("redact", data, detect_pii=detect)
+        res = await _run_request_work(request, _apply_pdf_redactions, data, boxes_list, detect, search_list, cost=cost)
         pdf_bytes = res.get("pdf_bytes") or b""
-        return Response(content=pdf_bytes, media_type="application/pdf")
+        headers = {}
+        profile = getattr(request.state, "profile", None)
+        if profile and profile.get("id"):
+            headers["X-Profile-Id"] = profile["id"]
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"redact_failed: {str(e)[:200]}")
 
+# --- Warmup / readiness (GET /ready) ---
+
+_WARM_STATE = {
+    "pymupdf": False, "docling_converter": None, "docling_import": None, "docling_import_error": None,
+    "done": False, "error": None, "ready_at": None,
+}
+
+def _warmup_targets() -> List[str]:
+    """
+    What to load before reporting ready: WARMUP=pymupdf,docling (default: pymupdf, plus the Docling
+    converter when the configured pipeline runs Docling in-process).
+    """
+    raw = os.getenv("WARMUP")
+    if raw is not None:
+        return [t.strip().lower() for t in raw.split(",") if t.strip() and t.strip().lower() != "none"]
+    targets = ["pymupdf"]
+    if _service_role() == "http":
+        # Docling runs in the model workers
+        return targets
+    pipeline = _resolve_extract_pipeline()
+    if pipeline == "python" or (pipeline in ("docling_cli", "cli", "auto") and not CLI_AVAILABLE):
+        targets.append("docling")
+    return targets
+
+def _check_docling_import(in_process: bool) -> bool:
+    """
+    Verify that the installed Docling actually imports (torch and native libraries included).
+
+    With `in_process` the import happens here, as the converter is about to be built anyway;
+    otherwise a child interpreter tries it, so CLI-only deployments do not load torch just to learn
+    whether the Python fallback tier works. On failure the tier is disabled for this process.
+    """
+    global DOCILING_AVAILABLE
+    try:
+        if in_process:
+            import docling.document_converter  # noqa: F401
+        else:
+            proc = _run_subprocess([sys.executable, "-c", "import docling.document_converter"], timeout=300)
+            if proc.returncode != 0:
+                lines = (proc.stderr or "").strip().splitlines()
+                raise RuntimeError(lines[-1] if lines else f"exit code {proc.returncode}")
+        _WARM_STATE["docling_import"] = True
+        return True
+    except Exception as e:
+        DOCILING_AVAILABLE = False
+        _WARM_STATE["docling_import"] = False
+        _WARM_STATE["docling_import_error"] = str(e)[:500]
+        logger.warning(f"docling installed but not importable, disabling the docling_python tier: {e}")
+        return False
+
+def _warmup() -> None:
+    t0 = time.time()
+    try:
+        targets = _warmup_targets()
+        if "pymupdf" in targets:
+            import fitz  # noqa: F401  PyMuPDF
+
+            _WARM_STATE["pymupdf"] = True
+        if "docling" in targets and DOCILING_AVAILABLE and _check_docling_import(in_process=True):
+            _WARM_STATE["docling_converter"] = False
+            do_ocr = os.getenv("DOCLING_OCR", "1") in ("1", "true", "True", "yes")
+            do_tables = os.getenv("DOCLING_TABLES", "1") in ("1", "true", "True", "yes")
+            _get_docling_converter(do_ocr, do_tables)
+            _WARM_STATE["docling_converter"] = True
+    except Exception as e:
+        _WARM_STATE["error"] = str(e)[:500]
+        logger.warning(f"warmup failed: {e}")
+    finally:
+        _WARM_STATE["done"] = True
+        _WARM_STATE["ready_at"] = time.time()
+        logger.info(f"warmup_done ms={int((time.time() - t0) * 1000)} since_start_ms={int((time.time() - _PROCESS_STARTED) * 1000)}")
+    # The cascade's Python tier is only a fallback here: check it after reporting ready.
+    if DOCILING_AVAILABLE and _WARM_STATE["docling_import"] is None and _service_role() != "http":
+        _check_docling_import(in_process=False)
+
+
+@app.on_event("startup")
+def _on_startup():
+    _start_job_workers()
+    threading.Thread(target=_warmup, name="warmup", daemon=True).start()
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    request: Request,
+    file: UploadFile = File(...),
+    kind: str = Form("extract"),
+    pipeline: Optional[str] = Form(None),
+    pages: str = Form("[]"),
+    regions: str = Form("[]"),
+    dpi: int = Form(220),
+    boxes: str = Form("[]"),
+    search_texts: str = Form("[]"),
+    detect_pii: str = Form("true"),
+    incremental: Optional[str] = Form(None),
+    grid: Optional[str] = Form(None),
+    consolidate: Optional[str] = Form(None),
+    sample: Optional[str] = Form(None),
+):
+    """
+    Queue long-running work and return a job id immediately.
+
+    Form fields:
+      - kind: extract | signals | render_pages | render_regions | redact (default extract)
+      - the remaining fields mirror the synchronous endpoint for that kind
+
+    Poll `GET /jobs/{id}`; fetch the output from `GET /jobs/{id}/result` once it succeeded.
+    """
+    kind = (kind or "extract").strip().lower().replace("-", "_")
+    if kind not in JOB_KINDS:
+        raise HTTPException(400, f"kind_must_be_one_of: {', '.join(JOB_KINDS)}")
+
+    params: dict = {}
+    if kind == "extract":
+        try:
+            params.update({
+                "pipeline": pipeline,
+                "incremental": _optional_flag(incremental),
+                "pages": _parse_page_ranges(None if pages == "[]" else pages),
+                "sample": _sample_policy(sample),
+            })
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    elif kind == "signals":
+        try:
+            params["grid"] = _parse_grid(grid if grid is not None else os.getenv("SIGNALS_GRID"))
+            params["consolidate"] = _region_policy(consolidate)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    elif kind == "render_pages":
+        page_list = _safe_json_loads(pages, [])
+        if not isinstance(page_list, list):
+            raise HTTPException(400, "pages_must_be_json_array")
+        params.update({"pages": page_list, "dpi": dpi})
+    elif kind == "render_regions":
+        region_list = _safe_json_loads(regions, [])
+        if not isinstance(region_list, list):
+            raise HTTPException(400, "regions_must_be_json_array")
+        try:
+            params.update({"regions": region_list, "dpi": dpi, "consolidate": _region_policy(consolidate)})
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    elif kind == "redact":
+        boxes_list = _safe_json_loads(boxes, [])
+        if not isinstance(boxes_list, list):
+            raise HTTPException(400, "boxes_must_be_json_array")
+        search_list = _safe_json_loads(search_texts, [])
+        if not isinstance(search_list, list):
+            raise HTTPException(400, "search_texts_must_be_json_array")
+        params.update({
+            "boxes": boxes_list,
+            "search_texts": search_list,
+            "detect_pii": str(detect_pii).lower() in ("1", "true", "yes", "y"),
+        })
+
+    data = await file.read()
+    if kind != "extract" and data[:4] != b"%PDF":
+        raise HTTPException(400, f"{kind}_only_supports_pdf")
+
+    params["client"] = _admission_client(request)
+    store = _get_job_store()
+    job_id = store.submit(kind, data, file.filename, params)
+    return {"id": job_id, "kind": kind, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Job status and progress. JSON results are inlined once the job succeeded
+    (this counts as fetching them); PDF results are served from /jobs/{id}/result.
+    """
+    store = _get_job_store()
+    row = store.get(job_id)
+    if row is None:
+        raise HTTPException(404, "job_not_found")
+    payload = _job_status_payload(row)
+    if row["status"] == "succeeded" and row["result_type"] == "application/json":
+        raw = store.read_result(row)
+        if raw is not None:
+            payload["result"] = json.loads(raw.decode("utf-8"))
+            store.mark_fetched(job_id)
+    return _JSONResponse(payload)
+
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    store = _get_job_store()
+    row = store.get(job_id)
+    if row is None:
+        raise HTTPException(404, "job_not_found")
+    if row["status"] != "succeeded":
+        raise HTTPException(409, f"job_not_succeeded: {row['status']}")
+    raw = store.read_result(row)
+    if raw is None:
+        raise HTTPException(410, "job_result_expired")
+    store.mark_fetched(job_id)
+    return Response(content=raw, media_type=row["result_type"] or "application/octet-stream")
+
+
+@app.delete("/jobs/{job_id}")
+def delete_job(job_id: str):
+    """
+    Delete a job and its stored input/result. A running job is cancelled instead: its child
+    processes are killed, temp files freed, and the row is kept as `cancelled` until purged.
+    """
+    store = _get_job_store()
+    if not store.delete(job_id):
+        raise HTTPException(404, "job_not_found")
+    token = _RUNNING_JOB_TOKENS.get(job_id)
+    if token is not None:
+        token.cancel("job_cancelled")
+    return {"ok": True, "id": job_id}
+
+
+@app.post("/batch/{kind}")
+async def batch(
+    request: Request,
+    kind: str,
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    pipeline: Optional[str] = Form(None),
+    detect_pii: str = Form("true"),
+    incremental: Optional[str] = Form(None),
+    grid: Optional[str] = Form(None),
+    consolidate: Optional[str] = Form(None),
+):
+    """
+    Process many documents in one call: `/batch/extract`, `/batch/signals`, `/batch/redact`.
+
+    Upload repeated `files` fields and/or one `archive` (.zip / .tar / .tar.gz). Results stream
+    back as NDJSON, one line per document as it finishes (`{index, filename, ok, result|error}`),
+    followed by a `{summary: {...}}` line with throughput stats. Redacted PDFs are base64 encoded.
+    """
+    kind = (kind or "").strip().lower()
+    if kind not in BATCH_KINDS:
+        raise HTTPException(404, f"batch_kind_must_be_one_of: {', '.join(BATCH_KINDS)}")
+
+    docs: List[Tuple[str, bytes]] = []
+    for f in files or []:
+        docs.append((f.filename or f"file{len(docs)}", await f.read()))
+    if archive is not None:
+        max_bytes = int(_env_float("BATCH_MAX_ARCHIVE_MB", 512) * 1024 * 1024)
+        try:
+            docs.extend(_unpack_archive(await archive.read(), max_bytes))
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    if not docs:
+        raise HTTPException(400, "batch_requires_files_or_archive")
+    max_docs = int(_env_float("BATCH_MAX_DOCS", 1000))
+    if len(docs) > max_docs:
+        raise HTTPException(413, f"batch_too_many_documents: max {max_docs}")
+
+    try:
+        grid_spec = _parse_grid(grid if grid is not None else os.getenv("SIGNALS_GRID"))
+        policy = _region_policy(consolidate)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    params = {
+        "pipeline": pipeline,
+        "detect_pii": str(detect_pii).lower() in ("1", "true", "yes", "y"),
+        "incremental": _optional_flag(incremental),
+        "grid": grid_spec,
+        "consolidate": policy,
+    }
+    return _stream_batch(request, kind, docs, params)
+
+
 @app.get("/health")
 def health():
     extract_pipeline = os.getenv("EXTRACT_PIPELINE", "docling_cli")
     docling_pipeline = os.getenv("DOCLING_PIPELINE", "standard")
     docling_flag = DOCILING_AVAILABLE or CLI_AVAILABLE
-    return {"ok": True, "docling": docling_flag, "cli": CLI_AVAILABLE, "extract_pipeline": extract_pipeline, "docling_pipeline": docling_pipeline}
+    return {
+        "ok": True,
+        "docling": docling_flag,
+        "cli": CLI_AVAILABLE,
+        "extract_pipeline": extract_pipeline,
+        "docling_pipeline": docling_pipeline,
+        "role": _service_role(),
+        "admission": _SCHEDULER.snapshot() if _SCHEDULER is not None else None,
+        "pid": os.getpid(),
+        "job_workers": len(_JOB_WORKERS),
+        "cancelled_work": dict(_CANCELLED_WORK),
+    }
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness (separate from /health liveness): 200 once warmup finished and, if configured,
+    job workers are running; 503 before that.
+    """
+    jobs_expected = _job_workers_expected()
+    workers_ok = jobs_expected == 0 or len(_JOB_WORKERS) >= jobs_expected
+    # A pipeline that runs Docling in-process is not ready when Docling cannot be imported.
+    docling_ok = _WARM_STATE["docling_import"] is not False or "docling" not in _warmup_targets()
+    is_ready = bool(_WARM_STATE["done"]) and workers_ok and docling_ok
+    ready_at = _WARM_STATE["ready_at"]
+    payload = {
+        "ready": is_ready,
+        "warm": {"pymupdf": _WARM_STATE["pymupdf"], "docling_converter": _WARM_STATE["docling_converter"]},
+        "warmup_error": _WARM_STATE["error"],
+        "docling_import": _WARM_STATE["docling_import"],
+        "docling_import_error": _WARM_STATE["docling_import_error"],
+        "job_workers": len(_JOB_WORKERS),
+        "startup_ms": int((ready_at - _PROCESS_STARTED) * 1000) if ready_at else None,
+        "uptime_s": round(time.time() - _PROCESS_STARTED, 1),
+    }
+    return _JSONResponse(payload, status_code=200 if is_ready else 503)
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of request, tier, page, cache, queue and memory metrics for this process."""
+    return Response(content=_render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/")
 def root():
@@ -1125,9 +5405,228 @@ def root():
         "ok": True,
         "service": "docling-compatible-extractor",
         "health": "/health",
-        "endpoints": ["/extract", "/signals", "/render-pages", "/render-regions", "/redact"],
+        "ready": "/ready",
+        "metrics": "/metrics",
+        "endpoints": ["/extract", "/signals", "/render-pages", "/render-regions", "/redact", "/analyze", "/jobs", "/batch/{extract,signals,redact}"],
     }
 
 @app.head("/")
 def root_head():
     return Response(status_code=200)
+
+
+# --- Multi-process deployment (python main.py serve) ---
+#
+# One supervisor imports PyMuPDF (and optionally Docling), opens the shared job queue and result
+# cache, then forks:
+#   - HTTP workers (SERVICE_ROLE=http): serve every endpoint on a shared listening socket and run
+#     PyMuPDF work locally, but hand the Docling cascade to the model workers via the job queue;
+#   - model workers (SERVICE_ROLE=model): no HTTP, only job-queue consumers holding the Docling
+#     converter / CLI subprocesses.
+# Results are shared through the SQLite result cache, so N HTTP workers do not each hold a copy.
+
+def _service_role() -> str:
+    """SERVICE_ROLE=all (single process, default) | http | model."""
+    return (os.getenv("SERVICE_ROLE", "all") or "all").strip().lower()
+
+def _offload_cascade(data: bytes, filename: Optional[str], pipeline: str) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Queue the Docling cascade for a model worker and wait for its result within the request deadline.
+
+    When no model worker holds the job (still queued, or running with an expired lease) for
+    OFFLOAD_TIMEOUT_S, e.g. because every model worker died, the job is withdrawn and the cascade
+    runs in this process instead.
+    """
+    store = _get_job_store()
+    t0 = time.time()
+    params = {"pipeline": pipeline, "cascade": True, "paged": _PAGED_OUTPUT.get()}
+    job_id = store.submit("extract", data, filename, params, priority=0 if _LANE.get() == "interactive" else 1)
+    unattended_limit = _env_float("OFFLOAD_TIMEOUT_S", 30)
+    unattended_since = t0
+    started_at = None
+    delay = 0.05
+    try:
+        while True:
+            _check_cancelled()
+            row = store.get(job_id)
+            if row is None:
+                return None, None
+            if started_at is None and row["started_at"]:
+                started_at = row["started_at"]
+                _add_stage("queue_wait", max(0.0, started_at - t0))
+            if row["status"] in JOB_FINAL_STATES:
+                break
+            now = time.time()
+            if row["status"] == "running" and (row["lease_until"] or 0) >= now:
+                unattended_since = None
+            elif unattended_since is None:
+                unattended_since = now
+            elif now - unattended_since > unattended_limit:
+                logger.warning(f"no model worker took offloaded extraction {job_id} within {unattended_limit:g}s, converting in-process")
+                store.delete(job_id)
+                _M_FALLBACKS.inc(from_tier="offload", to_tier="in_process")
+                return _extract_docling_cascade(data, filename, pipeline, offload=False)
+            time.sleep(delay)
+            delay = min(0.25, delay * 1.5)
+    except _WorkCancelled:
+        # Queued: removed before a model worker picks it up; running: the worker sees the cancel on its next heartbeat
+        store.delete(job_id)
+        raise
+
+    try:
+        if started_at and row["finished_at"]:
+            _add_stage("model_worker", max(0.0, row["finished_at"] - started_at))
+        if row["status"] != "succeeded":
+            logger.warning(f"offloaded extraction {job_id} {row['status']}: {row['error']}")
+            return None, None
+        raw = store.read_result(row)
+        if raw is None:
+            return None, None
+        res = json.loads(raw)
+        return res, res.get("tier")
+    finally:
+        store.delete(job_id)
+
+def _preload_shared_state() -> None:
+    """Import heavy read-only modules and open shared stores once, before forking workers."""
+    import fitz  # noqa: F401  PyMuPDF
+
+    _WARM_STATE["pymupdf"] = True
+    if DOCILING_AVAILABLE and _env_flag("SERVE_PRELOAD_DOCLING"):
+        try:
+            import docling.document_converter  # noqa: F401
+        except Exception as e:
+            logger.warning(f"docling preload failed: {e}")
+    _get_job_store()
+    _get_result_cache()
+    # Keep the preloaded objects out of later GC passes so their pages stay shared copy-on-write.
+    import gc
+
+    gc.collect()
+    gc.freeze()
+
+def _serve_http_worker(sock, host: str, port: int) -> None:
+    import uvicorn
+
+    config = uvicorn.Config(app, host=host, port=port, log_level=os.getenv("LOG_LEVEL", "info").lower())
+    uvicorn.Server(config).run(sockets=[sock])
+
+def _serve_model_worker() -> None:
+    import signal
+
+    signal.signal(signal.SIGTERM, lambda *_: _JOB_STOP.set())
+    signal.signal(signal.SIGINT, lambda *_: _JOB_STOP.set())
+    _warmup()
+    _start_job_workers()
+    while not _JOB_STOP.is_set():
+        _JOB_STOP.wait(1.0)
+    # Let a running conversion finish; the supervisor escalates to SIGKILL after SERVE_GRACE_S.
+    for t in _JOB_WORKERS:
+        t.join()
+
+def _serve(argv: List[str]) -> int:
+    import argparse
+    import signal
+    import socket
+
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Pre-forking supervisor with separate HTTP and model workers.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "7000")))
+    parser.add_argument("--http-workers", type=int, default=int(_env_float("HTTP_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--model-workers", type=int, default=int(_env_float("MODEL_WORKERS", 1)))
+    args = parser.parse_args(argv)
+    if args.model_workers < 1:
+        # HTTP workers hand every Docling conversion to a model worker
+        parser.error("--model-workers must be at least 1")
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    # Workers must share state across processes: on-disk result cache and fast cross-process job polling.
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
+    os.environ.setdefault("JOBS_POLL_S", "0.1")
+    _preload_shared_state()
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children: Dict[int, Tuple[str, int]] = {}
+    stopping: List[bool] = []
+
+    def spawn(role: str, idx: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.environ["SERVICE_ROLE"] = role
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                if role == "http":
+                    _serve_http_worker(sock, args.host, args.port)
+                else:
+                    sock.close()
+                    _serve_model_worker()
+            except BaseException:
+                logger.exception(f"{role} worker {idx} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (role, idx)
+        logger.info(f"worker_started role={role} idx={idx} pid={pid}")
+
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    for i in range(args.model_workers):
+        spawn("model", i)
+    for i in range(max(1, args.http_workers)):
+        spawn("http", i)
+    logger.info(f"supervisor pid={os.getpid()} listening on {args.host}:{args.port} http_workers={args.http_workers} model_workers={args.model_workers}")
+
+    while not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid, status = 0, 0
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+        role, idx = children.pop(pid, (None, None))
+        if role is None or stopping:
+            continue
+        logger.warning(f"worker_exited role={role} idx={idx} pid={pid} status={status}; restarting")
+        time.sleep(1.0)
+        spawn(role, idx)
+
+    logger.info("supervisor shutting down")
+    for pid in list(children):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            children.pop(pid, None)
+    deadline = time.time() + _env_float("SERVE_GRACE_S", 30)
+    while children and time.time() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        children.pop(pid, None)
+    for pid in list(children):
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "serve":
+        sys.exit(_serve(sys.argv[2:]))
+    print("usage: python main.py serve [--host HOST] [--port PORT] [--http-workers N] [--model-workers M]", file=sys.stderr)
+    sys.exit(2)
@@ -0,0 +1,98 @@
+"""
+/analyze: policy parsing, page routing, renders, and partial failures.
+Run with `python -m pytest test_analyze.py`.
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import benchmark
+import main
+
+
+@pytest.fixture(scope="module")
+def pdf() -> bytes:
+    # page 1: scanned (one full-page image), page 2: four figures, page 3: text only
+    return benchmark.generate_document("mixed", 3)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    monkeypatch.setenv("PDFMINER_WORKERS", "0")
+    monkeypatch.setattr(main, "_PDFMINER_POOL", None)
+    monkeypatch.setattr(main, "_RESULT_CACHE", None)
+    monkeypatch.setattr(main, "_RESULT_CACHE_INIT", False)
+    return TestClient(main.app)
+
+
+def _analyze(client, data, filename="m.pdf", **policy):
+    policy = {"pipeline": "fast", "dpi": 72, **policy}
+    return client.post("/analyze", files={"file": (filename, data, "application/octet-stream")}, data={"policy": json.dumps(policy)})
+
+
+def test_routes_renders_and_extracts(client, pdf):
+    r = _analyze(client, pdf)
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert out["errors"] == {} and out["pages"] == 3 and out["dpi"] == 72
+    assert [p["page"] for p in out["routed"]] == [1, 2]
+    assert "high_image_coverage" in out["routed"][0]["reasons"]
+    # largest figure crops first, at most max_regions_per_page each; crops cover enough of the page
+    assert [(x["id"], x["kind"]) for x in out["renders"]] == [("p1_fig0", "figure"), ("p2_fig0", "figure"), ("p2_fig1", "figure"), ("p2_fig2", "figure")]
+    assert all(x["data_b64"] for x in out["renders"])
+    assert out["extraction"]["tier"] == "fast" and out["extraction"]["text"]
+    assert out["policy"]["pipeline"] == "fast"
+
+
+def test_small_crops_add_a_full_page_render(client, pdf):
+    out = _analyze(client, pdf, min_total_region_area_pct=0.5, max_pages=1, extract=False).json()
+    assert [p["page"] for p in out["routed"]] == [1]  # max_pages caps routing
+    assert out["extraction"] is None
+    out = _analyze(client, pdf, min_total_region_area_pct=0.5, crop_figures=False, extract=False).json()
+    assert [(x["id"], x["kind"], x["bbox"][:2]) for x in out["renders"]] == [("p1_full", "page", [0.0, 0.0]), ("p2_full", "page", [0.0, 0.0])]
+
+
+def test_failing_stage_keeps_the_others(client, pdf, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("renderer exploded")
+
+    monkeypatch.setattr(main, "_render_pdf_regions", broken)
+    out = _analyze(client, pdf).json()
+    assert out["errors"] == {"render": "renderer exploded"}
+    assert out["routed"] and out["extraction"]["text"]
+
+
+def test_non_pdf_only_extracts(client, monkeypatch):
+    monkeypatch.setattr(main, "_run_extract", lambda data, filename, pipeline, incremental: {"text": data.decode(), "pages": 1})
+    out = _analyze(client, b"plain words", "a.txt", detect_pii=True).json()
+    assert out["signals"] is None and out["routed"] == [] and out["renders"] == [] and out["redaction_plan"] is None
+    assert out["extraction"] == {"text": "plain words", "pages": 1} and out["pages"] == 1
+
+
+@pytest.mark.parametrize("policy,error", [
+    ("[1]", "policy_must_be_json_object"),
+    ('{"dpi": 100, "colour": true}', "unknown_policy_keys: colour"),
+    ('{"max_pages": "lots"}', "policy_value_must_be_numeric: max_pages"),
+    ('{"grid": "99"}', "grid_must_be_between_1_and_64"),
+])
+def test_bad_policies_are_rejected(client, pdf, policy, error):
+    r = client.post("/analyze", files={"file": ("m.pdf", pdf, "application/pdf")}, data={"policy": policy})
+    assert r.status_code == 400 and error in r.text
+
+
+def test_route_pages_rules():
+    policy = main._analyze_policy('{"min_text_chars_with_figures": 100, "max_pages": 2}')
+    signals = [
+        {"page": 1, "image_coverage": 0.1, "figure_count": 1},
+        {"page": 2, "image_coverage": 0.0, "figure_count": 0},
+        {"page": 3, "image_coverage": 0.5, "figure_count": 0, "figure_content_missing": True},
+        {"page": 4, "image_coverage": 0.9, "figure_count": 2},
+    ]
+    assert main._route_pages(signals, {1: 50}, policy) == [
+        {"page": 1, "reasons": ["figure_count", "figure_content_missing"]},
+        {"page": 3, "reasons": ["high_image_coverage", "figure_content_missing"]},
+    ]
+    assert main._route_pages(signals[:1], {1: 500}, policy) == [{"page": 1, "reasons": ["figure_count"]}]
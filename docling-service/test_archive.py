@@ -0,0 +1,87 @@
+"""
+Batch archives: which members become documents, how their paths are reported, and the size cap.
+Run with `python -m pytest test_archive.py`.
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+MEMBERS = {
+    "a.pdf": b"%PDF-a",
+    "nested/dir/b.PDF": b"%PDF-b",
+    "c.docx": b"PK-docx",
+    "notes.txt": b"skip me",
+    ".hidden.pdf": b"%PDF-hidden",
+    "__MACOSX/nested/._b.pdf": b"resource fork",
+    "../escape.pdf": b"%PDF-escape",
+    "/abs/d.pdf": b"%PDF-d",
+}
+EXPECTED = [(name, data) for name, data in MEMBERS.items() if name in ("a.pdf", "nested/dir/b.PDF", "c.docx", "../escape.pdf", "/abs/d.pdf")]
+
+
+def _zip(members) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("nested/dir/", b"")
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def _tar(members, mode="w:gz") -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode=mode) as tf:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+        link = tarfile.TarInfo("link.pdf")
+        link.type, link.linkname = tarfile.SYMTYPE, "/etc/passwd"
+        tf.addfile(link)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("pack", [_zip, _tar, lambda m: _tar(m, "w")], ids=["zip", "tar.gz", "tar"])
+def test_documents_come_out_in_order_without_touching_disk(pack, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert main._unpack_archive(pack(MEMBERS), 1 << 20) == EXPECTED
+    # member names are only labels: nothing is extracted, whatever the path says
+    assert os.listdir(tmp_path) == [] and not (tmp_path.parent / "escape.pdf").exists()
+
+
+@pytest.mark.parametrize("pack", [_zip, _tar], ids=["zip", "tar.gz"])
+def test_inflated_size_is_capped(pack):
+    members = {f"{i}.pdf": b"%PDF" + b"0" * 1000 for i in range(5)}
+    assert len(main._unpack_archive(pack(members), 5 * 1004)) == 5
+    with pytest.raises(ValueError, match="archive_too_large"):
+        main._unpack_archive(pack(members), 5 * 1004 - 1)
+
+
+def test_skipped_members_do_not_count_towards_the_cap():
+    members = {"big.bin": b"0" * 10000, "a.pdf": b"%PDF-a"}
+    assert main._unpack_archive(_zip(members), 100) == [("a.pdf", b"%PDF-a")]
+
+
+def test_rejects_other_uploads():
+    with pytest.raises(ValueError, match="archive_must_be_zip_or_tar"):
+        main._unpack_archive(b"%PDF-1.7 not an archive", 1 << 20)
+
+
+def test_batch_endpoint_reports_archive_errors(monkeypatch):
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    client = TestClient(main.app)
+    r = client.post("/batch/extract", files={"archive": ("docs.zip", b"garbage", "application/zip")})
+    assert r.status_code == 400 and "archive_must_be_zip_or_tar" in r.text
+    monkeypatch.setenv("BATCH_MAX_ARCHIVE_MB", "0.001")
+    r = client.post("/batch/extract", files={"archive": ("docs.zip", _zip({"a.pdf": b"0" * 2000}), "application/zip")})
+    assert r.status_code == 400 and "archive_too_large" in r.text
+    r = client.post("/batch/extract", files={"archive": ("docs.zip", _zip({"notes.txt": b"x"}), "application/zip")})
+    assert r.status_code == 400 and "batch_requires_files_or_archive" in r.text
@@ -0,0 +1,99 @@
+"""
+/batch: streaming results and what a client disconnect does to the documents still in flight.
+Run with `python -m pytest test_batch.py`.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from starlette.requests import ClientDisconnect, Request
+
+import main
+
+
+_LOOPS = []
+
+
+@pytest.fixture(autouse=True)
+def _close_loops():
+    yield
+    while _LOOPS:
+        _LOOPS.pop().close()
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/batch/extract", "headers": [], "query_string": b"", "client": ("127.0.0.1", 1)})
+
+
+@pytest.fixture
+def slow_docs(monkeypatch):
+    """Documents named "fast" finish at once; the others run until their batch is cancelled."""
+    monkeypatch.setenv("BATCH_WORKERS", "2")
+    monkeypatch.setattr(main, "_BATCH_POOL", None)
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    events = []
+    lock = threading.Lock()
+
+    def process(kind, data, filename, params):
+        with lock:
+            events.append(("started", filename))
+        deadline = time.monotonic() + 5
+        try:
+            while filename != "fast" and time.monotonic() < deadline:
+                main._check_cancelled()
+                time.sleep(0.01)
+        except main._WorkCancelled:
+            with lock:
+                events.append(("cancelled", filename))
+            raise
+        return {"text": filename}, 1
+
+    monkeypatch.setattr(main, "_batch_process_doc", process)
+    return events
+
+
+def _run(response, disconnect_after: int):
+    sent = []
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            sent.append(message["body"])
+            if len(sent) >= disconnect_after:
+                raise OSError("client went away")
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    # The loop stays open, as in a server: nothing is finalized by loop shutdown
+    loop = asyncio.new_event_loop()
+    _LOOPS.append(loop)
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    try:
+        loop.run_until_complete(response(scope, receive, send))
+    except ClientDisconnect:
+        pass
+    return sent
+
+
+def test_disconnect_cancels_running_and_queued_documents(slow_docs):
+    docs = [("fast", b"")] + [(f"slow{i}", b"") for i in range(5)]
+    t0 = time.monotonic()
+    response = main._stream_batch(_request(), "extract", docs, {})
+    sent = _run(response, disconnect_after=1)
+    assert b'"filename":"fast"' in sent[0]
+    time.sleep(0.3)
+    started = [f for e, f in slow_docs if e == "started" and f != "fast"]
+    cancelled = [f for e, f in slow_docs if e == "cancelled"]
+    assert started and sorted(cancelled) == sorted(started)
+    assert len(started) < 5  # queued documents never ran
+    assert time.monotonic() - t0 < 3
+
+
+def test_completed_batch_ends_with_summary(slow_docs):
+    docs = [("fast", b"")] * 3
+    sent = _run(main._stream_batch(_request(), "extract", docs, {}), disconnect_after=10)
+    lines = b"".join(sent).splitlines()
+    assert len(lines) == 4 and b'"summary"' in lines[-1] and b'"succeeded":3' in lines[-1]
+    assert not [e for e, _ in slow_docs if e == "cancelled"]
@@ -0,0 +1,130 @@
+"""
+Cancellation: deadlines, killing the child process group, and how abandoned requests surface.
+Run with `python -m pytest test_cancel.py`.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import main
+
+
+def _alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _wait_for(path, timeout=5.0) -> str:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path) and open(path).read().strip():
+            return open(path).read().strip()
+        time.sleep(0.02)
+    raise AssertionError(f"{path} never written")
+
+
+def test_token_deadline_cancels_with_reason():
+    token = main._CancelToken(0.05)
+    assert not token.cancelled()
+    time.sleep(0.08)
+    with pytest.raises(main._WorkCancelled) as exc:
+        token.check()
+    assert exc.value.reason == "deadline_exceeded"
+    token.cancel("client_disconnected")  # the first reason sticks
+    assert token.reason == "deadline_exceeded"
+
+
+def test_token_without_timeout_never_expires():
+    token = main._CancelToken(0)
+    assert token.deadline is None and token.remaining() is None and not token.cancelled()
+
+
+@pytest.mark.skipif(not hasattr(os, "killpg") or not os.path.isdir("/proc"), reason="needs process groups and /proc")
+def test_cancel_kills_the_whole_process_group(tmp_path):
+    pidfile = tmp_path / "grandchild.pid"
+    # the child spawns a grandchild and waits on it, like docling / llama.cpp helpers do
+    script = f"import subprocess, sys; p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); open({str(pidfile)!r}, 'w').write(str(p.pid)); p.wait()"
+    token = main._CancelToken()
+    ctx = main._CANCEL.set(token)
+    killed = main._CANCELLED_WORK["processes_killed"]
+    try:
+        import threading
+
+        def cancel_when_started():
+            _wait_for(pidfile)
+            token.cancel("client_disconnected")
+
+        threading.Thread(target=cancel_when_started, daemon=True).start()
+        started = time.monotonic()
+        with pytest.raises(main._WorkCancelled) as exc:
+            main._run_subprocess([sys.executable, "-c", script], timeout=60)
+    finally:
+        main._CANCEL.reset(ctx)
+    assert exc.value.reason == "client_disconnected"
+    assert time.monotonic() - started < 10
+    grandchild = int(pidfile.read_text())
+    deadline = time.monotonic() + 3
+    while _alive(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _alive(grandchild)
+    assert main._CANCELLED_WORK["processes_killed"] == killed + 1
+
+
+def test_subprocess_timeout_and_success():
+    with pytest.raises(subprocess.TimeoutExpired):
+        main._run_subprocess([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.3)
+    done = main._run_subprocess([sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"], timeout=30)
+    assert (done.returncode, done.stdout.strip(), done.stderr.strip()) == (3, "out", "err")
+
+
+def _request(headers=None, disconnected=False) -> Request:
+    leaves_at = time.monotonic() + 0.2  # the client leaves after the work started
+
+    async def receive():
+        if disconnected and time.monotonic() >= leaves_at:
+            return {"type": "http.disconnect"}
+        await asyncio.sleep(3600)
+
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    scope = {"type": "http", "method": "POST", "path": "/extract", "headers": raw, "query_string": b"", "client": ("127.0.0.1", 1), "server": ("test", 80), "scheme": "http"}
+    return Request(scope, receive)
+
+
+def _loop_until_cancelled(seen):
+    deadline = time.monotonic() + 5  # bounded, so a regression fails instead of hanging the run
+    try:
+        while time.monotonic() < deadline:
+            main._check_cancelled()
+            time.sleep(0.01)
+        return "not cancelled"
+    except main._WorkCancelled as e:
+        seen.append(e.reason)
+        raise
+
+
+@pytest.mark.parametrize("disconnected,headers,status,reason", [
+    (False, {"X-Request-Timeout-Ms": "200"}, 504, "deadline_exceeded"),
+    (True, {}, 499, "client_disconnected"),
+])
+def test_request_work_is_cancelled(monkeypatch, disconnected, headers, status, reason):
+    monkeypatch.delenv("REQUEST_TIMEOUT_MS", raising=False)
+    seen = []
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main._run_request_work(_request(headers, disconnected), _loop_until_cancelled, seen))
+    assert exc.value.status_code == status
+    assert seen == [reason]
+
+
+def test_request_work_returns_result(monkeypatch):
+    monkeypatch.delenv("REQUEST_TIMEOUT_MS", raising=False)
+    assert asyncio.run(main._run_request_work(_request(), lambda a, b=0: a + b, 2, b=3)) == 5
@@ -0,0 +1,64 @@
+"""
+Response compression: COMPRESSION_MIN_BYTES behind the app's other middlewares, and streamed
+bodies. Run with `python -m pytest test_compression.py`.
+"""
+
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+import main
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_small_body_is_not_compressed(client, monkeypatch):
+    monkeypatch.setenv("COMPRESSION_MIN_BYTES", "100000")
+    r = client.get("/no-such-route", headers=GZIP)
+    assert r.status_code == 404
+    assert "content-encoding" not in r.headers
+    assert r.json() == {"detail": "Not Found"}
+
+
+def test_body_over_threshold_is_compressed(client, monkeypatch):
+    monkeypatch.setenv("COMPRESSION_MIN_BYTES", "16")
+    r = client.get("/no-such-route", headers=GZIP)
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.json() == {"detail": "Not Found"}
+
+
+def _streaming_app(chunks):
+    async def stream(request):
+        async def body():
+            for chunk in chunks:
+                yield chunk
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    return TestClient(main._CompressionMiddleware(Starlette(routes=[Route("/", stream)])))
+
+
+def test_streamed_body_is_compressed_once_it_reaches_the_threshold(monkeypatch):
+    monkeypatch.setenv("COMPRESSION_MIN_BYTES", "1024")
+    chunks = [b'{"line": %d, "pad": "%s"}\n' % (i, b"x" * 200) for i in range(20)]
+    with _streaming_app(chunks).stream("GET", "/", headers=GZIP) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        raw = b"".join(r.iter_raw())
+    assert gzip.decompress(raw) == b"".join(chunks)
+
+
+def test_short_stream_passes_through(monkeypatch):
+    monkeypatch.setenv("COMPRESSION_MIN_BYTES", "1024")
+    chunks = [b'{"line": 1}\n', b'{"line": 2}\n']
+    with _streaming_app(chunks).stream("GET", "/", headers=GZIP) as r:
+        assert "content-encoding" not in r.headers
+        assert b"".join(r.iter_raw()) == b"".join(chunks)
@@ -0,0 +1,31 @@
+"""
+/extract error paths: every tier failing must surface as the endpoint's 500, not a traceback.
+Run with `python -m pytest test_extract.py`.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("PDFMINER_WORKERS", "0")
+    monkeypatch.setattr(main, "_PDFMINER_POOL", None)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("backend", ["off", "memory"])
+def test_unreadable_upload_is_a_500(client, monkeypatch, backend):
+    monkeypatch.setenv("CACHE_BACKEND", backend)
+    monkeypatch.setattr(main, "_RESULT_CACHE", None)
+    monkeypatch.setattr(main, "_RESULT_CACHE_INIT", False)
+    r = client.post("/extract", files={"file": ("x.pdf", b"not a pdf", "application/pdf")}, data={"pipeline": "docling_cli"})
+    assert r.status_code == 500
+    assert r.json()["detail"] == "Docling extraction failed"
+
+
+def test_failed_extraction_is_never_cached():
+    assert main._extract_cacheable(None, "docling_cli") is False
+    assert main._cached_json("test", "none", lambda: None, cacheable=lambda v: v["never"]) is None
@@ -0,0 +1,60 @@
+"""
+Page-incremental extraction: revised documents reuse unchanged pages from the result cache, and
+without a cache the incremental path is skipped. Run with `python -m pytest test_incremental.py`.
+"""
+
+import fitz  # PyMuPDF
+import pytest
+
+import benchmark
+import main
+
+
+@pytest.fixture
+def extract(monkeypatch):
+    monkeypatch.setenv("PDFMINER_WORKERS", "0")
+    monkeypatch.setattr(main, "_PDFMINER_POOL", None)
+    monkeypatch.setattr(main, "_RESULT_CACHE", None)
+    monkeypatch.setattr(main, "_RESULT_CACHE_INIT", False)
+    calls = []
+    real = main._page_fingerprints
+
+    def spy(data, pages=None):
+        calls.append(pages)
+        return real(data, pages)
+
+    monkeypatch.setattr(main, "_page_fingerprints", spy)
+
+    def run(data):
+        return main._run_extract(data, "memo.pdf", "docling_cli", True)
+
+    run.fingerprint_calls = calls
+    return run
+
+
+def _revise(data: bytes) -> bytes:
+    doc = fitz.open(stream=data, filetype="pdf")
+    page = doc.new_page()
+    page.insert_text((72, 72), "Addendum: one more page in the revised memo.", fontsize=11)
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def test_revision_reuses_unchanged_pages(extract, monkeypatch):
+    monkeypatch.setenv("CACHE_BACKEND", "memory")
+    original = benchmark.generate_document("digital", 4)
+    first = extract(original)
+    assert first["pages_reused"] == 0 and first["pages_converted"] == 4
+    revised = extract(_revise(original))
+    assert revised["pages"] == 5
+    assert revised["pages_reused"] == 4 and revised["pages_converted"] == 1
+    assert [e.get("cached", False) for e in revised["page_tiers"]] == [True] * 4 + [False]
+
+
+def test_without_a_cache_incremental_is_skipped(extract, monkeypatch):
+    monkeypatch.setenv("CACHE_BACKEND", "off")
+    res = extract(benchmark.generate_document("digital", 4))
+    assert res["pages"] == 4 and "pages_reused" not in res
+    assert extract.fingerprint_calls == []
@@ -0,0 +1,111 @@
+"""
+Job store: priorities, lease expiry, retry limits, and cancelling a running job.
+Run with `python -m pytest test_jobs.py`.
+"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOBS_MAX_ATTEMPTS", "2")
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    return main._JobStore(str(tmp_path / "jobs"))
+
+
+def _expire_lease(store, job_id):
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job_id))
+
+
+def test_interactive_jobs_are_claimed_first(store):
+    batch = store.submit("extract", b"%PDF-batch", "a.pdf", {})
+    interactive = store.submit("extract", b"%PDF-interactive", "b.pdf", {}, priority=0)
+    assert store.claim()["id"] == interactive
+    assert store.claim()["id"] == batch
+    assert store.claim() is None
+    assert store.counts() == {"running": 2}
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(store):
+    job_id = store.submit("extract", b"%PDF-x", "a.pdf", {})
+    input_path = store.get(job_id)["input_path"]
+    assert store.claim()["id"] == job_id
+    assert store.heartbeat(job_id, 0.5)
+    assert store.claim() is None  # the lease is live
+
+    _expire_lease(store, job_id)
+    assert store.claim()["id"] == job_id  # the worker died: the job runs again
+    assert store.get(job_id)["attempts"] == 2 and store.get(job_id)["progress"] == 0
+
+    _expire_lease(store, job_id)
+    assert store.claim() is None
+    row = store.get(job_id)
+    assert (row["status"], row["error"]) == ("failed", "max_attempts_exceeded")
+    assert not os.path.exists(input_path)
+
+
+def test_deleting_a_running_job_cancels_it(store):
+    job_id = store.submit("extract", b"%PDF-x", "a.pdf", {})
+    store.claim()
+    assert store.delete(job_id)
+    assert store.get(job_id)["status"] == "cancelled"
+    assert not store.heartbeat(job_id)
+    store.finish(job_id, "succeeded", b"late result", "application/json")
+    row = store.get(job_id)
+    assert row["status"] == "cancelled" and row["result_path"] is None
+    assert not os.path.exists(os.path.join(store.blob_dir, f"{job_id}.out"))
+    assert store.delete(job_id) and store.get(job_id) is None
+
+
+def test_run_job_stores_the_result(store, monkeypatch):
+    monkeypatch.setattr(main, "_execute_job", lambda kind, data, filename, params: (json.dumps({"n": len(data), "p": params}).encode(), "application/json"))
+    job_id = store.submit("extract", b"%PDF-1234", "a.pdf", {"pipeline": "fast"})
+    main._run_job(store, store.claim())
+    row = store.get(job_id)
+    assert (row["status"], row["progress"], row["result_type"]) == ("succeeded", 1.0, "application/json")
+    assert json.loads(store.read_result(row)) == {"n": 9, "p": {"pipeline": "fast"}}
+    assert not os.path.exists(row["input_path"])
+
+
+def test_run_job_notices_a_delete_from_another_worker(store, monkeypatch):
+    started = threading.Event()
+
+    def execute(kind, data, filename, params):
+        started.set()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            main._report_progress(0.5)  # progress updates double as cancellation checks
+            main._check_cancelled()
+            time.sleep(0.01)
+        return b"{}", "application/json"
+
+    monkeypatch.setattr(main, "_execute_job", execute)
+    job_id = store.submit("extract", b"%PDF-x", "a.pdf", {})
+    row = store.claim()
+    worker = threading.Thread(target=main._run_job, args=(store, row))
+    worker.start()
+    assert started.wait(5)
+    main._JobStore(store.root).delete(job_id)
+    worker.join(10)
+    assert not worker.is_alive()
+    row = store.get(job_id)
+    assert row["status"] == "cancelled" and store.read_result(row) is None
+
+
+def test_failed_job_records_the_error(store, monkeypatch):
+    def execute(kind, data, filename, params):
+        raise ValueError("signals_only_supports_pdf")
+
+    monkeypatch.setattr(main, "_execute_job", execute)
+    job_id = store.submit("signals", b"not a pdf", "a.txt", {})
+    main._run_job(store, store.claim())
+    row = store.get(job_id)
+    assert (row["status"], row["error"]) == ("failed", "signals_only_supports_pdf")
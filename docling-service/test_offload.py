@@ -0,0 +1,32 @@
+"""
+HTTP workers hand the Docling cascade to model workers; they must not wait forever when none
+is there. Run with `python -m pytest test_offload.py`.
+"""
+
+import pytest
+
+import benchmark
+import main
+
+
+@pytest.fixture
+def http_worker(monkeypatch, tmp_path):
+    monkeypatch.setenv("SERVICE_ROLE", "http")
+    monkeypatch.setenv("JOBS_DIR", str(tmp_path))
+    monkeypatch.setenv("PDFMINER_WORKERS", "0")
+    monkeypatch.setattr(main, "_JOB_STORE", None)
+    monkeypatch.setattr(main, "_PDFMINER_POOL", None)
+
+
+def test_unclaimed_offload_converts_in_process(http_worker, monkeypatch):
+    monkeypatch.setenv("OFFLOAD_TIMEOUT_S", "0.2")
+    res, tier = main._extract_docling_cascade(benchmark.generate_document("digital", 2), "doc.pdf", "docling_cli")
+    assert res is not None and res["pages"] == 2
+    assert tier == main._cascade_attempts("docling_cli")[0][0]
+    assert main._get_job_store().counts() == {}
+
+
+def test_serve_requires_a_model_worker():
+    with pytest.raises(SystemExit) as exc:
+        main._serve(["--model-workers", "0"])
+    assert exc.value.code == 2
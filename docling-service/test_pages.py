@@ -0,0 +1,64 @@
+"""
+Page selection for previews: range parsing and which pages a selection touches.
+Run with `python -m pytest test_pages.py`.
+"""
+
+import pytest
+
+import benchmark
+import main
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("1-3,7,10-", [[1, 3], [7, 7], [10, None]]),
+        ('[[2, 4], [6, null], "8"]', [[2, 4], [6, None], [8, 8]]),
+        ([[2, 4], 5], [[2, 4], [5, 5]]),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_parse_page_ranges(spec, expected):
+    assert main._parse_page_ranges(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["0-3", "5-2", "abc", "[[0, 3]]", "[[5, 2]]", [[0, 3]], [[5, 2]], [["a", 2]]])
+def test_parse_page_ranges_rejects_pairs_and_strings_alike(spec):
+    with pytest.raises(ValueError):
+        main._parse_page_ranges(spec)
+
+
+@pytest.fixture
+def fingerprinted(monkeypatch):
+    monkeypatch.setenv("PDFMINER_WORKERS", "0")
+    monkeypatch.setattr(main, "_PDFMINER_POOL", None)
+    monkeypatch.setattr(main, "_RESULT_CACHE", None)
+    monkeypatch.setattr(main, "_RESULT_CACHE_INIT", False)
+    seen = []
+    real = main._page_fingerprints
+
+    def spy(data, pages=None):
+        count, out = real(data, pages)
+        seen.append(sorted(out))
+        return count, out
+
+    monkeypatch.setattr(main, "_page_fingerprints", spy)
+    return seen
+
+
+def test_selection_without_incremental_is_not_fingerprinted(fingerprinted, monkeypatch):
+    monkeypatch.setenv("CACHE_BACKEND", "off")
+    data = benchmark.generate_document("digital", 12)
+    res = main._run_extract(data, "doc.pdf", "docling_cli", False, [[3, 3]])
+    assert res["pages"] == 12 and res["pages_selected"] == [3]
+    assert {b["page"] for b in res["blocks"]} == {3}
+    assert fingerprinted == []
+
+
+def test_incremental_selection_fingerprints_only_selected_pages(fingerprinted, monkeypatch):
+    monkeypatch.setenv("CACHE_BACKEND", "memory")
+    data = benchmark.generate_document("digital", 12)
+    res = main._run_extract(data, "doc.pdf", "docling_cli", True, [[2, 3]])
+    assert res["pages_selected"] == [2, 3]
+    assert fingerprinted == [[2, 3]]
@@ -0,0 +1,109 @@
+"""
+pdfminer tier: output parity with extract_text_to_fp, per-page time budget, and worker recycling.
+Run with `python -m pytest test_pdfminer.py`.
+"""
+
+import io
+import threading
+import time
+
+import fitz  # PyMuPDF
+import pytest
+from pdfminer.high_level import extract_text_to_fp
+
+import main
+
+
+def _pdf(heavy_lines: int = 0) -> bytes:
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Light page one\nwith two lines\n\nand a paragraph", fontsize=11)
+    page = doc.new_page()
+    if heavy_lines:
+        # a page of tiny overprinted lines: seconds of pdfminer interpretation (1000 lines ~ 2 s)
+        text = "\n".join(" ".join(f"w{i * 20 + j}" for j in range(20)) for i in range(heavy_lines))
+        page.insert_text((10, 10), text, fontsize=1, lineheight=0.2)
+    else:
+        page.insert_text((72, 72), "Second page text", fontsize=11)
+    page = doc.new_page()
+    page.insert_text((72, 72), "Light page three", fontsize=11)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = main._PdfminerPool(2)
+    yield pool
+    for worker in pool.acquire(pool.size, block=False):
+        pool.discard(worker)
+
+
+@pytest.fixture
+def use_pool(pool, monkeypatch):
+    monkeypatch.setattr(main, "_PDFMINER_POOL", pool)
+    monkeypatch.setattr(main, "_PDFMINER_POOL_PID", [main.os.getpid()])
+    return pool
+
+
+def _reference(data: bytes) -> str:
+    out = io.StringIO()
+    extract_text_to_fp(io.BytesIO(data), out, laparams=None)
+    return out.getvalue()
+
+
+def test_in_process_text_matches_extract_text_to_fp(monkeypatch):
+    monkeypatch.setattr(main, "_PDFMINER_POOL", None)
+    monkeypatch.setattr(main, "_PDFMINER_POOL_PID", [main.os.getpid()])
+    monkeypatch.setenv("PDFMINER_WORKERS", "0")
+    data = _pdf()
+    out = main._extract_with_pdfminer(data)
+    assert out["text"] == _reference(data) and out["pages"] == 3 and "pages_failed" not in out
+    assert [b["page"] for b in out["blocks"]] == [1, 2, 3]
+
+
+def test_pool_text_matches_extract_text_to_fp(use_pool, monkeypatch):
+    monkeypatch.setenv("PDFMINER_PAGE_TIMEOUT_S", "30")
+    data = _pdf()
+    out = main._extract_with_pdfminer(data)
+    assert out["text"] == _reference(data) and "pages_failed" not in out
+    assert use_pool._live <= use_pool.size
+
+
+def test_slow_page_times_out_and_its_worker_is_replaced(use_pool, monkeypatch):
+    monkeypatch.setenv("PDFMINER_PAGE_TIMEOUT_S", "0.4")
+    data = _pdf(heavy_lines=1000)
+    main._extract_with_pdfminer(_pdf())  # warm both workers so process start-up is not timed
+    killed = main._CANCELLED_WORK["processes_killed"]
+    started = time.monotonic()
+    out = main._extract_with_pdfminer(data)
+    assert time.monotonic() - started < 10
+    assert [(f["page"], f["reason"]) for f in out["pages_failed"]] == [(2, "timeout")]
+    expected = _reference(data).split("\f")
+    expected[1] = ""
+    assert out["text"].split("\f") == expected
+    assert main._CANCELLED_WORK["processes_killed"] == killed + 1
+    assert use_pool._live <= use_pool.size
+    monkeypatch.setenv("PDFMINER_PAGE_TIMEOUT_S", "30")
+    assert main._extract_with_pdfminer(_pdf())["text"] == _reference(_pdf())  # the pool recovered
+
+
+def test_cancelled_request_kills_the_busy_worker(use_pool, monkeypatch):
+    monkeypatch.setenv("PDFMINER_PAGE_TIMEOUT_S", "60")
+    data = _pdf(heavy_lines=2000)
+    token = main._CancelToken()
+    ctx = main._CANCEL.set(token)
+    timer = threading.Timer(0.5, token.cancel, args=("client_disconnected",))
+    timer.start()
+    started = time.monotonic()
+    try:
+        with pytest.raises(main._WorkCancelled):
+            main._extract_with_pdfminer(data)
+    finally:
+        timer.cancel()
+        main._CANCEL.reset(ctx)
+    assert time.monotonic() - started < 5
+    assert use_pool._live <= use_pool.size
+    assert all(proc.is_alive() for proc, _ in use_pool._idle)
+    assert main._extract_with_pdfminer(_pdf())["text"] == _reference(_pdf())
@@ -0,0 +1,143 @@
+"""
+Figure regions: `_merge_boxes` against a brute-force fixed point, `_layout_coverage` against a
+raster, and consolidation policies.
+Run with `python -m pytest test_regions.py`.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+import main
+
+
+def _touch(a, b, gap):
+    h = gap / 2.0
+    return a[0] - h <= b[2] + h and b[0] - h <= a[2] + h and a[1] - h <= b[3] + h and b[1] - h <= a[3] + h
+
+
+def _brute_force(boxes, gap):
+    groups = [([list(map(float, b))], [i]) for i, b in enumerate(boxes)]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(groups)):
+            for j in range(i + 1, len(groups)):
+                a, b = groups[i][0][0], groups[j][0][0]
+                if _touch(a, b, gap):
+                    box = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    groups[i] = ([box], groups[i][1] + groups[j][1])
+                    del groups[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return sorted((tuple(sorted(m)), tuple(round(v, 6) for v in g[0])) for g, m in groups)
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("gap", [0.0, 4.0])
+def test_merge_matches_brute_force(seed, gap):
+    rng = random.Random(seed)
+    boxes = []
+    for _ in range(rng.randint(0, 60)):
+        x, y = rng.uniform(0, 400), rng.uniform(0, 400)
+        boxes.append([x, y, x + rng.uniform(1, 60), y + rng.uniform(1, 60)])
+    merged, members = main._merge_boxes(boxes, gap)
+    got = sorted((tuple(m), tuple(round(float(v), 6) for v in r)) for r, m in zip(merged, members))
+    assert got == _brute_force(boxes, gap)
+
+
+def test_merge_chains_through_grown_boxes():
+    # a and c only touch once a and b were merged
+    boxes = [[0, 0, 10, 10], [8, 8, 30, 12], [25, 0, 28, 5], [100, 100, 110, 110]]
+    merged, members = main._merge_boxes(boxes, 0.0)
+    assert sorted(members) == [[0, 1, 2], [3]]
+
+
+def test_merge_many_tiles_stays_sparse():
+    side = 80  # 6400 abutting tiles of a tiled scan
+    boxes = np.array([[c * 10.0, r * 10.0, c * 10.0 + 9.0, r * 10.0 + 9.0] for r in range(side) for c in range(side)])
+    merged, _ = main._merge_boxes(boxes, 0.5)
+    assert len(merged) == side * side
+    merged, _ = main._merge_boxes(boxes, 2.0)
+    assert merged.tolist() == [[0.0, 0.0, side * 10.0 - 1.0, side * 10.0 - 1.0]]
+
+
+def _raster(width, height, boxes):
+    mask = np.zeros((height, width), dtype=bool)
+    for x0, y0, x1, y1 in boxes:
+        mask[max(0, y0):max(0, min(height, y1)), max(0, x0):max(0, min(width, x1))] = True
+    return mask
+
+
+def _random_boxes(rng, n, width, height):
+    out = []
+    for _ in range(n):
+        x0, y0 = rng.randint(-10, width), rng.randint(-10, height)
+        out.append([x0, y0, x0 + rng.randint(0, 50), y0 + rng.randint(0, 40)])
+    return out
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_layout_coverage_matches_a_raster(seed):
+    rng = random.Random(seed)
+    width, height = 100, 80
+    text = _random_boxes(rng, rng.randint(0, 40), width, height)
+    images = _random_boxes(rng, rng.randint(0, 6), width, height)
+    got = main._layout_coverage(width, height, text, images, (8, 10))
+    t, im = _raster(width, height, text), _raster(width, height, images)
+    area = width * height
+    assert got["text"] == pytest.approx(t.sum() / area)
+    assert got["image"] == pytest.approx(im.sum() / area)
+    assert got["overlap"] == pytest.approx((t & im).sum() / area)
+    for (x0, y0, x1, y1), frac in zip(images, got["box_text_overlap"]):
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+        box_area = max(0, x1 - x0) * max(0, y1 - y0)
+        assert frac == pytest.approx(t[y0:y1, x0:x1].sum() / box_area if box_area > 0 else 0.0)
+    cells = t.reshape(8, 10, 10, 10).sum(axis=(1, 3)) / 100.0
+    assert got["density"]["rows"] == 8 and got["density"]["cols"] == 10
+    assert np.allclose(got["density"]["text"], np.round(cells, 3))
+
+
+def test_layout_coverage_raster_fallback_stays_close(monkeypatch):
+    rng = random.Random(3)
+    text = _random_boxes(rng, 300, 1000, 800)
+    exact = main._layout_coverage(1000, 800, text, [])
+    monkeypatch.setattr(main, "_COVERAGE_MAX_CELLS", 10_000)
+    snapped = main._layout_coverage(1000, 800, text, [])
+    assert snapped["text"] == pytest.approx(exact["text"], abs=0.03)
+
+
+POLICY = {"merge_gap": 6.0, "min_area_pct": 0.01, "rank": "area", "top_k": 0}
+
+
+def test_consolidate_merges_filters_and_ranks():
+    boxes = [
+        [50, 50, 150, 150], [152, 50, 250, 150],  # within the merge gap: one region
+        [300, 300, 500, 500],  # largest, but fully covered by text
+        [10, 700, 14, 704],  # below min_area_pct
+    ]
+    text = [[300, 300, 500, 500]]
+    by_area = main._consolidate_regions(boxes, 612, 792, text, POLICY)
+    assert [r["members"] for r in by_area] == [[2], [0, 1]]
+    assert by_area[1]["bbox"] == [50, 50, 250, 150]
+    assert by_area[0]["text_overlap"] == 1.0
+    by_gap = main._consolidate_regions(boxes, 612, 792, text, dict(POLICY, rank="text_gap", top_k=1))
+    assert [r["members"] for r in by_gap] == [[0, 1]]
+    assert main._consolidate_regions([], 612, 792, text, POLICY) == []
+
+
+def test_region_policy_and_grid_parsing(monkeypatch):
+    monkeypatch.setenv("REGION_TOP_K", "2")
+    assert main._region_policy("true")["top_k"] == 2
+    assert main._region_policy('{"rank": "TEXT_GAP", "merge_gap": -1}') == dict(POLICY, rank="text_gap", merge_gap=0.0, top_k=2)
+    assert main._region_policy("off") is None and main._region_policy(None) is None
+    for bad in ("[1]", '{"rank": "size"}', '{"top_k": "many"}'):
+        with pytest.raises(ValueError):
+            main._region_policy(bad)
+    assert main._parse_grid("16") == (16, 16) and main._parse_grid("12x16") == (12, 16) and main._parse_grid("off") is None
+    for bad in ("0x4", "65", "axb", "1x2x3"):
+        with pytest.raises(ValueError):
+            main._parse_grid(bad)
@@ -0,0 +1,81 @@
+"""
+Scratch files: the per-worker budget, spilling past it, cleanup and per-request accounting.
+Run with `python -m pytest test_scratch.py`.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    base = tmp_path / "shm"
+    base.mkdir()
+    monkeypatch.setenv("SCRATCH_DIR", str(base))
+    monkeypatch.setenv("SCRATCH_MAX_MB", str(10 / 1024))  # 10 KiB
+    monkeypatch.setattr(main, "_SCRATCH_ROOT", {})
+    monkeypatch.setattr(main, "_SCRATCH_IN_USE", [0])
+    usage = main._ScratchUsage()
+    token = main._SCRATCH.set(usage)
+    yield base / f"docling-scratch-{os.getpid()}", usage
+    main._SCRATCH.reset(token)
+
+
+def test_files_within_the_budget_use_scratch_and_are_removed(scratch):
+    root, usage = scratch
+    with main._scratch_file(b"x" * 4096, ".pdf", "input") as path:
+        assert os.path.dirname(path) == str(root) and path.endswith(".pdf")
+        assert open(path, "rb").read() == b"x" * 4096
+        assert main._SCRATCH_IN_USE[0] == 4096
+    assert not os.path.exists(path) and main._SCRATCH_IN_USE[0] == 0
+    assert usage.as_dict() == {"files": 1, "bytes_written": 4096, "by_kind": {"input:scratch": 4096}}
+
+
+def test_files_past_the_budget_spill(scratch):
+    root, usage = scratch
+    with main._scratch_file(b"a" * 8000, ".pdf", "input") as first:
+        with main._scratch_file(b"b" * 8000, ".png", "page_image") as second:
+            assert os.path.dirname(first) == str(root)
+            assert os.path.dirname(second) != str(root)  # 16000 bytes would exceed the 10 KiB budget
+            assert main._SCRATCH_IN_USE[0] == 8000
+    assert not os.path.exists(first) and not os.path.exists(second)
+    assert main._SCRATCH_IN_USE[0] == 0
+    assert usage.as_dict()["by_kind"] == {"input:scratch": 8000, "page_image:spill": 8000}
+
+
+def test_failures_still_clean_up(scratch):
+    with pytest.raises(RuntimeError):
+        with main._scratch_file(b"x" * 100, ".pdf", "input") as path:
+            raise RuntimeError("conversion failed")
+    assert not os.path.exists(path) and main._SCRATCH_IN_USE[0] == 0
+
+
+def test_output_dirs_are_accounted_and_removed(scratch):
+    root, usage = scratch
+    with main._scratch_dir("output", expected_bytes=1000) as out:
+        assert os.path.dirname(out) == str(root) and os.listdir(out) == []
+        os.makedirs(os.path.join(out, "pages"))
+        for name, size in (("doc.md", 300), ("pages/1.png", 700)):
+            with open(os.path.join(out, name), "wb") as f:
+                f.write(b"0" * size)
+        assert main._SCRATCH_IN_USE[0] == 1000
+    assert not os.path.exists(out) and main._SCRATCH_IN_USE[0] == 0
+    assert usage.as_dict()["by_kind"] == {"output:scratch": 1000}
+
+
+def test_dead_workers_directories_are_swept(scratch):
+    root, _ = scratch
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    stale = root.parent / f"docling-scratch-{proc.pid}"
+    (stale / "sub").mkdir(parents=True)
+    (stale / "sub" / "left.pdf").write_bytes(b"%PDF")
+    unrelated = root.parent / "docling-scratch-other"
+    unrelated.mkdir()
+    assert main._scratch_dir_for_process() == str(root)
+    assert root.is_dir() and not stale.exists() and unrelated.exists()
@@ -0,0 +1,91 @@
+"""
+Tiled rendering: tile layout, and that stitched tiles reproduce the full-page raster.
+Run with `python -m pytest test_tiles.py`.
+"""
+
+import base64
+import json
+
+import fitz  # PyMuPDF
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _pdf(sizes=((612, 792), (300, 200))) -> bytes:
+    doc = fitz.open()
+    for i, (w, h) in enumerate(sizes):
+        page = doc.new_page(width=w, height=h)
+        page.draw_rect(fitz.Rect(10, 10, w - 10, h - 10), color=(1, 0, 0), fill=(0.2, 0.6, 0.9))
+        page.insert_text((30, 60), f"page {i + 1} tile test", fontsize=24)
+        page.draw_line((0, 0), (w, h), color=(0, 0, 0), width=3)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.mark.parametrize("extent,tile,overlap", [(100, 256, 64), (256, 256, 64), (257, 256, 64), (1000, 256, 64), (1000, 256, 0), (5000, 300, 500), (999, 128, 1)])
+def test_origins_cover_the_extent_with_the_requested_overlap(extent, tile, overlap):
+    xs = main._tile_origins(extent, tile, overlap)
+    assert xs[0] == 0 and xs == sorted(set(xs))
+    assert min(extent, xs[-1] + tile) == extent
+    want = min(overlap, tile // 2)
+    for a, b in zip(xs, xs[1:]):
+        assert a + tile - b >= want  # neighbours share at least the overlap, so there are no gaps
+    if len(xs) > 1:
+        assert (len(xs) - 2) * (tile - want) + tile < extent  # one tile fewer could not cover it
+
+
+def test_tile_size_is_clamped_and_fits_the_memory_budget():
+    assert main._tile_size(10) == 128 and main._tile_size(100000) == 8192
+    assert main._tile_size(4096, 8) == int((8 * 1024 * 1024 / main._TILE_BYTES_PER_PX) ** 0.5)
+    assert main._tile_size(4096, 0.001) == 128
+    assert main._tile_size(512, 1024) == 512
+
+
+def _stitch(tiles):
+    """Paste tile samples into a full-page RGB buffer; returns (bytes, width, height)."""
+    w, h = tiles[0]["page_width"], tiles[0]["page_height"]
+    canvas = bytearray(w * h * 3)
+    for t in tiles:
+        pix = fitz.Pixmap(base64.b64decode(t["data_b64"]))
+        assert (pix.width, pix.height, pix.n) == (t["width"], t["height"], 3)
+        assert t["x"] + pix.width <= w and t["y"] + pix.height <= h
+        for row in range(pix.height):
+            src = pix.samples[row * pix.stride:row * pix.stride + pix.width * 3]
+            start = ((t["y"] + row) * w + t["x"]) * 3
+            canvas[start:start + len(src)] = src
+    return bytes(canvas), w, h
+
+
+def test_stitched_tiles_match_the_full_page_render():
+    data = _pdf()
+    out = list(main._iter_page_tiles(data, [1, 2, 9, 0], 100, 200, 32))
+    summary = out.pop()["summary"]
+    assert summary["pages"] == 2 and summary["tiles"] == len(out)
+    assert summary["bytes_b64"] == sum(len(t["data_b64"]) for t in out)
+
+    doc = fitz.open(stream=data, filetype="pdf")
+    for page_no in (1, 2):
+        tiles = [t for t in out if t["page"] == page_no]
+        assert len(tiles) == tiles[0]["rows"] * tiles[0]["cols"]
+        assert [(t["row"], t["col"]) for t in tiles] == [(r, c) for r in range(tiles[0]["rows"]) for c in range(tiles[0]["cols"])]
+        full = doc.load_page(page_no - 1).get_pixmap(matrix=fitz.Matrix(100 / 72.0, 100 / 72.0))
+        canvas, w, h = _stitch(tiles)
+        assert (w, h) == (full.width, full.height)
+        expected = b"".join(full.samples[r * full.stride:r * full.stride + w * 3] for r in range(h))
+        diff = sum(1 for a, b in zip(canvas, expected) if abs(a - b) > 8)
+        assert diff <= len(expected) * 0.002, diff  # anti-aliasing at tile seams only
+    doc.close()
+    assert len([t for t in out if t["page"] == 1]) > 1
+
+
+def test_render_pages_streams_tiles(monkeypatch):
+    monkeypatch.setenv("ADMISSION_ENABLED", "0")
+    client = TestClient(main.app)
+    r = client.post("/render-pages", files={"file": ("a.pdf", _pdf(), "application/pdf")}, data={"pages": "[2]", "dpi": "72", "tile": "128", "tile_overlap": "16"})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines() if line]
+    assert lines[-1]["summary"]["tiles"] == len(lines) - 1 == 6  # 300x200 at 72 dpi, 128px tiles
+    assert {t["page"] for t in lines[:-1]} == {2}
@@ -0,0 +1,60 @@
+"""
+Checks that `_PageWordIndex.search` resolves redaction queries to the same rects as
+`page.search_for`. Run with `python -m pytest test_word_index.py` (or `python test_word_index.py`).
+"""
+
+import fitz  # PyMuPDF
+
+from main import _PageWordIndex
+
+LINES = [
+    "Applicant SSN:123-45-6789 filed on 2024-01-15",
+    "Reference aaaa and Redaction notes for the REDACT team",
+    "Été chez Anna Smith, Anna Smithson",
+]
+
+
+def _page():
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, line in enumerate(LINES):
+        page.insert_text((72, 72 + 24 * i), line, fontsize=11)
+    return doc, page
+
+
+def _assert_same(query: str) -> None:
+    doc, page = _page()
+    try:
+        expected = sorted([r.x0, r.y0, r.x1, r.y1] for r in page.search_for(query))
+        got = sorted(_PageWordIndex(page).search(query, page))
+        assert len(got) == len(expected), (query, got, expected)
+        for g, e in zip(got, expected):
+            assert all(abs(a - b) < 1.0 for a, b in zip(g, e)), (query, g, e)
+    finally:
+        doc.close()
+
+
+def test_partial_word_is_narrowed_to_the_match():
+    _assert_same("123")
+    _assert_same("45-67")
+
+
+def test_overlapping_hits_are_not_duplicated():
+    _assert_same("aa")
+
+
+def test_whole_words_and_phrases():
+    _assert_same("SSN:123-45-6789")
+    _assert_same("anna smith")
+
+
+def test_case_folding_is_ascii_only():
+    _assert_same("redact")
+    _assert_same("ÉTÉ")
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+    print("ok")
@@ -98,6 +98,25 @@ export async function renderPdfPages({ filePath, pages, dpi = 220 }) {
   }
 }
 
+export async function analyzePdf({ filePath, policy = {} }) {
+  const base = process.env.DOCLING_URL;
+  if (!base || !filePath) return null;
+  try {
+    const form = new FormData();
+    form.append('file', fs.createReadStream(filePath));
+    form.append('policy', JSON.stringify(policy || {}));
+    const resp = await axios.post(`${base}/analyze`, form, {
+      headers: form.getHeaders(),
+      maxBodyLength: Infinity,
+      timeout: envTimeout('DOCLING_ANALYZE_TIMEOUT_MS', 420000),
+    });
+    return resp.data || null;
+  } catch (err) {
+    console.warn(`[docling] analyze failed: ${err?.message || err}`);
+    return null;
+  }
+}
+
 export async function redactPdf({ filePath, boxes = [], searchTexts = [], detectPii = true }) {
   const base = process.env.DOCLING_URL;
   if (!filePath) return null;
@@ -1,4 +1,4 @@
-import { getPdfSignals, renderPdfPages, renderPdfRegions } from './doclingAdapter.js';
+import { analyzePdf, getPdfSignals, renderPdfPages, renderPdfRegions } from './doclingAdapter.js';
 import { analyzeVisionImage } from '../vision/visionClient.js';
 
 function num(v, def) {
@@ -53,20 +53,57 @@ function pickFigureRegions(pageSignals, opts) {
   return out;
 }
 
-export async function augmentWithVision({ filePath, blocks, meta }) {
-  const enabled = bool(process.env.VISION_ENABLE, true) && Boolean(process.env.VISION_URL || process.env.LLAMA_VISION_URL);
-  if (!enabled) return { enabled: false, page_signals: [], routed: [], regions: [], redaction_boxes: [], markdown: '' };
+function fullPageBbox(sigByPage, page) {
+  const sig = sigByPage.get(Number(page));
+  return sig?.width && sig?.height ? [0, 0, Number(sig.width), Number(sig.height)] : null;
+}
+
+// One /analyze round trip: signals, routing and the figure / full-page renders.
+// Returns null when the service cannot answer it (older service, signals or render failure).
+async function routeAndRenderWithAnalyze({ filePath, opts }) {
+  const analyzed = await analyzePdf({
+    filePath,
+    policy: {
+      image_coverage_threshold: opts.imageCoverageThreshold,
+      figure_count_threshold: opts.figureCountThreshold,
+      min_text_chars_with_figures: opts.minTextCharsWithFigures,
+      max_pages: opts.maxPages,
+      crop_figures: opts.cropFigures,
+      dpi: opts.renderDpi,
+      max_regions_per_page: opts.maxRegionsPerPage,
+      min_region_area_pct: opts.minRegionAreaPct,
+      min_total_region_area_pct: opts.minTotalRegionAreaPct,
+      render: true,
+      extract: false,
+    },
+  });
+  if (!analyzed?.signals || analyzed?.errors?.signals || analyzed?.errors?.render) return null;
+
+  const pageSignals = Array.isArray(analyzed.signals.page_signals) ? analyzed.signals.page_signals : [];
+  const sigByPage = new Map(pageSignals.map(s => [Number(s?.page || 0), s]));
+  const routed = (analyzed.routed || []).map(r => ({
+    page: Number(r.page),
+    reasons: r.reasons || [],
+    signals: sigByPage.get(Number(r.page)),
+  }));
 
-  const imageCoverageThreshold = num(process.env.VISION_IMAGE_COVERAGE_THRESHOLD, 0.25);
-  const figureCountThreshold = num(process.env.VISION_FIGURE_COUNT_THRESHOLD, 1);
-  const minTextCharsWithFigures = num(process.env.VISION_MIN_TEXT_CHARS_WITH_FIGURES, 200);
-  const maxPages = num(process.env.VISION_MAX_PAGES, 12);
-  const cropFigures = bool(process.env.VISION_CROP_FIGURES, true);
-  const renderDpi = Math.round(num(process.env.VISION_RENDER_DPI, 220));
-  const maxRegionsPerPage = Math.round(num(process.env.VISION_MAX_REGIONS_PER_PAGE, 3));
-  const minRegionAreaPct = num(process.env.VISION_MIN_REGION_AREA_PCT, 0.03);
-  const minTotalRegionAreaPct = num(process.env.VISION_MIN_TOTAL_REGION_AREA_PCT, 0.15);
+  const regions = [];
+  const imagesById = new Map();
+  for (const img of analyzed.renders || []) {
+    if (!img?.id || !img?.data_b64) continue;
+    imagesById.set(String(img.id), img);
+    regions.push({
+      id: String(img.id),
+      page: Number(img.page),
+      bbox: img.bbox || fullPageBbox(sigByPage, img.page),
+      kind: img.kind || 'figure',
+    });
+  }
+  return { pageSignals, routed, regions, imagesById };
+}
 
+// Separate /signals, /render-regions and /render-pages calls, for services without /analyze.
+async function routeAndRenderStepwise({ filePath, blocks, meta, opts }) {
   const signals = await getPdfSignals({ filePath });
   const pageSignals = Array.isArray(signals?.page_signals) ? signals.page_signals : [];
   const totalPages = Number(signals?.pages || meta?.pages || pageSignals.length || 0);
@@ -78,16 +115,16 @@ export async function augmentWithVision({ filePath, blocks, meta }) {
   for (const sig of pageSignals) {
     const page = Number(sig?.page || 0);
     if (!page || page < 1) continue;
-    if (routed.length >= maxPages) break;
+    if (routed.length >= opts.maxPages) break;
 
     const pageTextLen = (pageTexts[page - 1] || '').trim().length;
-    const missing = Boolean(sig?.figure_content_missing) || (Number(sig?.figure_count || 0) > 0 && pageTextLen < minTextCharsWithFigures);
+    const missing = Boolean(sig?.figure_content_missing) || (Number(sig?.figure_count || 0) > 0 && pageTextLen < opts.minTextCharsWithFigures);
     const imageCov = Number(sig?.image_coverage || 0);
     const figCount = Number(sig?.figure_count || 0);
 
     const reasons = [];
-    if (imageCov >= imageCoverageThreshold) reasons.push('high_image_coverage');
-    if (figCount >= figureCountThreshold) reasons.push('figure_count');
+    if (imageCov >= opts.imageCoverageThreshold) reasons.push('high_image_coverage');
+    if (figCount >= opts.figureCountThreshold) reasons.push('figure_count');
     if (missing) reasons.push('figure_content_missing');
 
     if (reasons.length) {
@@ -96,17 +133,17 @@ export async function augmentWithVision({ filePath, blocks, meta }) {
   }
 
   if (!routed.length) {
-    return { enabled: true, page_signals: pageSignals, routed: [], regions: [], redaction_boxes: [], markdown: '' };
+    return { pageSignals, routed, regions: [], imagesById: new Map() };
   }
 
   const selectedSignals = routed.map(r => r.signals);
   let regions = [];
   let imagesById = new Map();
 
-  if (cropFigures) {
-    regions = pickFigureRegions(selectedSignals, { maxRegionsPerPage, minRegionAreaPct });
+  if (opts.cropFigures) {
+    regions = pickFigureRegions(selectedSignals, opts);
     if (regions.length) {
-      const rendered = await renderPdfRegions({ filePath, regions, dpi: renderDpi });
+      const rendered = await renderPdfRegions({ filePath, regions, dpi: opts.renderDpi });
       const imgs = Array.isArray(rendered?.images) ? rendered.images : [];
       for (const img of imgs) {
         if (img?.id && img?.data_b64) imagesById.set(String(img.id), img);
@@ -125,23 +162,15 @@ export async function augmentWithVision({ filePath, blocks, meta }) {
     }
     const pagesNeedingFull = routed
       .map(r => r.page)
-      .filter(p => (areaByPage.get(Number(p)) || 0) < minTotalRegionAreaPct);
+      .filter(p => (areaByPage.get(Number(p)) || 0) < opts.minTotalRegionAreaPct);
 
     if (pagesNeedingFull.length) {
-      const rendered = await renderPdfPages({ filePath, pages: pagesNeedingFull, dpi: renderDpi });
+      const rendered = await renderPdfPages({ filePath, pages: pagesNeedingFull, dpi: opts.renderDpi });
       const imgs = Array.isArray(rendered?.images) ? rendered.images : [];
       for (const img of imgs) {
         const id = `p${img.page}_full`;
         imagesById.set(id, { ...img, id });
-        regions.push({
-          id,
-          page: img.page,
-          bbox: (() => {
-            const sig = sigByPage.get(Number(img.page));
-            return sig?.width && sig?.height ? [0, 0, Number(sig.width), Number(sig.height)] : null;
-          })(),
-          kind: 'page',
-        });
+        regions.push({ id, page: img.page, bbox: fullPageBbox(sigByPage, img.page), kind: 'page' });
       }
     }
   }
@@ -149,15 +178,12 @@ export async function augmentWithVision({ filePath, blocks, meta }) {
   // Fallback: render full pages when no regions were found or region rendering failed
   if (!regions.length || imagesById.size === 0) {
     const pages = routed.map(r => r.page);
-    const rendered = await renderPdfPages({ filePath, pages, dpi: renderDpi });
+    const rendered = await renderPdfPages({ filePath, pages, dpi: opts.renderDpi });
     const imgs = Array.isArray(rendered?.images) ? rendered.images : [];
     regions = imgs.map((img) => ({
       id: `p${img.page}_full`,
       page: img.page,
-      bbox: (() => {
-        const sig = sigByPage.get(Number(img.page));
-        return sig?.width && sig?.height ? [0, 0, Number(sig.width), Number(sig.height)] : null;
-      })(),
+      bbox: fullPageBbox(sigByPage, img.page),
       kind: 'page',
     }));
     for (const img of imgs) {
@@ -165,6 +191,32 @@ export async function augmentWithVision({ filePath, blocks, meta }) {
     }
   }
 
+  return { pageSignals, routed, regions, imagesById };
+}
+
+export async function augmentWithVision({ filePath, blocks, meta }) {
+  const enabled = bool(process.env.VISION_ENABLE, true) && Boolean(process.env.VISION_URL || process.env.LLAMA_VISION_URL);
+  if (!enabled) return { enabled: false, page_signals: [], routed: [], regions: [], redaction_boxes: [], markdown: '' };
+
+  const opts = {
+    imageCoverageThreshold: num(process.env.VISION_IMAGE_COVERAGE_THRESHOLD, 0.25),
+    figureCountThreshold: num(process.env.VISION_FIGURE_COUNT_THRESHOLD, 1),
+    minTextCharsWithFigures: num(process.env.VISION_MIN_TEXT_CHARS_WITH_FIGURES, 200),
+    maxPages: num(process.env.VISION_MAX_PAGES, 12),
+    cropFigures: bool(process.env.VISION_CROP_FIGURES, true),
+    renderDpi: Math.round(num(process.env.VISION_RENDER_DPI, 220)),
+    maxRegionsPerPage: Math.round(num(process.env.VISION_MAX_REGIONS_PER_PAGE, 3)),
+    minRegionAreaPct: num(process.env.VISION_MIN_REGION_AREA_PCT, 0.03),
+    minTotalRegionAreaPct: num(process.env.VISION_MIN_TOTAL_REGION_AREA_PCT, 0.15),
+  };
+
+  const { pageSignals, routed, regions, imagesById } =
+    (await routeAndRenderWithAnalyze({ filePath, opts })) || (await routeAndRenderStepwise({ filePath, blocks, meta, opts }));
+
+  if (!routed.length) {
+    return { enabled: true, page_signals: pageSignals, routed: [], regions: [], redaction_boxes: [], markdown: '' };
+  }
+
   const regionResults = [];
   const redactionBoxes = [];
 